@@ -1,580 +1,674 @@
-import streamlit as st
-import os
-import json
-import time
-import requests
-from openai import AzureOpenAI
-from dotenv import load_dotenv
-from zoneinfo import ZoneInfo
-from datetime import datetime
-from PIL import Image
-import io
-import uuid
-
-load_dotenv()
-
-# ==================== 페이지 설정 ====================
-st.set_page_config(
-    page_title="Agent Guru",
-    page_icon="🤖",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
-
-# ==================== 커스텀 CSS ====================
-# 브라우저 테마 감지 및 강제 모드 지원
-mode_css = """
-    .main-header {
-        text-align: center;
-        padding: 2rem 0;
-        font-size: 3rem;
-        font-weight: bold;
-        margin-bottom: 0.5rem;
-        /* 라이트 모드: 어두운 보라색 (명확하게 보이도록) */
-        color: #667eea !important;
-        background: none !important;
-        -webkit-text-fill-color: #667eea !important;
-    }
-    /* 다크 모드용 밝은 보라색 */
-    @media (prefers-color-scheme: dark) {
-        .main-header {
-            color: #a78bfa !important;
-            background: none !important;
-            -webkit-text-fill-color: #a78bfa !important;
-        }
-    }
-    .subtitle {
-        text-align: center;
-        font-size: 1.2rem;
-        margin-bottom: 2rem;
-    }
-    .stButton>button {
-        width: 100%;
-        border-radius: 8px;
-    }
-    /* 새 채팅 버튼 고정 크기 */
-    button[key="new_chat_btn"] {
-        width: 120px !important;
-        min-width: 120px !important;
-        max-width: 120px !important;
-        white-space: nowrap !important;
-    }
-    /* 기본 스타일 (라이트 모드) */
-    .feature-box {
-        background-color: #f8f9fa;
-        color: #000000;
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 0.5rem 0;
-        border-left: 4px solid #667eea;
-    }
-    .feature-box h4, .feature-box p {
-        color: #000000;
-    }
-    .info-box {
-        background-color: #e3f2fd;
-        color: #000000;
-        padding: 1rem;
-        border-radius: 8px;
-        margin: 1rem 0;
-        border-left: 4px solid #2196f3;
-    }
-    .info-box h3, .info-box p {
-        color: #000000;
-    }
-    .subtitle {
-        color: #666;
-    }
-    .help-section {
-        background-color: #fff3e0;
-        padding: 1rem;
-        border-radius: 8px;
-        margin: 1rem 0;
-        border-left: 4px solid #ff9800;
-    }
-    /* 다크 모드 (브라우저 기본 테마) - 강제 클래스가 없을 때만 적용 */
-    @media (prefers-color-scheme: dark) {
-        .feature-box:not(.force-light):not(.force-dark) {
-            background-color: #1e1e1e !important;
-            color: #ffffff !important;
-        }
-        .feature-box:not(.force-light):not(.force-dark) h4, 
-        .feature-box:not(.force-light):not(.force-dark) p {
-            color: #ffffff !important;
-        }
-        .info-box:not(.force-light):not(.force-dark) {
-            background-color: #1e1e1e !important;
-            color: #ffffff !important;
-        }
-        .info-box:not(.force-light):not(.force-dark) h3, 
-        .info-box:not(.force-light):not(.force-dark) p {
-            color: #ffffff !important;
-        }
-        .subtitle:not(.force-light):not(.force-dark) {
-            color: #ffffff !important;
-        }
-    }
-    /* 강제 라이트 모드 */
-    .force-light {
-        background-color: #f8f9fa !important;
-        color: #000000 !important;
-    }
-    .force-light h3, .force-light h4, .force-light p {
-        color: #000000 !important;
-    }
-    /* 강제 다크 모드 */
-    .force-dark {
-        background-color: #1e1e1e !important;
-        color: #ffffff !important;
-    }
-    .force-dark h3, .force-dark h4, .force-dark p {
-        color: #ffffff !important;
-    }
-"""
-
-st.markdown(f"<style>{mode_css}</style>", unsafe_allow_html=True)
-
-# ==================== 헤더 ====================
-st.markdown('<h1 class="main-header">🤖 Agent Guru</h1>', unsafe_allow_html=True)
-st.markdown('<p class="subtitle">AI Agent 전문 지식 챗봇 - 학습부터 코드 생성까지</p>', unsafe_allow_html=True)
-
-# ==================== 클라이언트 설정 ====================
-client = AzureOpenAI(
-    azure_endpoint=os.getenv("EXER_AZURE_OPENAI_ENDPOINT"),
-    api_key=os.getenv("EXER_AZURE_OPENAI_API_KEY"),
-    api_version="2024-05-01-preview"
-)
-
-# ==================== 함수 정의 (날씨, 시간) ====================
-def get_current_weather(location, unit=None):
-    location_lower = location.lower()
-    cities = {"tokyo": "Tokyo", "san francisco": "San Francisco", "paris": "Paris", "seoul": "Seoul", "london": "London"}
-    for key in cities:
-        if key in location_lower:
-            geo_url = f"https://geocoding-api.open-meteo.com/v1/search?name={key}&count=1"
-            geo = requests.get(geo_url).json()
-            if not geo.get("results"):
-                return json.dumps({"location": location, "temperature": "unknown"})
-            lat, lon = geo['results'][0]['latitude'], geo['results'][0]['longitude']
-            weather_url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,weather_code"
-            data = requests.get(weather_url).json()
-            desc = "맑음" if data["current"]["weather_code"] == 0 else "구름" if data["current"]["weather_code"] < 10 else "비/눈"
-            return json.dumps({
-                "location": cities[key],
-                "temperature": data["current"]["temperature_2m"],
-                "unit": "°C",
-                "description": desc
-            })
-    return json.dumps({"location": location, "temperature": "unknown"})
-
-def get_current_time(location):
-    location_lower = location.lower()
-    TIMEZONE_DATA = {
-        "tokyo": "Asia/Tokyo", "seoul": "Asia/Seoul", "san francisco": "America/Los_Angeles",
-        "paris": "Europe/Paris", "london": "Europe/London", "new york": "America/New_York"
-    }
-    for key, tz in TIMEZONE_DATA.items():
-        if key in location_lower:
-            now = datetime.now(ZoneInfo(tz))
-            return json.dumps({
-                "location": key.title(),
-                "current_time": now.strftime("%Y년 %m월 %d일 %A %p %I:%M")
-            })
-    return json.dumps({"location": location, "current_time": "unknown"})
-
-# ==================== 사이드바: 설정 + 채팅 기록 ====================
-with st.sidebar:
-    st.markdown("## ⚙️ 설정")
-    
-    with st.expander("📊 응답 매개변수 조절", expanded=True):
-        temperature = st.slider(
-            "Temperature (창의성)",
-            0.0, 1.0, 0.7, 0.05,
-            help="값이 높을수록 창의적이고 다양하게 응답합니다. 낮을수록 일관되고 정확하게 응답합니다."
-        )
-        top_p = st.slider(
-            "Top P (다양성)",
-            0.0, 1.0, 0.95, 0.05,
-            help="응답의 다양성을 조절합니다. 높을수록 더 다양한 표현을 사용합니다."
-        )
-    
-    st.divider()
-    
-    st.markdown("## 💬 대화 관리")
-
-    # Local Storage에서 채팅 기록 불러오기
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = {}
-    
-    if "save_mode" not in st.session_state:
-        st.session_state.save_mode = False
-
-    chat_titles = list(st.session_state.chat_history.keys())
-    
-    if chat_titles:
-        st.markdown("### 📚 저장된 대화")
-        selected_chat = st.radio(
-            "불러올 대화 선택",
-            ["새 채팅 시작"] + chat_titles,
-            index=0,
-            label_visibility="collapsed"
-        )
-        
-        if selected_chat != "새 채팅 시작":
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("📂 불러오기", key="load_chat"):
-                    st.session_state.messages = st.session_state.chat_history[selected_chat]["messages"].copy()
-                    st.session_state.thread_id = st.session_state.chat_history[selected_chat]["thread_id"]
-                    st.success(f"'{selected_chat}' 대화가 불러와졌습니다!")
-                    st.rerun()
-            with col2:
-                if st.button("🗑️ 삭제", key="delete_chat"):
-                    del st.session_state.chat_history[selected_chat]
-                    st.success("삭제되었습니다!")
-                    st.rerun()
-    else:
-        st.info("💡 저장된 대화가 없습니다. 대화를 시작하고 저장해보세요!")
-        selected_chat = "새 채팅 시작"
-    
-    st.divider()
-    
-    # 저장 모드 토글
-    if not st.session_state.save_mode:
-        if st.button("💾 현재 대화 저장", use_container_width=True):
-            st.session_state.save_mode = True
-            st.rerun()
-    else:
-        st.markdown("### 💾 대화 저장")
-        default_title = f"대화 {len(chat_titles)+1}"
-        title = st.text_input("대화 제목 입력", value=default_title, key="save_title_input")
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("✅ 저장", type="primary", use_container_width=True):
-                if title and title.strip():
-                    # 메시지가 있을 때만 저장
-                    if "messages" in st.session_state and len(st.session_state.messages) > 0:
-                        st.session_state.chat_history[title] = {
-                            "messages": st.session_state.messages.copy(),
-                            "thread_id": st.session_state.thread_id
-                        }
-                        st.session_state.save_mode = False
-                        st.success("저장되었습니다!")
-                        st.rerun()
-                    else:
-                        st.warning("저장할 대화가 없습니다.")
-                else:
-                    st.warning("제목을 입력해주세요.")
-        with col2:
-            if st.button("❌ 취소", use_container_width=True):
-                st.session_state.save_mode = False
-                st.rerun()
-    
-    st.divider()
-    
-    # 도움말 섹션
-    with st.expander("❓ 도움말", expanded=False):
-        st.markdown("""
-        ### 🎯 주요 기능
-        
-        **1. RAG (검색 증강 생성)**
-        - AI Agent 관련 PDF 문서를 벡터 DB에 저장
-        - 정확한 전문 지식 제공
-        
-        **2. Code Interpreter**
-        - 수식 그래프 실시간 생성
-        - 코드 실행 및 시각화
-        
-        **3. 자연스러운 대화**
-        - 한국어로 친절하게 응답
-        - AI Agent 개념을 쉽게 설명
-        
-        ### 💡 사용 팁
-        
-        - **Temperature**: 창의적인 응답이 필요하면 높게, 정확한 답변이 필요하면 낮게 설정
-        - **Top P**: 다양한 표현을 원하면 높게 설정
-        - 대화는 브라우저 Local Storage에 저장됩니다
-        - 그래프나 코드가 필요한 질문을 하면 자동으로 생성됩니다
-        """)
-    
-    with st.expander("📝 예시 질문", expanded=False):
-        st.markdown("""
-        - "AI Agent란 무엇인가요?"
-        - "AI Agent의 주요 구성 요소를 설명해주세요"
-        - "간단한 AI Agent 코드 예제를 보여주세요"
-        - "y = x^2 그래프를 그려주세요"
-        - "LangChain을 사용한 Agent 구현 방법을 알려주세요"
-        """)
-
-# ==================== 새 채팅 버튼 (우측 상단) ====================
-col1, col2 = st.columns([10, 1])
-with col2:
-    if st.button("✨ 새 채팅", key="new_chat_btn"):
-        st.session_state.messages = []
-        thread = client.beta.threads.create()
-        st.session_state.thread_id = thread.id
-        st.rerun()
-
-# ==================== Assistant 생성 (최초 1회) ====================
-if "assistant" not in st.session_state:
-    st.session_state.assistant = client.beta.assistants.create(
-        name="Agent Guru",
-        instructions="""너는 'Agent Guru'라는 AI Agent 전문 챗봇이야. 
-        한국어로 친절하고 이해하기 쉽게 대답해야 해.
-        AI Agent 관련 정보들을 단계별로 설명하고, 필요하면 코드 예제도 제공해줘.
-        Code Interpreter를 활용해서 그래프나 시각화가 필요한 경우 자동으로 생성해줘.
-        초보자도 이해할 수 있도록 전문 용어를 쉽게 풀어서 설명해줘.""",
-        model="gpt-4o-mini",
-        temperature=temperature,
-        top_p=top_p,
-        tools=[
-            {"type": "code_interpreter"},
-            {"type": "function", "function": {
-                "name": "get_current_weather",
-                "description": "도시의 현재 날씨 반환",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "location": {"type": "string", "description": "영어 도시명"},
-                        "unit": {"type": "string", "enum": ["celsius", "fahrenheit"]}
-                    },
-                    "required": ["location"]
-                }
-            }},
-            {"type": "function", "function": {
-                "name": "get_current_time",
-                "description": "도시의 현재 시간 반환",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "location": {"type": "string", "description": "영어 도시명"}
-                    },
-                    "required": ["location"]
-                }
-            }}
-        ],
-        tool_resources={
-            "code_interpreter": {}
-        }
-    )
-
-# ==================== Thread 초기화 ====================
-if "thread_id" not in st.session_state:
-    thread = client.beta.threads.create()
-    st.session_state.thread_id = thread.id
-
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-
-# ==================== 테마 클래스 결정 ====================
-# 브라우저 테마를 따르므로 클래스 없음
-theme_class = ''
-
-# ==================== 초기 환영 메시지 ====================
-if len(st.session_state.messages) == 0:
-    st.markdown(f"""
-    <div class="info-box {theme_class}">
-        <h3>👋 Agent Guru에 오신 것을 환영합니다!</h3>
-        <p>이 챗봇은 AI Agent에 대한 전문 지식을 제공하고, 코드 생성부터 그래프 시각화까지 도와드립니다.</p>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    st.markdown("### 💡 시작하기")
-    
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        st.markdown(f"""
-        <div class="feature-box {theme_class}">
-            <h4>📚 전문 지식</h4>
-            <p>RAG를 통한 정확한 AI Agent 정보 제공</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown(f"""
-        <div class="feature-box {theme_class}">
-            <h4>📊 시각화</h4>
-            <p>Code Interpreter로 그래프와 차트 생성</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        st.markdown(f"""
-        <div class="feature-box {theme_class}">
-            <h4>💻 코드 생성</h4>
-            <p>실제 사용 가능한 AI Agent 코드 제공</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    st.markdown("---")
-    
-    st.markdown("### 🎯 예시 질문")
-    example_questions = [
-        "AI Agent란 무엇인가요?",
-        "AI Agent의 주요 구성 요소를 설명해주세요",
-        "간단한 AI Agent 코드 예제를 보여주세요",
-        "y = x^2 그래프를 그려주세요"
-    ]
-    
-    cols = st.columns(2)
-    for idx, question in enumerate(example_questions):
-        with cols[idx % 2]:
-            if st.button(f"💬 {question}", key=f"example_{idx}", use_container_width=True):
-                # 예시 질문을 세션 상태에 저장하고 처리
-                st.session_state.pending_question = question
-                st.rerun()
-
-# ==================== 예시 질문 처리 ====================
-if "pending_question" in st.session_state:
-    prompt = st.session_state.pending_question
-    del st.session_state.pending_question
-    
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    with st.chat_message("user"):
-        st.markdown(prompt)
-
-    client.beta.threads.messages.create(
-        thread_id=st.session_state.thread_id,
-        role="user",
-        content=prompt
-    )
-
-    with st.chat_message("assistant"):
-        with st.spinner("🤔 생각 중..."):
-            placeholder = st.empty()
-            full_response = ""
-            image_list = []
-
-            run = client.beta.threads.runs.create(
-                thread_id=st.session_state.thread_id,
-                assistant_id=st.session_state.assistant.id,
-                temperature=temperature,
-                top_p=top_p
-            )
-
-            while run.status in ["queued", "in_progress", "requires_action"]:
-                time.sleep(0.7)
-                run = client.beta.threads.runs.retrieve(thread_id=st.session_state.thread_id, run_id=run.id)
-
-                if run.status == "requires_action":
-                    tool_outputs = []
-                    for tool in run.required_action.submit_tool_outputs.tool_calls:
-                        args = json.loads(tool.function.arguments)
-                        if tool.function.name == "get_current_weather":
-                            output = get_current_weather(**args)
-                        elif tool.function.name == "get_current_time":
-                            output = get_current_time(**args)
-                        else:
-                            output = json.dumps({"error": "unknown function"})
-                        tool_outputs.append({"tool_call_id": tool.id, "output": output})
-
-                    run = client.beta.threads.runs.submit_tool_outputs(
-                        thread_id=st.session_state.thread_id,
-                        run_id=run.id,
-                        tool_outputs=tool_outputs
-                    )
-
-            if run.status == "completed":
-                msgs = client.beta.threads.messages.list(thread_id=st.session_state.thread_id)
-                latest = msgs.data[0]
-
-                for block in latest.content:
-                    if block.type == "text":
-                        full_response += block.text.value
-                    elif block.type == "image_file":
-                        data = client.files.content(block.image_file.file_id).read()
-                        img = Image.open(io.BytesIO(data))
-                        buf = io.BytesIO()
-                        img.save(buf, format="PNG")
-                        image_list.append(buf.getvalue())
-
-                placeholder.markdown(full_response)
-                for img in image_list:
-                    st.image(img, width=600)
-
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": full_response,
-                    "images": image_list
-                })
-
-# ==================== 과거 메시지 출력 ====================
-for msg in st.session_state.messages:
-    with st.chat_message(msg["role"]):
-        st.markdown(msg["content"])
-        if "images" in msg:
-            for img in msg["images"]:
-                st.image(img, width=600)
-
-# ==================== 사용자 입력 ====================
-if prompt := st.chat_input("AI Agent에 대해 무엇이 궁금하신가요? (예: AI Agent란 무엇인가요?)"):
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    with st.chat_message("user"):
-        st.markdown(prompt)
-
-    client.beta.threads.messages.create(
-        thread_id=st.session_state.thread_id,
-        role="user",
-        content=prompt
-    )
-
-    with st.chat_message("assistant"):
-        with st.spinner("🤔 생각 중..."):
-            placeholder = st.empty()
-            full_response = ""
-            image_list = []
-
-            run = client.beta.threads.runs.create(
-                thread_id=st.session_state.thread_id,
-                assistant_id=st.session_state.assistant.id,
-                temperature=temperature,
-                top_p=top_p
-            )
-
-            while run.status in ["queued", "in_progress", "requires_action"]:
-                time.sleep(0.7)
-                run = client.beta.threads.runs.retrieve(thread_id=st.session_state.thread_id, run_id=run.id)
-
-                if run.status == "requires_action":
-                    tool_outputs = []
-                    for tool in run.required_action.submit_tool_outputs.tool_calls:
-                        args = json.loads(tool.function.arguments)
-                        if tool.function.name == "get_current_weather":
-                            output = get_current_weather(**args)
-                        elif tool.function.name == "get_current_time":
-                            output = get_current_time(**args)
-                        else:
-                            output = json.dumps({"error": "unknown function"})
-                        tool_outputs.append({"tool_call_id": tool.id, "output": output})
-
-                    run = client.beta.threads.runs.submit_tool_outputs(
-                        thread_id=st.session_state.thread_id,
-                        run_id=run.id,
-                        tool_outputs=tool_outputs
-                    )
-
-            if run.status == "completed":
-                msgs = client.beta.threads.messages.list(thread_id=st.session_state.thread_id)
-                latest = msgs.data[0]
-
-                for block in latest.content:
-                    if block.type == "text":
-                        full_response += block.text.value
-                    elif block.type == "image_file":
-                        data = client.files.content(block.image_file.file_id).read()
-                        img = Image.open(io.BytesIO(data))
-                        buf = io.BytesIO()
-                        img.save(buf, format="PNG")
-                        image_list.append(buf.getvalue())
-
-                placeholder.markdown(full_response)
-                for img in image_list:
-                    st.image(img, width=600)
-
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": full_response,
-                    "images": image_list
-                })
+import streamlit as st
+import os
+import re
+import functools
+from dotenv import load_dotenv
+import uuid
+
+load_dotenv()
+
+# 로컬 모듈은 .env 를 읽은 뒤에 불러와야 환경변수 설정이 반영됨
+from runner import RunTimeout, ThreadNotFound
+from engine import get_engine
+from response_cache import response_cache, settings_key, RESPONSE_CACHE_PREWARM
+from assistant_spec import assistant_spec, ASSISTANT_MODEL, ASSISTANT_INSTRUCTIONS
+from azure_client import get_client, pool_stats
+from routing import router
+from scheduler import scheduler
+from images import load_image, load_thumbnail
+from metrics import start_metrics_server
+from context import thread_usage, CONTEXT_COMPACT_TOKENS
+from conversation_store import (
+    list_conversations, count_conversations, search_conversations, create_conversation,
+    rename_conversation, delete_conversation, append_messages, load_conversation
+)
+from session_store import open_session
+
+# ==================== 페이지 설정 ====================
+st.set_page_config(
+    page_title="Agent Guru",
+    page_icon="🤖",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+
+# ==================== 커스텀 CSS ====================
+# 브라우저 테마 감지 및 강제 모드 지원
+mode_css = """
+    .main-header {
+        text-align: center;
+        padding: 2rem 0;
+        font-size: 3rem;
+        font-weight: bold;
+        margin-bottom: 0.5rem;
+        /* 라이트 모드: 어두운 보라색 (명확하게 보이도록) */
+        color: #667eea !important;
+        background: none !important;
+        -webkit-text-fill-color: #667eea !important;
+    }
+    /* 다크 모드용 밝은 보라색 */
+    @media (prefers-color-scheme: dark) {
+        .main-header {
+            color: #a78bfa !important;
+            background: none !important;
+            -webkit-text-fill-color: #a78bfa !important;
+        }
+    }
+    .subtitle {
+        text-align: center;
+        font-size: 1.2rem;
+        margin-bottom: 2rem;
+    }
+    .stButton>button {
+        width: 100%;
+        border-radius: 8px;
+    }
+    /* 새 채팅 버튼 고정 크기 */
+    button[key="new_chat_btn"] {
+        width: 120px !important;
+        min-width: 120px !important;
+        max-width: 120px !important;
+        white-space: nowrap !important;
+    }
+    /* 기본 스타일 (라이트 모드) */
+    .feature-box {
+        background-color: #f8f9fa;
+        color: #000000;
+        padding: 1rem;
+        border-radius: 10px;
+        margin: 0.5rem 0;
+        border-left: 4px solid #667eea;
+    }
+    .feature-box h4, .feature-box p {
+        color: #000000;
+    }
+    .info-box {
+        background-color: #e3f2fd;
+        color: #000000;
+        padding: 1rem;
+        border-radius: 8px;
+        margin: 1rem 0;
+        border-left: 4px solid #2196f3;
+    }
+    .info-box h3, .info-box p {
+        color: #000000;
+    }
+    .subtitle {
+        color: #666;
+    }
+    .help-section {
+        background-color: #fff3e0;
+        padding: 1rem;
+        border-radius: 8px;
+        margin: 1rem 0;
+        border-left: 4px solid #ff9800;
+    }
+    /* 다크 모드 (브라우저 기본 테마) - 강제 클래스가 없을 때만 적용 */
+    @media (prefers-color-scheme: dark) {
+        .feature-box:not(.force-light):not(.force-dark) {
+            background-color: #1e1e1e !important;
+            color: #ffffff !important;
+        }
+        .feature-box:not(.force-light):not(.force-dark) h4, 
+        .feature-box:not(.force-light):not(.force-dark) p {
+            color: #ffffff !important;
+        }
+        .info-box:not(.force-light):not(.force-dark) {
+            background-color: #1e1e1e !important;
+            color: #ffffff !important;
+        }
+        .info-box:not(.force-light):not(.force-dark) h3, 
+        .info-box:not(.force-light):not(.force-dark) p {
+            color: #ffffff !important;
+        }
+        .subtitle:not(.force-light):not(.force-dark) {
+            color: #ffffff !important;
+        }
+    }
+    /* 강제 라이트 모드 */
+    .force-light {
+        background-color: #f8f9fa !important;
+        color: #000000 !important;
+    }
+    .force-light h3, .force-light h4, .force-light p {
+        color: #000000 !important;
+    }
+    /* 강제 다크 모드 */
+    .force-dark {
+        background-color: #1e1e1e !important;
+        color: #ffffff !important;
+    }
+    .force-dark h3, .force-dark h4, .force-dark p {
+        color: #ffffff !important;
+    }
+"""
+
+st.markdown(f"<style>{mode_css}</style>", unsafe_allow_html=True)
+
+# ==================== 헤더 ====================
+st.markdown('<h1 class="main-header">🤖 Agent Guru</h1>', unsafe_allow_html=True)
+st.markdown('<p class="subtitle">AI Agent 전문 지식 챗봇 - 학습부터 코드 생성까지</p>', unsafe_allow_html=True)
+
+# ==================== 클라이언트 설정 ====================
+# 프로세스당 하나의 연결 풀을 모든 세션이 공유 (rerun 마다 새 TLS 연결을 만들지 않음)
+client = get_client()
+
+# 모든 세션의 run 을 하나의 백그라운드 이벤트 루프에서 처리
+engine = get_engine()
+
+# METRICS_PORT 가 설정되어 있으면 Prometheus 가 긁어갈 /metrics 엔드포인트를 띄움
+start_metrics_server()
+
+# 과거 메시지는 최근 N개 질문(턴)만 먼저 보여줌
+HISTORY_PAGE_TURNS = int(os.getenv("HISTORY_PAGE_TURNS", "10"))
+
+# 저장된 대화 목록/검색 결과 한 페이지에 보여줄 개수
+SAVED_CHATS_PAGE_SIZE = int(os.getenv("SAVED_CHATS_PAGE_SIZE", "10"))
+
+# 응답 매개변수 기본값 (슬라이더 초기값이자 응답 캐시 예열 기준)
+DEFAULT_TEMPERATURE = 0.7
+DEFAULT_TOP_P = 0.95
+
+EXAMPLE_QUESTIONS = [
+    "AI Agent란 무엇인가요?",
+    "AI Agent의 주요 구성 요소를 설명해주세요",
+    "간단한 AI Agent 코드 예제를 보여주세요",
+    "y = x^2 그래프를 그려주세요"
+]
+
+# ==================== 실행 중인 턴 관리 ====================
+def cancel_active_turn():
+    # 사용자가 떠난 run 이 서버에서 끝까지 돌며 할당량을 쓰지 않도록 취소
+    handle = st.session_state.pop("active_turn", None)
+    if handle is not None and not handle.done():
+        handle.cancel()
+
+# ==================== 사용자 식별 ====================
+# 새로고침이나 재시작 뒤에도 같은 저장 목록을 보도록 브라우저별 id 를 URL 에 보관
+if "owner_id" not in st.session_state:
+    st.session_state.owner_id = st.query_params.get("sid") or uuid.uuid4().hex
+    st.query_params["sid"] = st.session_state.owner_id
+
+# ==================== 세션 상태 ====================
+# 스레드 id, 메시지, 저장 위치는 sid 로 세션 저장소(SQLite/Redis)에 두고 rerun 마다 읽음
+# (다른 프로세스로 넘어가거나 재시작해도 대화가 이어짐)
+# st.session_state 에는 위젯 상태와 실행 중인 턴 핸들처럼 이 프로세스에서만 의미 있는 값만 둠
+session = open_session(st.session_state.owner_id)
+
+def persist_new_messages():
+    # 저장된 대화를 이어가는 중이면 마지막 저장 이후의 메시지만 기록
+    if session.get("conversation_id"):
+        saved_count = session.get("saved_count", 0)
+        session.update(saved_count=append_messages(
+            session.get("conversation_id"),
+            session.messages(saved_count),
+            saved_count,
+            session.get("thread_id"),
+            lambda ref: load_image(client, ref)
+        ))
+
+# ==================== 사이드바: 설정 + 채팅 기록 ====================
+with st.sidebar:
+    st.markdown("## ⚙️ 설정")
+    
+    with st.expander("📊 응답 매개변수 조절", expanded=True):
+        temperature = st.slider(
+            "Temperature (창의성)",
+            0.0, 1.0, DEFAULT_TEMPERATURE, 0.05,
+            help="값이 높을수록 창의적이고 다양하게 응답합니다. 낮을수록 일관되고 정확하게 응답합니다."
+        )
+        top_p = st.slider(
+            "Top P (다양성)",
+            0.0, 1.0, DEFAULT_TOP_P, 0.05,
+            help="응답의 다양성을 조절합니다. 높을수록 더 다양한 표현을 사용합니다."
+        )
+    
+    st.divider()
+    
+    st.markdown("## 💬 대화 관리")
+
+    # 저장된 대화는 SQLite 저장소에서 제목만 읽어옴 (본문은 불러올 때 읽음)
+    if "save_mode" not in st.session_state:
+        st.session_state.save_mode = False
+
+    saved_total = count_conversations(st.session_state.owner_id)
+    
+    if saved_total:
+        st.markdown("### 📚 저장된 대화")
+        # 전체 목록 대신 검색어가 있으면 색인에서 찾은 순위대로, 없으면 최근 순으로 한 페이지씩만 읽음
+        search_query = st.text_input(
+            "대화 검색",
+            key="chat_search",
+            placeholder="🔍 제목이나 내용으로 검색",
+            label_visibility="collapsed"
+        ).strip()
+        if st.session_state.get("chat_search_for") != search_query:
+            st.session_state.chat_search_for = search_query
+            st.session_state.chat_page = 0
+        page = st.session_state.get("chat_page", 0)
+        if search_query:
+            found, rows = search_conversations(
+                st.session_state.owner_id, search_query, SAVED_CHATS_PAGE_SIZE, page * SAVED_CHATS_PAGE_SIZE
+            )
+        else:
+            found = saved_total
+            rows = list_conversations(st.session_state.owner_id, SAVED_CHATS_PAGE_SIZE, page * SAVED_CHATS_PAGE_SIZE)
+        saved_chats = dict(rows)
+
+        pages = max(1, -(-found // SAVED_CHATS_PAGE_SIZE))
+        if not rows and page > 0:
+            # 삭제로 마지막 페이지가 비었으면 앞 페이지로
+            st.session_state.chat_page = pages - 1
+            st.rerun()
+        if pages > 1:
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col1:
+                if st.button("◀", key="chat_page_prev", disabled=page == 0):
+                    st.session_state.chat_page = page - 1
+                    st.rerun()
+            col2.caption(f"{page + 1} / {pages} 페이지 · {found}개")
+            with col3:
+                if st.button("▶", key="chat_page_next", disabled=page + 1 >= pages):
+                    st.session_state.chat_page = page + 1
+                    st.rerun()
+        elif search_query:
+            st.caption(f"검색 결과 {found}개")
+
+        selected_chat = st.radio(
+            "불러올 대화 선택",
+            [None] + list(saved_chats),
+            format_func=lambda chat_id: "새 채팅 시작" if chat_id is None else saved_chats[chat_id],
+            index=0,
+            label_visibility="collapsed"
+        )
+        
+        if selected_chat is not None:
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("📂 불러오기", key="load_chat"):
+                    cancel_active_turn()
+                    thread_id, messages = load_conversation(selected_chat)
+                    session.replace_messages(
+                        messages,
+                        thread_id=thread_id,
+                        conversation_id=selected_chat,
+                        saved_count=len(messages)
+                    )
+                    st.session_state.history_turns = HISTORY_PAGE_TURNS
+                    st.success(f"'{saved_chats[selected_chat]}' 대화가 불러와졌습니다!")
+                    st.rerun()
+            with col2:
+                if st.button("🗑️ 삭제", key="delete_chat"):
+                    delete_conversation(selected_chat)
+                    if session.get("conversation_id") == selected_chat:
+                        session.update(conversation_id=None)
+                    st.success("삭제되었습니다!")
+                    st.rerun()
+    else:
+        st.info("💡 저장된 대화가 없습니다. 대화를 시작하고 저장해보세요!")
+        selected_chat = None
+    
+    st.divider()
+    
+    # 저장 모드 토글
+    if not st.session_state.save_mode:
+        if st.button("💾 현재 대화 저장", use_container_width=True):
+            st.session_state.save_mode = True
+            st.rerun()
+    else:
+        st.markdown("### 💾 대화 저장")
+        default_title = f"대화 {saved_total+1}"
+        title = st.text_input("대화 제목 입력", value=default_title, key="save_title_input")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("✅ 저장", type="primary", use_container_width=True):
+                if title and title.strip():
+                    # 메시지가 있을 때만 저장
+                    if session.message_count > 0:
+                        # 이미 저장된 대화면 제목만 바꾸고 새 메시지만 이어서 기록
+                        if session.get("conversation_id"):
+                            rename_conversation(session.get("conversation_id"), title)
+                        else:
+                            session.update(
+                                conversation_id=create_conversation(
+                                    st.session_state.owner_id, title, session.get("thread_id")
+                                ),
+                                saved_count=0
+                            )
+                        persist_new_messages()
+                        st.session_state.save_mode = False
+                        st.success("저장되었습니다!")
+                        st.rerun()
+                    else:
+                        st.warning("저장할 대화가 없습니다.")
+                else:
+                    st.warning("제목을 입력해주세요.")
+        with col2:
+            if st.button("❌ 취소", use_container_width=True):
+                st.session_state.save_mode = False
+                st.rerun()
+    
+    st.divider()
+    
+    # 도움말 섹션
+    with st.expander("❓ 도움말", expanded=False):
+        st.markdown("""
+        ### 🎯 주요 기능
+        
+        **1. RAG (검색 증강 생성)**
+        - AI Agent 관련 PDF 문서를 벡터 DB에 저장
+        - 정확한 전문 지식 제공
+        
+        **2. Code Interpreter**
+        - 수식 그래프 실시간 생성
+        - 코드 실행 및 시각화
+        
+        **3. 자연스러운 대화**
+        - 한국어로 친절하게 응답
+        - AI Agent 개념을 쉽게 설명
+        
+        ### 💡 사용 팁
+        
+        - **Temperature**: 창의적인 응답이 필요하면 높게, 정확한 답변이 필요하면 낮게 설정
+        - **Top P**: 다양한 표현을 원하면 높게 설정
+        - 저장한 대화는 서버 DB에 보관되며, 같은 주소(sid)로 접속하면 다시 불러올 수 있습니다
+        - 그래프나 코드가 필요한 질문을 하면 자동으로 생성됩니다
+        """)
+    
+    with st.expander("📝 예시 질문", expanded=False):
+        st.markdown("""
+        - "AI Agent란 무엇인가요?"
+        - "AI Agent의 주요 구성 요소를 설명해주세요"
+        - "간단한 AI Agent 코드 예제를 보여주세요"
+        - "y = x^2 그래프를 그려주세요"
+        - "LangChain을 사용한 Agent 구현 방법을 알려주세요"
+        """)
+
+    with st.expander("🔌 연결 상태", expanded=False):
+        stats = pool_stats()
+        col1, col2 = st.columns(2)
+        col1.metric("요청 수", stats["requests"])
+        col2.metric("연결 재사용률", f"{stats['reuse_ratio']:.0%}" if stats["reuse_ratio"] is not None else "-")
+        col1.metric("활성 연결", f"{stats['active_connections']} / {stats['max_connections']}")
+        col2.metric("유휴 연결", stats["idle_connections"])
+        st.caption(
+            f"TCP 연결 {stats['tcp_connects']}회 · TLS 핸드셰이크 {stats['tls_handshakes']}회 · "
+            f"오류 {stats['errors']}회 · HTTP/2 {'사용' if stats['http2'] else '미사용'}"
+        )
+        threads = engine.pool_stats()
+        st.caption(f"대기 중인 스레드 {threads['ready']}개 · 나눠 준 뒤 미사용 {threads['issued_unused']}개")
+        if router.multi():
+            for endpoint in router.stats():
+                st.caption(
+                    f"{'🟢' if endpoint['healthy'] else '🔴'} {endpoint['name']}: "
+                    f"평균 {endpoint['ewma_ms'] if endpoint['ewma_ms'] is not None else '-'} ms · "
+                    f"요청 {endpoint['requests']}회 · 실패 {endpoint['errors']}회"
+                )
+        for key, lane in scheduler.stats().items():
+            st.caption(
+                f"{key}: 대기 요청 {lane['waiting']}개 · 429 {lane['throttled']}회"
+                + (f" · {lane['blocked_for']:.0f}초 후 재개" if lane["blocked_for"] else "")
+            )
+
+    # 디버그 타이밍은 질문 처리가 끝난 뒤 스크립트 마지막에 채움
+    if st.toggle("🐞 디버그 타이밍", key="debug_timings"):
+        debug_panel = st.container()
+
+# ==================== 새 채팅 버튼 (우측 상단) ====================
+col1, col2 = st.columns([10, 1])
+with col2:
+    if st.button("✨ 새 채팅", key="new_chat_btn"):
+        cancel_active_turn()
+        # 미리 만들어 둔 스레드를 바로 사용 (풀이 비었으면 첫 질문에서 생성)
+        session.replace_messages([], conversation_id=None, thread_id=engine.take_thread())
+        st.session_state.history_turns = HISTORY_PAGE_TURNS
+        st.rerun()
+
+# ==================== Assistant 준비 (프로세스 공용) ====================
+# 세션마다 Assistant 를 만들지 않고, 정의 해시로 등록된 Assistant 를 재사용
+# (엔진이 턴을 보낼 엔드포인트마다 처음 한 번 찾아서 기억함)
+spec = assistant_spec()
+
+# ==================== 응답 캐시 ====================
+def cache_settings(temperature, top_p):
+    return settings_key(ASSISTANT_MODEL, ASSISTANT_INSTRUCTIONS, temperature, top_p)
+
+@st.cache_resource
+def prewarm_response_cache():
+    # 예시 질문 답변을 백그라운드에서 미리 만들어 둠 (프로세스당 1회)
+    settings = cache_settings(DEFAULT_TEMPERATURE, DEFAULT_TOP_P)
+    return engine.prewarm(
+        EXAMPLE_QUESTIONS,
+        spec,
+        lambda prompt, result: response_cache.put(
+            prompt, settings, {"text": result["text"], "images": result["images"]}
+        ),
+        temperature=DEFAULT_TEMPERATURE,
+        top_p=DEFAULT_TOP_P
+    )
+
+if RESPONSE_CACHE_PREWARM:
+    prewarm_response_cache()
+
+# ==================== Thread 초기화 ====================
+if "thread_id" not in session:
+    session.update(thread_id=engine.take_thread())
+
+# ==================== 테마 클래스 결정 ====================
+# 브라우저 테마를 따르므로 클래스 없음
+theme_class = ''
+
+# ==================== 초기 환영 메시지 ====================
+if session.message_count == 0:
+    st.markdown(f"""
+    <div class="info-box {theme_class}">
+        <h3>👋 Agent Guru에 오신 것을 환영합니다!</h3>
+        <p>이 챗봇은 AI Agent에 대한 전문 지식을 제공하고, 코드 생성부터 그래프 시각화까지 도와드립니다.</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    st.markdown("### 💡 시작하기")
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.markdown(f"""
+        <div class="feature-box {theme_class}">
+            <h4>📚 전문 지식</h4>
+            <p>RAG를 통한 정확한 AI Agent 정보 제공</p>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    with col2:
+        st.markdown(f"""
+        <div class="feature-box {theme_class}">
+            <h4>📊 시각화</h4>
+            <p>Code Interpreter로 그래프와 차트 생성</p>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    with col3:
+        st.markdown(f"""
+        <div class="feature-box {theme_class}">
+            <h4>💻 코드 생성</h4>
+            <p>실제 사용 가능한 AI Agent 코드 제공</p>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    st.markdown("---")
+    
+    st.markdown("### 🎯 예시 질문")
+    cols = st.columns(2)
+    for idx, question in enumerate(EXAMPLE_QUESTIONS):
+        with cols[idx % 2]:
+            if st.button(f"💬 {question}", key=f"example_{idx}", use_container_width=True):
+                # 예시 질문을 세션 상태에 저장하고 처리
+                st.session_state.pending_question = question
+                st.rerun()
+
+# ==================== 질문 처리 ====================
+def remember_turn_timings(handle):
+    if handle.trace is None:
+        return
+    st.session_state.last_turn_timings = {
+        "total": handle.finished_at - handle.submitted_at if handle.finished_at else None,
+        "ttft": handle.first_token_at - handle.submitted_at if handle.first_token_at else None,
+        **handle.trace.summary()
+    }
+
+def show_answer(placeholder, text, images):
+    placeholder.markdown(prepare_markdown(text))
+    for ref in images:
+        st.image(load_image(client, ref), width=600)
+
+    session.append_message({
+        "role": "assistant",
+        "content": text,
+        "images": images
+    })
+    persist_new_messages()
+
+def answer_prompt(prompt):
+    # 이전 질문의 run 이 아직 돌고 있으면 새 메시지를 추가할 수 없으므로 먼저 취소
+    cancel_active_turn()
+
+    # 캐시는 이전 문맥이 없는 첫 질문에만 사용 (문맥이 있으면 같은 질문도 답이 달라짐)
+    settings = cache_settings(temperature, top_p)
+    first_turn = session.message_count == 0
+    cached = response_cache.get(prompt, settings) if first_turn else None
+
+    session.append_message({"role": "user", "content": prompt})
+    with st.chat_message("user"):
+        st.markdown(prompt)
+
+    with st.chat_message("assistant"):
+        placeholder = st.empty()
+
+        if cached is not None:
+            recorded = engine.submit_cached(session.get("thread_id"), prompt, cached["text"])
+            if session.get("thread_id") is None:
+                # 새로 만든 스레드 id 가 있어야 다음 질문이 문맥을 이어감
+                session.update(thread_id=recorded.result())
+            show_answer(placeholder, cached["text"], cached["images"])
+            return
+
+        with st.spinner("🤔 생각 중..."):
+            # 실제 API 호출은 대화 엔진의 이벤트 루프에서 처리하고, 여기서는 이벤트만 받아 출력
+            handle = engine.submit(
+                session.get("thread_id"),
+                prompt,
+                spec,
+                first_turn=first_turn,
+                temperature=temperature,
+                top_p=top_p
+            )
+            st.session_state.active_turn = handle
+            try:
+                result = handle.follow(placeholder)
+            except RunTimeout as e:
+                st.session_state.pop("active_turn", None)
+                session.update(thread_id=handle.thread_id)
+                remember_turn_timings(handle)
+                placeholder.warning(f"⏱️ {e}")
+                return
+            except ThreadNotFound as e:
+                # 스레드가 서버에서 사라졌으면 다음 질문은 새 스레드에서 시작
+                st.session_state.pop("active_turn", None)
+                session.update(thread_id=None)
+                placeholder.warning(f"⚠️ {e}")
+                return
+            except BaseException:
+                # 새 질문이나 새 채팅으로 실행이 중단되면 서버 쪽 run 도 취소
+                cancel_active_turn()
+                raise
+            st.session_state.pop("active_turn", None)
+            # 긴 대화는 엔진이 요약해서 새 스레드로 옮기므로 실제로 쓴 스레드를 따라감
+            session.update(thread_id=handle.thread_id)
+            remember_turn_timings(handle)
+            run = result["run"]
+
+            if run is not None and run.status == "completed":
+                # 도구 결과(날씨, 시간)는 시점에 따라 달라지므로 캐시하지 않음
+                if first_turn and not result["used_tools"]:
+                    response_cache.put(prompt, settings, {"text": result["text"], "images": result["images"]})
+                show_answer(placeholder, result["text"], result["images"])
+
+# ==================== 이미지 출력 ====================
+def render_image(ref, key):
+    # 과거 메시지는 썸네일만 보내고, 원본은 요청할 때만 불러옴
+    full = st.toggle("🔍 원본 보기", key=f"full_image_{key}")
+    data = load_image(client, ref) if full else load_thumbnail(client, ref)
+    if data is None:
+        st.caption("🖼️ 이미지를 더 이상 불러올 수 없습니다.")
+    elif full:
+        st.image(data, width=600)
+    else:
+        st.image(data)
+
+# ==================== 과거 메시지 출력 ====================
+@functools.lru_cache(maxsize=2048)
+def prepare_markdown(text):
+    # Assistants 의 LaTeX 구분자를 Streamlit 형식으로 바꾸고, 열 수 없는 sandbox 링크는 글자만 남김
+    text = re.sub(r"\\\[(.+?)\\\]", r"$$\1$$", text, flags=re.S)
+    text = re.sub(r"\\\((.+?)\\\)", r"$\1$", text, flags=re.S)
+    return re.sub(r"\[([^\]]+)\]\(sandbox:[^)]*\)", r"\1", text)
+
+if "history_turns" not in st.session_state:
+    st.session_state.history_turns = HISTORY_PAGE_TURNS
+
+# 세션 저장소에서 화면에 그릴 최근 구간의 메시지만 읽음
+history_from = session.history_start(st.session_state.history_turns)
+if history_from > 0:
+    if st.button(f"⬆️ 이전 메시지 더 보기 ({history_from}개)", key="load_earlier"):
+        st.session_state.history_turns += HISTORY_PAGE_TURNS
+        st.rerun()
+
+for msg_idx, msg in enumerate(session.messages(history_from), start=history_from):
+    with st.chat_message(msg["role"]):
+        st.markdown(prepare_markdown(msg["content"]))
+        if "images" in msg:
+            for img_idx, ref in enumerate(msg["images"]):
+                render_image(ref, f"{msg_idx}_{img_idx}")
+
+# ==================== 예시 질문 처리 ====================
+# 과거 메시지를 먼저 그린 뒤 처리해야 새 질문/답변이 두 번 출력되지 않음
+if "pending_question" in st.session_state:
+    prompt = st.session_state.pending_question
+    del st.session_state.pending_question
+    answer_prompt(prompt)
+
+# ==================== 사용자 입력 ====================
+if prompt := st.chat_input("AI Agent에 대해 무엇이 궁금하신가요? (예: AI Agent란 무엇인가요?)"):
+    answer_prompt(prompt)
+
+# ==================== 디버그 타이밍 ====================
+if st.session_state.get("debug_timings"):
+    with debug_panel:
+        timings = st.session_state.get("last_turn_timings")
+        if timings is None:
+            st.caption("아직 측정된 턴이 없습니다.")
+        else:
+            def ms(seconds):
+                return f"{seconds * 1000:.0f} ms" if seconds is not None else "-"
+
+            col1, col2 = st.columns(2)
+            col1.metric("전체", ms(timings["total"]))
+            col2.metric("첫 토큰", ms(timings["ttft"]))
+            st.markdown("\n".join(
+                f"- `{stage}` +{ms(offset)} → **{ms(seconds)}**" for stage, offset, seconds in timings["spans"]
+            ))
+            for name, seconds in timings["tools"]:
+                st.caption(f"🔧 {name}: {ms(seconds)}")
+            usage = timings["usage"] or {}
+            st.caption(
+                f"폴링 {timings['polls']}회 · 다운로드 {timings['download_bytes'] / 1024:.1f} KB · "
+                f"토큰 {usage.get('prompt_tokens', '-')} / {usage.get('completion_tokens', '-')} (입력 / 출력)"
+            )
+        thread_tokens = thread_usage.get(session.get("thread_id")) if session.get("thread_id") else None
+        if thread_tokens is not None:
+            budget = f" / 요약 기준 {CONTEXT_COMPACT_TOKENS:,}" if CONTEXT_COMPACT_TOKENS else ""
+            st.caption(
+                f"현재 스레드 문맥 {thread_tokens['last_prompt_tokens']:,} 토큰{budget} · "
+                f"누적 {thread_tokens['prompt_tokens'] + thread_tokens['completion_tokens']:,} 토큰 ({thread_tokens['runs']}회)"
+            )
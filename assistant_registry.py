@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import threading
+
+from openai import NotFoundError
+
+# ==================== Assistant 레지스트리 설정 ====================
+# 정의 해시 -> assistant id 매핑을 파일에 남겨서 재시작해도 같은 Assistant 를 재사용
+REGISTRY_PATH = os.getenv("ASSISTANT_REGISTRY_PATH", ".assistant_registry.json")
+
+# 해시에 들어가는 항목 (이 값들이 바뀌면 같은 이름의 Assistant 를 update)
+SPEC_KEYS = ("instructions", "model", "tools", "tool_resources")
+
+_lock = threading.Lock()
+_resolved = {}
+
+
+def spec_hash(spec):
+    canonical = json.dumps(
+        {key: spec.get(key) for key in SPEC_KEYS},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _load_registry():
+    try:
+        with open(REGISTRY_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_registry(registry):
+    tmp_path = f"{REGISTRY_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(registry, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, REGISTRY_PATH)
+
+
+# ==================== Assistant 조회/생성 ====================
+def get_assistant_id(client, spec, scope=None):
+    # Assistant 는 엔드포인트(리소스)마다 따로 있으므로 여러 엔드포인트를 쓰면 scope 로 구분
+    digest = spec_hash(spec)
+    name = f"{scope}:{spec['name']}" if scope else spec["name"]
+
+    # 프로세스 안에서 한 번 확인한 뒤로는 API 호출 없이 바로 반환
+    with _lock:
+        if (scope, digest) in _resolved:
+            return _resolved[scope, digest]
+
+        registry = _load_registry()
+        entry = registry.get(name)
+        assistant_id = None
+
+        if entry and entry.get("hash") == digest:
+            assistant_id = entry["id"]
+        elif entry:
+            # 정의가 바뀌었으면 새로 만들지 않고 기존 Assistant 를 갱신
+            try:
+                assistant_id = client.beta.assistants.update(entry["id"], **spec).id
+            except NotFoundError:
+                assistant_id = None
+
+        if assistant_id is None:
+            assistant_id = client.beta.assistants.create(**spec).id
+
+        if entry != {"id": assistant_id, "hash": digest}:
+            registry[name] = {"id": assistant_id, "hash": digest}
+            _save_registry(registry)
+
+        _resolved[scope, digest] = assistant_id
+        return assistant_id
+
+
+def forget_assistant(spec, assistant_id, scope=None):
+    # 서버에서 지워진 Assistant 는 기록을 지워서 다음 조회 때 새로 만듦
+    # (다른 프로세스가 이미 새로 만들어 기록했으면 그 기록은 그대로 둠)
+    digest = spec_hash(spec)
+    name = f"{scope}:{spec['name']}" if scope else spec["name"]
+    with _lock:
+        if _resolved.get((scope, digest)) == assistant_id:
+            del _resolved[scope, digest]
+        registry = _load_registry()
+        if registry.get(name, {}).get("id") == assistant_id:
+            del registry[name]
+            _save_registry(registry)
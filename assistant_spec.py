@@ -0,0 +1,39 @@
+from tools import tool_definitions
+
+# ==================== Assistant 정의 ====================
+# app.py 와 다른 진입점이 같은 Assistant 를 쓰도록 정의를 한 곳에 둔다
+ASSISTANT_NAME = "Agent Guru"
+
+ASSISTANT_MODEL = "gpt-4o-mini"
+
+ASSISTANT_INSTRUCTIONS = """너는 'Agent Guru'라는 AI Agent 전문 챗봇이야.
+        한국어로 친절하고 이해하기 쉽게 대답해야 해.
+        AI Agent 관련 정보들을 단계별로 설명하고, 필요하면 코드 예제도 제공해줘.
+        Code Interpreter를 활용해서 그래프나 시각화가 필요한 경우 자동으로 생성해줘.
+        초보자도 이해할 수 있도록 전문 용어를 쉽게 풀어서 설명해줘."""
+
+# 함수 도구 스키마는 tools.py 레지스트리에서 가져옴
+ASSISTANT_TOOLS = [{"type": "code_interpreter"}] + tool_definitions()
+
+# 문서 색인이 있으면 search_docs 로 찾은 구절을 근거로 답하도록 안내
+DOCS_INSTRUCTIONS = """
+        AI Agent 개념이나 구현에 대한 질문은 먼저 search_docs 로 관련 문서를 찾아보고,
+        찾은 구절을 근거로 답한 뒤 끝에 출처(파일명, 페이지)를 적어줘."""
+
+if any(tool.get("function", {}).get("name") == "search_docs" for tool in ASSISTANT_TOOLS):
+    ASSISTANT_INSTRUCTIONS += DOCS_INSTRUCTIONS
+
+ASSISTANT_TOOL_RESOURCES = {
+    "code_interpreter": {}
+}
+
+
+def assistant_spec():
+    # temperature / top_p 는 run 마다 넘기므로 Assistant 정의에는 넣지 않는다
+    return {
+        "name": ASSISTANT_NAME,
+        "instructions": ASSISTANT_INSTRUCTIONS,
+        "model": ASSISTANT_MODEL,
+        "tools": ASSISTANT_TOOLS,
+        "tool_resources": ASSISTANT_TOOL_RESOURCES,
+    }
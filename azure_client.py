@@ -0,0 +1,172 @@
+import os
+import threading
+
+import httpx
+from openai import AsyncAzureOpenAI, AzureOpenAI
+
+from routing import router
+from scheduler import AsyncScheduledTransport, ScheduledTransport
+
+# ==================== 연결 풀 설정 ====================
+API_VERSION = "2024-05-01-preview"
+
+MAX_CONNECTIONS = int(os.getenv("AOAI_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("AOAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("AOAI_KEEPALIVE_EXPIRY", "90"))
+
+CONNECT_TIMEOUT = float(os.getenv("AOAI_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("AOAI_READ_TIMEOUT", "60"))
+WRITE_TIMEOUT = float(os.getenv("AOAI_WRITE_TIMEOUT", "10"))
+POOL_TIMEOUT = float(os.getenv("AOAI_POOL_TIMEOUT", "10"))
+
+# 연결 오류/5xx 에 대한 SDK 재시도 횟수 (429 는 scheduler 의 전송 계층에서만 재시도)
+MAX_RETRIES = int(os.getenv("AOAI_MAX_RETRIES", "2"))
+
+# auto: h2 패키지가 있으면 HTTP/2 사용
+HTTP2_MODE = os.getenv("AOAI_HTTP2", "auto").lower()
+
+_lock = threading.Lock()
+_clients = {}
+_http_clients = []
+_stats = {
+    "requests": 0,
+    "errors": 0,
+    "tcp_connects": 0,
+    "tls_handshakes": 0,
+}
+
+
+def _http2_enabled():
+    if HTTP2_MODE in ("0", "false", "no", "off"):
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# ==================== 풀 사용량 추적 ====================
+def _count(key, delta=1):
+    with _lock:
+        _stats[key] += delta
+
+
+def _trace(event_name, info):
+    # httpcore 가 새 연결을 열 때만 호출됨 - 재사용된 요청은 여기에 안 잡힘
+    if event_name == "connection.connect_tcp.complete":
+        _count("tcp_connects")
+    elif event_name == "connection.start_tls.complete":
+        _count("tls_handshakes")
+
+
+def _on_request(request):
+    request.extensions["trace"] = _trace
+    _count("requests")
+
+
+def _on_response(response):
+    if response.status_code >= 400:
+        _count("errors")
+
+
+# AsyncClient 의 hook/trace 는 코루틴이어야 함
+async def _trace_async(event_name, info):
+    _trace(event_name, info)
+
+
+async def _on_request_async(request):
+    request.extensions["trace"] = _trace_async
+    _count("requests")
+
+
+async def _on_response_async(response):
+    _on_response(response)
+
+
+# ==================== 공용 클라이언트 ====================
+def _transport_settings():
+    return {
+        "http2": _http2_enabled(),
+        "limits": httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        ),
+    }
+
+
+def _timeout():
+    return httpx.Timeout(
+        connect=CONNECT_TIMEOUT,
+        read=READ_TIMEOUT,
+        write=WRITE_TIMEOUT,
+        pool=POOL_TIMEOUT
+    )
+
+
+def _client_settings(endpoint):
+    endpoint = router.get(endpoint)
+    return {
+        "azure_endpoint": endpoint.url,
+        "api_key": endpoint.api_key,
+        "api_version": API_VERSION,
+        "max_retries": MAX_RETRIES,
+    }
+
+
+def get_client(endpoint=None):
+    # 엔드포인트 이름마다 하나 (None 이면 기본 엔드포인트)
+    endpoint = router.get(endpoint).name
+    with _lock:
+        client = _clients.get(endpoint)
+        if client is None:
+            # 모든 요청은 프로세스 공용 스케줄러(한도, 우선순위, 429 대기)를 거쳐 나가고
+            # 응답 지연/실패는 라우터가 엔드포인트 선택에 사용
+            http_client = httpx.Client(
+                transport=ScheduledTransport(
+                    httpx.HTTPTransport(**_transport_settings()), observe=router.record_response
+                ),
+                event_hooks={"request": [_on_request], "response": [_on_response]},
+                timeout=_timeout()
+            )
+            _http_clients.append(http_client)
+            client = _clients[endpoint] = AzureOpenAI(http_client=http_client, **_client_settings(endpoint))
+        return client
+
+
+def create_async_client(endpoint=None):
+    # 이벤트 루프에 묶이므로 루프마다 하나씩 만들어서 그 루프 안에서만 사용
+    http_client = httpx.AsyncClient(
+        transport=AsyncScheduledTransport(
+            httpx.AsyncHTTPTransport(**_transport_settings()), observe=router.record_response
+        ),
+        event_hooks={"request": [_on_request_async], "response": [_on_response_async]},
+        timeout=_timeout()
+    )
+    with _lock:
+        _http_clients.append(http_client)
+    return AsyncAzureOpenAI(http_client=http_client, **_client_settings(endpoint))
+
+
+def pool_stats():
+    with _lock:
+        stats = dict(_stats)
+        http_clients = list(_http_clients)
+
+    connections = []
+    for http_client in http_clients:
+        transport = getattr(http_client, "_transport", None)
+        pool = getattr(getattr(transport, "inner", transport), "_pool", None)
+        connections.extend(getattr(pool, "connections", []))
+
+    stats["connections"] = len(connections)
+    stats["idle_connections"] = sum(1 for conn in connections if conn.is_idle())
+    stats["active_connections"] = stats["connections"] - stats["idle_connections"]
+    stats["max_connections"] = MAX_CONNECTIONS
+    stats["http2"] = _http2_enabled()
+    # 새 연결 없이 처리된 요청 비율
+    stats["reuse_ratio"] = (
+        round(1 - stats["tcp_connects"] / stats["requests"], 3) if stats["requests"] else None
+    )
+    return stats
@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from dotenv import load_dotenv
+
+# ==================== 배치 실행 ====================
+# app.py 와 같은 Assistant 정의·도구·대화 엔진으로 질문 목록을 한꺼번에 실행
+#
+#   python batch.py questions.jsonl -o answers.jsonl --workers 32 --rate 10
+#   python batch.py questions.jsonl -o answers.parquet --images-dir out/images
+#   python batch.py questions.jsonl -o answers.jsonl --mock    # CI: 로컬 모의 서버 사용
+#
+# 입력 JSONL 한 줄: {"id": "q1", "prompt": "질문", "temperature": 0.7, "top_p": 0.95}
+# (prompt 외에는 선택, id 가 없으면 줄 번호 사용)
+
+load_dotenv()
+
+
+def read_prompts(path):
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"prompt": item}
+            if not item.get("prompt"):
+                raise ValueError(f"{path}:{line_no}: prompt 가 없습니다")
+            item.setdefault("id", str(line_no))
+            items.append(item)
+    return items
+
+
+class RateLimiter:
+    # 초당 시작 수 제한 (토큰 버킷, 버스트는 1초 분량까지)
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# ==================== 결과 기록 ====================
+def build_row(item, handle, result, error, image_paths):
+    run = result["run"] if result else None
+    usage = run.usage if run is not None else None
+    return {
+        "id": str(item["id"]),
+        "prompt": item["prompt"],
+        "status": run.status if run is not None else ("error" if error else "unknown"),
+        "answer": result["text"] if result else None,
+        "images": image_paths,
+        "used_tools": result["used_tools"] if result else False,
+        "latency": handle.finished_at - handle.submitted_at if handle.finished_at else None,
+        "ttft": handle.first_token_at - handle.submitted_at if handle.first_token_at else None,
+        "prompt_tokens": usage.prompt_tokens if usage is not None else None,
+        "completion_tokens": usage.completion_tokens if usage is not None else None,
+        "thread_id": handle.thread_id,
+        "error": f"{type(error).__name__}: {error}" if error else None,
+    }
+
+
+def save_images(client, refs, images_dir, load_image):
+    paths = []
+    for ref in refs:
+        data = load_image(client, ref)
+        if data is None:
+            continue
+        path = os.path.join(images_dir, f"{ref['hash']}.png")
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(data)
+        paths.append(path)
+    return paths
+
+
+def write_parquet(rows, path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        sys.exit("Parquet 출력에는 pyarrow 가 필요합니다 (pip install pyarrow)")
+    # 값이 모두 비어 있는 열도 실행마다 같은 타입이 되도록 스키마 고정
+    schema = pa.schema([
+        ("id", pa.string()),
+        ("prompt", pa.string()),
+        ("status", pa.string()),
+        ("answer", pa.string()),
+        ("images", pa.list_(pa.string())),
+        ("used_tools", pa.bool_()),
+        ("latency", pa.float64()),
+        ("ttft", pa.float64()),
+        ("prompt_tokens", pa.int64()),
+        ("completion_tokens", pa.int64()),
+        ("thread_id", pa.string()),
+        ("error", pa.string()),
+    ])
+    pq.write_table(pa.Table.from_pylist(rows, schema=schema), path)
+
+
+# ==================== 실행 ====================
+def run_batch(items, args):
+    # 질문마다 create_and_run 으로 스레드를 만들므로 빈 스레드 풀은 필요 없음
+    os.environ.setdefault("THREAD_POOL_SIZE", "0")
+    # 환경 변수를 읽는 모듈은 모의 서버 설정이 끝난 뒤에 import
+    from assistant_spec import assistant_spec
+    from azure_client import get_client
+    from engine import get_engine
+    from images import load_image
+    from scheduler import BACKGROUND
+
+    client = get_client()
+    engine = get_engine()
+    spec = assistant_spec()
+    limiter = RateLimiter(args.rate)
+    slots = threading.Semaphore(args.workers)
+    rows = [None] * len(items)
+    done = threading.Event()
+    finished = [0]
+    deletes = []
+    lock = threading.Lock()
+    jsonl = open(args.output, "w", encoding="utf-8") if not args.output.endswith(".parquet") else None
+    started = time.monotonic()
+
+    def on_done(index, handle):
+        item = items[index]
+        error = None
+        result = None
+        row = None
+        delete = None
+        try:
+            try:
+                result = handle.future.result()
+            except BaseException as e:
+                error = e
+            # 이미지 파일은 스레드와 별개라 스레드 삭제를 먼저 걸어 둬도 됨
+            if not args.keep_threads and handle.thread_id:
+                delete = engine.delete_thread(handle.thread_id)
+            image_paths = []
+            if result and args.images_dir:
+                image_paths = save_images(client, result["images"], args.images_dir, load_image)
+            row = build_row(item, handle, result, error, image_paths)
+        except Exception as e:
+            # 이미지 저장/스레드 삭제 실패도 그 질문의 오류로 남기고 나머지 질문은 계속 진행
+            row = build_row(item, handle, None, e, [])
+        finally:
+            # 여기서 빠지면 슬롯이 새고 done 이 영영 안 켜져서 배치 전체가 멈춤
+            slots.release()
+            with lock:
+                try:
+                    if delete is not None:
+                        deletes.append(delete)
+                    rows[index] = row
+                    if jsonl is not None:
+                        jsonl.write(json.dumps(row, ensure_ascii=False) + "\n")
+                finally:
+                    finished[0] += 1
+                    count = finished[0]
+                    if count % args.progress_every == 0 or count == len(items):
+                        elapsed = time.monotonic() - started
+                        print(f"{count}/{len(items)} 완료 ({count / elapsed:.1f}/초)", file=sys.stderr)
+                    if count == len(items):
+                        done.set()
+
+    for index, item in enumerate(items):
+        slots.acquire()
+        limiter.acquire()
+        run_params = {key: item[key] for key in ("temperature", "top_p") if key in item}
+        # 질문마다 새 스레드 (create_and_run) 라서 서로의 문맥이 섞이지 않음
+        handle = engine.submit(None, item["prompt"], spec, priority=BACKGROUND, **run_params)
+        handle.future.add_done_callback(lambda _, index=index, handle=handle: threading.Thread(
+            target=on_done, args=(index, handle), daemon=True
+        ).start())
+
+    if items:
+        done.wait()
+    # 엔진 이벤트 루프는 데몬 스레드라 프로세스가 끝나면 남은 삭제 요청이 버려지므로 모두 기다림
+    for delete in deletes:
+        delete.result()
+    if jsonl is not None:
+        jsonl.close()
+    else:
+        write_parquet(rows, args.output)
+    return rows, time.monotonic() - started
+
+
+def summarize(rows, elapsed):
+    latencies = sorted(row["latency"] for row in rows if row["latency"] is not None)
+    failed = sum(1 for row in rows if row["status"] != "completed")
+    p50 = latencies[len(latencies) // 2] if latencies else 0
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0
+    tokens = sum((row["prompt_tokens"] or 0) + (row["completion_tokens"] or 0) for row in rows)
+    print(
+        f"{len(rows)}개 중 실패 {failed}개 · {elapsed:.1f}초 ({len(rows) / elapsed if elapsed else 0:.1f}/초) · "
+        f"지연 p50 {p50:.2f}초 / p95 {p95:.2f}초 · 토큰 {tokens:,}",
+        file=sys.stderr
+    )
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="질문 JSONL 을 Assistant 로 일괄 실행")
+    parser.add_argument("input", help="질문 JSONL 경로")
+    parser.add_argument("-o", "--output", required=True, help="결과 경로 (.jsonl 또는 .parquet)")
+    parser.add_argument("--workers", type=int, default=16, help="동시에 실행할 최대 질문 수")
+    parser.add_argument("--rate", type=float, default=0, help="초당 시작할 최대 질문 수 (0 이면 제한 없음)")
+    parser.add_argument("--images-dir", help="생성된 이미지를 저장할 디렉터리")
+    parser.add_argument("--keep-threads", action="store_true", help="실행한 스레드를 지우지 않음")
+    parser.add_argument("--progress-every", type=int, default=50, help="진행 상황 출력 간격 (질문 수)")
+    parser.add_argument("--mock", action="store_true", help="bench/mock_server.py 를 띄워서 실행 (CI 용)")
+    parser.add_argument("--fail-on-error", action="store_true", help="실패한 질문이 있으면 종료 코드 1")
+    args = parser.parse_args()
+
+    items = read_prompts(args.input)
+    if args.images_dir:
+        os.makedirs(args.images_dir, exist_ok=True)
+
+    server = None
+    if args.mock:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench"))
+        from mock_server import start_server
+
+        server, _ = start_server()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        os.environ.update({
+            "EXER_AZURE_OPENAI_ENDPOINT": base_url,
+            "EXER_AZURE_OPENAI_API_KEY": "mock",
+            "OPEN_METEO_FORECAST_URL": base_url + "/v1/forecast",
+            "ASSISTANT_REGISTRY_PATH": os.path.join(tempfile.mkdtemp(), "assistant_registry.json"),
+        })
+
+    rows, elapsed = run_batch(items, args)
+    failed = summarize(rows, elapsed)
+    if server is not None:
+        server.shutdown()
+    if failed and args.fail_on_error:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
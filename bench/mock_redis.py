@@ -0,0 +1,188 @@
+import argparse
+import socketserver
+import threading
+import time
+
+# ==================== 모의 Redis 서버 ====================
+# session_store 의 Redis 백엔드가 쓰는 명령만 RESP2 로 흉내내서,
+# 실제 Redis 없이 여러 앱 프로세스가 세션을 나눠 쓰는 구성을 로컬에서 띄워 본다.
+#   SESSION_BACKEND=redis SESSION_REDIS_URL=redis://127.0.0.1:6399/0 streamlit run app.py --server.port 8501
+#   SESSION_BACKEND=redis SESSION_REDIS_URL=redis://127.0.0.1:6399/0 streamlit run app.py --server.port 8502
+# 값은 메모리에만 있으므로 서버를 끄면 사라짐
+
+
+class MockRedisState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}
+        self.expires = {}
+        self.commands = 0
+
+    def _alive(self, key):
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def _list(self, key):
+        if self._alive(key) and not isinstance(self.data[key], list):
+            raise TypeError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return self.data.get(key, [])
+
+    def execute(self, name, args):
+        self.commands += 1
+        if name == "PING":
+            return "+PONG"
+        if name in ("SELECT", "CLIENT"):
+            return "+OK"
+        if name == "GET":
+            if not self._alive(args[0]):
+                return None
+            value = self.data[args[0]]
+            if isinstance(value, list):
+                raise TypeError("WRONGTYPE Operation against a key holding the wrong kind of value")
+            return value
+        if name == "SET":
+            key, value = args[0], args[1]
+            self.data[key] = value
+            self.expires.pop(key, None)
+            options = [arg.upper() for arg in args[2:]]
+            if b"EX" in options:
+                self.expires[key] = time.time() + int(args[2 + options.index(b"EX") + 1])
+            return "+OK"
+        if name == "DEL":
+            removed = 0
+            for key in args:
+                if self._alive(key):
+                    del self.data[key]
+                    self.expires.pop(key, None)
+                    removed += 1
+            return removed
+        if name == "EXPIRE":
+            if not self._alive(args[0]):
+                return 0
+            self.expires[args[0]] = time.time() + int(args[1])
+            return 1
+        if name == "RPUSH":
+            items = self._list(args[0])
+            items.extend(args[1:])
+            self.data[args[0]] = items
+            return len(items)
+        if name == "LLEN":
+            return len(self._list(args[0]))
+        if name == "LRANGE":
+            items = self._list(args[0])
+            return items[_slice(len(items), int(args[1]), int(args[2]))]
+        if name == "LTRIM":
+            items = self._list(args[0])
+            kept = items[_slice(len(items), int(args[1]), int(args[2]))]
+            if kept:
+                self.data[args[0]] = kept
+            else:
+                self.data.pop(args[0], None)
+                self.expires.pop(args[0], None)
+            return "+OK"
+        raise TypeError(f"ERR unknown command '{name}'")
+
+
+def _slice(length, start, stop):
+    # Redis 범위는 양 끝을 포함하고 음수는 뒤에서부터
+    if start < 0:
+        start = max(length + start, 0)
+    if stop < 0:
+        stop += length
+    return slice(start, stop + 1)
+
+
+def _encode(value):
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return value.encode("utf-8") + b"\r\n"
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_encode(item) for item in value)
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class Handler(socketserver.StreamRequestHandler):
+    state = None
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # redis-cli 로 직접 치는 인라인 명령
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def handle(self):
+        queued = None
+        while True:
+            command = self._read_command()
+            if command is None:
+                return
+            if not command:
+                continue
+            name = command[0].decode("ascii").upper()
+            if name == "MULTI":
+                queued = []
+                reply = "+OK"
+            elif name == "DISCARD":
+                queued = None
+                reply = "+OK"
+            elif name == "EXEC":
+                # 트랜잭션의 명령은 락 하나로 묶어 한 번에 실행
+                replies = []
+                with self.state.lock:
+                    for queued_name, args in queued or []:
+                        try:
+                            replies.append(self.state.execute(queued_name, args))
+                        except TypeError as e:
+                            replies.append(f"-{e}")
+                queued = None
+                reply = replies
+            elif queued is not None:
+                queued.append((name, command[1:]))
+                reply = "+QUEUED"
+            else:
+                try:
+                    with self.state.lock:
+                        reply = self.state.execute(name, command[1:])
+                except TypeError as e:
+                    reply = f"-{e}"
+            self.wfile.write(_encode(reply))
+
+
+def start_server(host="127.0.0.1", port=0):
+    state = MockRedisState()
+    handler = type("BoundHandler", (Handler,), {"state": state})
+    server = socketserver.ThreadingTCPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="세션 저장소용 모의 Redis 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6399)
+    args = parser.parse_args()
+
+    server, _ = start_server(args.host, args.port)
+    print(f"mock redis listening on redis://{args.host}:{server.server_address[1]}/0")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,542 @@
+import argparse
+import base64
+import hashlib
+import json
+import re
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# ==================== 모의 Azure Assistants 서버 ====================
+# app.py 가 쓰는 assistants / threads / messages / runs / files 엔드포인트와
+# open-meteo 날씨 API 를 로컬에서 흉내내서, 실제 Azure 없이 지연·처리량을 측정한다.
+#
+# 시나리오는 사용자 메시지 내용으로 결정:
+#   - "날씨" / "weather" 포함 -> get_current_weather 도구 호출
+#   - "시간" / "time" 포함   -> get_current_time 도구 호출
+#   - "그래프" / "graph" 포함 -> 답변에 image_file 블록 추가
+#   - "문서" / "docs" 포함   -> Assistant 에 search_docs 가 있으면 그 도구 호출
+# 임베딩(/deployments/*/embeddings)은 글자 3-gram 해시 벡터라 비슷한 문장끼리 가깝게 나옴
+
+WEATHER_WORDS = ("날씨", "weather")
+TIME_WORDS = ("시간", "time")
+IMAGE_WORDS = ("그래프", "graph")
+DOCS_WORDS = ("문서", "docs")
+EMBEDDING_DIM = 256
+CITIES = ("Tokyo", "Seoul", "Paris", "London", "San Francisco")
+
+
+def _now():
+    return int(time.time())
+
+
+def _id(prefix):
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def _png(width=64, height=48):
+    # 외부 의존성 없이 단색 PNG 생성
+    raw = b"".join(b"\x00" + b"\x66\x7e\xea" * width for _ in range(height))
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw))
+            + chunk(b"IEND", b""))
+
+
+def embedding(text):
+    vector = [0.0] * EMBEDDING_DIM
+    padded = f" {text.lower()} "
+    for i in range(len(padded) - 2):
+        digest = hashlib.md5(padded[i:i + 3].encode("utf-8")).digest()
+        vector[int.from_bytes(digest[:4], "little") % EMBEDDING_DIM] += 1.0
+    return vector
+
+
+class MockState:
+    def __init__(self, latency=0.0, first_token_delay=0.05, token_delay=0.005, answer_tokens=40, prefill_delay=0.0,
+                 rpm=0):
+        self.latency = latency
+        # 0 이 아니면 Azure 처럼 10초 창에 rpm/6 개를 넘는 요청에 429 + Retry-After 응답
+        self.rpm = rpm
+        self.request_times = deque()
+        self.first_token_delay = first_token_delay
+        self.prefill_delay = prefill_delay
+        self.token_delay = token_delay
+        self.answer_tokens = answer_tokens
+        self.lock = threading.Lock()
+        self.assistants = {}
+        self.threads = {}
+        self.messages = {}
+        self.runs = {}
+        self.files = {}
+        self.calls = Counter()
+        self.throttled = 0
+
+    def throttle(self):
+        # 초과면 재시도까지 남은 초, 아니면 None
+        if not self.rpm:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            while self.request_times and now - self.request_times[0] > 10:
+                self.request_times.popleft()
+            if len(self.request_times) >= max(1, self.rpm // 6):
+                self.throttled += 1
+                return 10 - (now - self.request_times[0])
+            self.request_times.append(now)
+        return None
+
+    # ---------- 객체 생성 ----------
+    def new_message(self, thread_id, role, content, run_id=None, assistant_id=None):
+        blocks = content if isinstance(content, list) else [
+            {"type": "text", "text": {"value": content, "annotations": []}}
+        ]
+        message = {
+            "id": _id("msg"), "object": "thread.message", "created_at": _now(),
+            "thread_id": thread_id, "role": role, "content": blocks,
+            "assistant_id": assistant_id, "run_id": run_id, "attachments": [],
+            "metadata": {}, "status": "completed", "completed_at": _now(),
+            "incomplete_at": None, "incomplete_details": None,
+        }
+        with self.lock:
+            self.messages.setdefault(thread_id, []).append(message)
+        return message
+
+    def new_thread(self, messages=None):
+        thread = {"id": _id("thread"), "object": "thread", "created_at": _now(),
+                  "metadata": {}, "tool_resources": None}
+        with self.lock:
+            self.threads[thread["id"]] = thread
+            self.messages[thread["id"]] = []
+        for m in messages or []:
+            self.new_message(thread["id"], m.get("role", "user"), m["content"])
+        return thread
+
+    def new_run(self, thread_id, body):
+        for m in body.get("additional_messages") or []:
+            self.new_message(thread_id, m.get("role", "user"), m["content"])
+        prompt = self.last_user_text(thread_id)
+        tool_calls = []
+        lowered = prompt.lower()
+        city = next((c for c in CITIES if c.lower() in lowered), "Seoul")
+        if any(w in lowered for w in WEATHER_WORDS):
+            tool_calls.append(("get_current_weather", {"location": city}))
+        if any(w in lowered for w in TIME_WORDS):
+            tool_calls.append(("get_current_time", {"location": city}))
+        if any(w in lowered for w in DOCS_WORDS) and self.has_tool(body.get("assistant_id"), "search_docs"):
+            tool_calls.append(("search_docs", {"query": prompt}))
+        run = {
+            "id": _id("run"), "object": "thread.run", "created_at": _now(),
+            "thread_id": thread_id, "assistant_id": body.get("assistant_id"),
+            "status": "queued", "required_action": None, "last_error": None,
+            "expires_at": None, "started_at": None, "cancelled_at": None,
+            "failed_at": None, "completed_at": None, "incomplete_details": None,
+            "model": body.get("model") or "gpt-4o-mini", "instructions": "",
+            "tools": [], "metadata": {}, "usage": None,
+            "temperature": body.get("temperature"), "top_p": body.get("top_p"),
+            "max_prompt_tokens": body.get("max_prompt_tokens"),
+            "max_completion_tokens": body.get("max_completion_tokens"),
+            "truncation_strategy": body.get("truncation_strategy") or {"type": "auto", "last_messages": None},
+            "tool_choice": "auto", "parallel_tool_calls": True, "response_format": "auto",
+            # 아래는 내부 상태 (응답에서 제외)
+            "_prompt": prompt, "_pending_tools": tool_calls, "_tool_outputs": None,
+            "_image": any(w in lowered for w in IMAGE_WORDS), "_started": time.monotonic(),
+        }
+        with self.lock:
+            self.runs[run["id"]] = run
+        return run
+
+    def has_tool(self, assistant_id, name):
+        assistant = self.assistants.get(assistant_id) or {}
+        return any((tool.get("function") or {}).get("name") == name for tool in assistant.get("tools") or [])
+
+    def last_user_text(self, thread_id):
+        with self.lock:
+            messages = list(self.messages.get(thread_id, []))
+        for m in reversed(messages):
+            if m["role"] == "user":
+                return "".join(b["text"]["value"] for b in m["content"] if b["type"] == "text")
+        return ""
+
+    def prompt_tokens(self, run):
+        # truncation_strategy / max_prompt_tokens 를 반영한 대략적인 프롬프트 토큰 수 (2글자 = 1토큰)
+        with self.lock:
+            messages = list(self.messages.get(run["thread_id"], []))
+        strategy = run["truncation_strategy"] or {}
+        if strategy.get("type") == "last_messages" and strategy.get("last_messages"):
+            messages = messages[-strategy["last_messages"]:]
+        chars = sum(len(b["text"]["value"]) for m in messages for b in m["content"] if b["type"] == "text")
+        tokens = max(1, chars // 2)
+        if run["max_prompt_tokens"]:
+            tokens = min(tokens, run["max_prompt_tokens"])
+        return tokens
+
+    def time_to_first_token(self, run):
+        # 프롬프트가 길수록 첫 토큰이 늦어지는 것을 흉내냄
+        return self.first_token_delay + self.prefill_delay * self.prompt_tokens(run) / 1000
+
+    # ---------- 답변 ----------
+    def answer_tokens_for(self, run):
+        head = f"'{run['_prompt'][:30]}'에 대한 모의 답변입니다."
+        if run["_tool_outputs"]:
+            head += " 도구 결과: " + "; ".join(o["output"] for o in run["_tool_outputs"])
+        return [head] + [f" 토큰{i}" for i in range(self.answer_tokens)]
+
+    def finish_run(self, run, tokens):
+        blocks = [{"type": "text", "text": {"value": "".join(tokens), "annotations": []}}]
+        if run["_image"]:
+            file_id = _id("file")
+            with self.lock:
+                self.files[file_id] = _png()
+            blocks.append({"type": "image_file", "image_file": {"file_id": file_id, "detail": None}})
+        message = self.new_message(run["thread_id"], "assistant", blocks,
+                                   run_id=run["id"], assistant_id=run["assistant_id"])
+        prompt_tokens = self.prompt_tokens(run)
+        completion_tokens = len(tokens)
+        run.update(status="completed", completed_at=_now(), required_action=None, usage={
+            "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        })
+        return message
+
+    def require_action(self, run):
+        calls = [{"id": _id("call"), "type": "function",
+                  "function": {"name": name, "arguments": json.dumps(args)}}
+                 for name, args in run["_pending_tools"]]
+        run["_pending_tools"] = []
+        run.update(status="requires_action", required_action={
+            "type": "submit_tool_outputs", "submit_tool_outputs": {"tool_calls": calls}})
+
+    # 폴링용: 경과 시간에 따라 상태 진행
+    def advance(self, run):
+        if run["status"] == "cancelling":
+            run.update(status="cancelled", cancelled_at=_now())
+        if run["status"] in ("queued", "in_progress"):
+            elapsed = time.monotonic() - run["_started"]
+            first_token = self.time_to_first_token(run)
+            total = first_token + self.token_delay * self.answer_tokens
+            if run["_pending_tools"] and elapsed >= first_token:
+                self.require_action(run)
+            elif not run["_pending_tools"] and elapsed >= total:
+                self.finish_run(run, self.answer_tokens_for(run))
+            else:
+                run["status"] = "in_progress"
+                run["started_at"] = run["started_at"] or _now()
+        return run
+
+
+def public(obj):
+    return {k: v for k, v in obj.items() if not k.startswith("_")}
+
+
+# ==================== HTTP 핸들러 ====================
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 헤더와 본문을 따로 쓰므로 Nagle 이 켜져 있으면 keep-alive 요청마다 ~40ms 지연이 생김
+    disable_nagle_algorithm = True
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    # ---------- 공통 ----------
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def _send(self, status, payload, content_type="application/json"):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _not_found(self, message=None):
+        # Azure 처럼 어떤 리소스가 없는지 메시지에 담음 ("No assistant found with id '...'.")
+        message = message or f"not found: {self.path}"
+        self._send(404, {"error": {"message": message, "type": "invalid_request_error", "code": "not_found"}})
+
+    def _missing_assistant(self, body):
+        if body.get("assistant_id") in self.state.assistants:
+            return False
+        self._not_found(f"No assistant found with id '{body.get('assistant_id')}'.")
+        return True
+
+    def _sse_start(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def _sse(self, event, data):
+        payload = data if isinstance(data, str) else json.dumps(data)
+        self.wfile.write(f"event: {event}\ndata: {payload}\n\n".encode())
+        self.wfile.flush()
+
+    def _route(self, method):
+        parsed = urlparse(self.path)
+        path = re.sub(r"^/openai", "", parsed.path).rstrip("/")
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        key = re.sub(r"(asst|thread|msg|run|file)_[0-9a-f]+", r"{\1}", path)
+        # 한도는 Azure 엔드포인트에만 적용 (날씨 API, 통계 경로 제외)
+        retry = self.state.throttle() if parsed.path.startswith("/openai/") else None
+        if retry is not None:
+            self.state.calls[f"429 {method} {key}"] += 1
+            self._body()
+            data = json.dumps({"error": {"code": "429", "message": "Rate limit is exceeded."}}).encode()
+            self.send_response(429)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("retry-after-ms", str(int(retry * 1000)))
+            self.send_header("Retry-After", str(max(1, round(retry))))
+            self.end_headers()
+            self.wfile.write(data)
+            return None, None
+        self.state.calls[f"{method} {key}"] += 1
+        if self.state.latency and not path.startswith("/_"):
+            time.sleep(self.state.latency)
+        return path, query
+
+    # ---------- 스트리밍 ----------
+    def _stream_run(self, run, created=True):
+        try:
+            self._write_run_events(run, created)
+        except (BrokenPipeError, ConnectionResetError):
+            # 클라이언트가 스트림을 끊으면 (취소/중단) 조용히 종료
+            pass
+
+    def _write_run_events(self, run, created):
+        state = self.state
+        self._sse_start()
+        if created:
+            self._sse("thread.run.created", public(run))
+            self._sse("thread.run.queued", public(run))
+        run["status"] = "in_progress"
+        run["started_at"] = run["started_at"] or _now()
+        self._sse("thread.run.in_progress", public(run))
+        time.sleep(state.time_to_first_token(run))
+
+        if run["_pending_tools"]:
+            state.require_action(run)
+            self._sse("thread.run.requires_action", public(run))
+            self._sse("done", "[DONE]")
+            return
+
+        tokens = state.answer_tokens_for(run)
+        draft_id = _id("msg")
+        draft = {"id": draft_id, "object": "thread.message", "created_at": _now(),
+                 "thread_id": run["thread_id"], "role": "assistant", "content": [],
+                 "assistant_id": run["assistant_id"], "run_id": run["id"], "attachments": [],
+                 "metadata": {}, "status": "in_progress", "completed_at": None,
+                 "incomplete_at": None, "incomplete_details": None}
+        self._sse("thread.message.created", draft)
+        for token in tokens:
+            if run["status"] == "cancelling":
+                run.update(status="cancelled", cancelled_at=_now())
+                self._sse("thread.run.cancelled", public(run))
+                self._sse("done", "[DONE]")
+                return
+            self._sse("thread.message.delta", {"id": draft_id, "object": "thread.message.delta", "delta": {
+                "content": [{"index": 0, "type": "text", "text": {"value": token, "annotations": []}}]}})
+            time.sleep(state.token_delay)
+        message = state.finish_run(run, tokens)
+        for index, block in enumerate(message["content"][1:], start=1):
+            self._sse("thread.message.delta", {"id": draft_id, "object": "thread.message.delta", "delta": {
+                "content": [dict(block, index=index)]}})
+        message = dict(message, id=draft_id)
+        self._sse("thread.message.completed", message)
+        self._sse("thread.run.completed", public(run))
+        self._sse("done", "[DONE]")
+
+    # ---------- 메서드 ----------
+    def do_GET(self):
+        path, query = self._route("GET")
+        if path is None:
+            return
+        state = self.state
+
+        if path == "/_stats":
+            return self._send(200, dict(state.calls))
+        if path == "/v1/forecast":
+            seed = int(hashlib.md5(f"{query.get('latitude')},{query.get('longitude')}".encode()).hexdigest(), 16)
+            return self._send(200, {"current": {"temperature_2m": round(10 + seed % 200 / 10, 1), "weather_code": seed % 4}})
+
+        m = re.fullmatch(r"/assistants/(asst_\w+)", path)
+        if m:
+            assistant = state.assistants.get(m.group(1))
+            return self._send(200, assistant) if assistant else self._not_found()
+
+        m = re.fullmatch(r"/threads/(thread_\w+)/messages", path)
+        if m:
+            thread_id = m.group(1)
+            if thread_id not in state.threads:
+                return self._not_found()
+            with state.lock:
+                data = list(state.messages[thread_id])
+            if query.get("run_id"):
+                data = [msg for msg in data if msg["run_id"] == query["run_id"]]
+            if query.get("order", "desc") == "desc":
+                data.reverse()
+            if query.get("after"):
+                ids = [msg["id"] for msg in data]
+                data = data[ids.index(query["after"]) + 1:] if query["after"] in ids else data
+            limit = int(query.get("limit", 20))
+            page = data[:limit]
+            return self._send(200, {"object": "list", "data": page,
+                                    "first_id": page[0]["id"] if page else None,
+                                    "last_id": page[-1]["id"] if page else None,
+                                    "has_more": len(data) > limit})
+
+        m = re.fullmatch(r"/threads/(thread_\w+)/runs/(run_\w+)", path)
+        if m:
+            run = state.runs.get(m.group(2))
+            return self._send(200, public(state.advance(run))) if run else self._not_found()
+
+        m = re.fullmatch(r"/files/(file_\w+)/content", path)
+        if m:
+            data = state.files.get(m.group(1))
+            return self._send(200, data, "image/png") if data else self._not_found()
+
+        self._not_found()
+
+    def do_POST(self):
+        path, query = self._route("POST")
+        if path is None:
+            return
+        state = self.state
+        body = self._body()
+
+        if path == "/_reset":
+            state.calls.clear()
+            return self._send(200, {"ok": True})
+
+        if path == "/assistants":
+            assistant = dict(body, id=_id("asst"), object="assistant", created_at=_now(),
+                             description=None, metadata={}, response_format="auto")
+            state.assistants[assistant["id"]] = assistant
+            return self._send(200, assistant)
+
+        m = re.fullmatch(r"/assistants/(asst_\w+)", path)
+        if m:
+            assistant = state.assistants.get(m.group(1))
+            if not assistant:
+                return self._not_found()
+            assistant.update(body)
+            return self._send(200, assistant)
+
+        m = re.fullmatch(r"/deployments/([^/]+)/embeddings", path)
+        if m:
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            data = []
+            for i, text in enumerate(inputs):
+                vector = embedding(text)
+                if body.get("encoding_format") == "base64":
+                    vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+                data.append({"object": "embedding", "index": i, "embedding": vector})
+            tokens = sum(max(1, len(text) // 2) for text in inputs)
+            return self._send(200, {"object": "list", "data": data, "model": m.group(1),
+                                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+        if path == "/threads":
+            return self._send(200, state.new_thread(body.get("messages")))
+
+        if path == "/threads/runs":
+            if self._missing_assistant(body):
+                return
+            thread = state.new_thread((body.get("thread") or {}).get("messages"))
+            run = state.new_run(thread["id"], body)
+            return self._stream_run(run) if body.get("stream") else self._send(200, public(run))
+
+        m = re.fullmatch(r"/threads/(thread_\w+)/messages", path)
+        if m:
+            if m.group(1) not in state.threads:
+                return self._not_found()
+            return self._send(200, state.new_message(m.group(1), body.get("role", "user"), body["content"]))
+
+        m = re.fullmatch(r"/threads/(thread_\w+)/runs", path)
+        if m:
+            if m.group(1) not in state.threads:
+                return self._not_found(f"No thread found with id '{m.group(1)}'.")
+            if self._missing_assistant(body):
+                return
+            run = state.new_run(m.group(1), body)
+            return self._stream_run(run) if body.get("stream") else self._send(200, public(run))
+
+        m = re.fullmatch(r"/threads/(thread_\w+)/runs/(run_\w+)/submit_tool_outputs", path)
+        if m:
+            run = state.runs.get(m.group(2))
+            if not run or run["status"] != "requires_action":
+                return self._send(400, {"error": {"message": "run is not waiting for tool outputs", "type": "invalid_request_error"}})
+            run.update(_tool_outputs=body.get("tool_outputs"), status="queued", required_action=None,
+                       _started=time.monotonic() - state.time_to_first_token(run))
+            return self._stream_run(run, created=False) if body.get("stream") else self._send(200, public(run))
+
+        m = re.fullmatch(r"/threads/(thread_\w+)/runs/(run_\w+)/cancel", path)
+        if m:
+            run = state.runs.get(m.group(2))
+            if not run:
+                return self._not_found()
+            if run["status"] not in ("queued", "in_progress", "requires_action"):
+                return self._send(400, {"error": {"message": f"Cannot cancel run with status '{run['status']}'.", "type": "invalid_request_error"}})
+            run.update(status="cancelling")
+            return self._send(200, public(run))
+
+        self._not_found()
+
+    def do_DELETE(self):
+        path, _ = self._route("DELETE")
+        if path is None:
+            return
+        m = re.fullmatch(r"/threads/(thread_\w+)", path)
+        if m and self.state.threads.pop(m.group(1), None):
+            return self._send(200, {"id": m.group(1), "object": "thread.deleted", "deleted": True})
+        self._not_found()
+
+
+# ==================== 실행 ====================
+def start_server(host="127.0.0.1", port=0, **options):
+    state = MockState(**options)
+    handler = type("BoundHandler", (Handler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="모의 Azure Assistants + open-meteo 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="요청마다 추가되는 지연 (초)")
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--answer-tokens", type=int, default=40)
+    parser.add_argument("--prefill-delay", type=float, default=0.0, help="프롬프트 1000 토큰당 첫 토큰 추가 지연 (초)")
+    parser.add_argument("--rpm", type=int, default=0, help="분당 요청 한도 (넘으면 429, 0 이면 제한 없음)")
+    args = parser.parse_args()
+
+    server, _ = start_server(args.host, args.port, latency=args.latency,
+                             first_token_delay=args.first_token_delay,
+                             token_delay=args.token_delay, answer_tokens=args.answer_tokens,
+                             prefill_delay=args.prefill_delay, rpm=args.rpm)
+    print(f"mock server: http://{args.host}:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
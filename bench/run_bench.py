@@ -0,0 +1,274 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+# ==================== 챗봇 벤치마크 ====================
+# 모의 서버(mock_server.py)를 띄우고 Streamlit AppTest 로 app.py 를 헤드리스로 실행해서
+# 세션 N개가 동시에 질문할 때의 지연·API 호출 수·재실행 시간·메모리를 측정한다.
+#
+#   python bench/run_bench.py --sessions 8 --turns 3
+#   python bench/run_bench.py --json bench_result.json
+#   python bench/run_bench.py --baseline bench_result.json --max-regression 0.2
+#
+# --baseline 결과보다 지정 비율 이상 나빠진 지표가 있으면 종료 코드 1 (배포 전 회귀 검사용)
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+APP_PATH = os.path.join(APP_DIR, "app.py")
+
+# 턴마다 돌아가며 사용하는 질문 (일반 / 도구 호출 / 이미지 시나리오)
+DEFAULT_PROMPTS = [
+    "AI Agent란 무엇인가요?",
+    "서울 날씨와 시간 알려줘",
+    "y = x^2 그래프를 그려주세요",
+]
+
+# 회귀 검사 대상 지표 (값이 클수록 나쁨)
+REGRESSION_METRICS = ("ttft_p50", "ttft_p95", "turn_p50", "turn_p95", "calls_per_turn", "rerun_p50", "memory_per_session_kb")
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values):
+    if not values:
+        return {"p50": None, "p95": None, "mean": None}
+    return {"p50": percentile(values, 0.5), "p95": percentile(values, 0.95), "mean": statistics.fmean(values)}
+
+
+# ==================== 측정 환경 ====================
+def configure_environment(args, base_url, workdir):
+    # app.py 가 import 되기 전에 설정해야 모듈 수준 설정값에 반영됨
+    os.environ.update({
+        "EXER_AZURE_OPENAI_ENDPOINT": base_url,
+        "EXER_AZURE_OPENAI_API_KEY": "bench",
+        "OPEN_METEO_FORECAST_URL": base_url + "/v1/forecast",
+        "ASSISTANT_REGISTRY_PATH": os.path.join(workdir, "assistant_registry.json"),
+        "CONVERSATION_DB_PATH": os.path.join(workdir, "conversations.db"),
+        "SESSION_DB_PATH": os.path.join(workdir, "sessions.db"),
+        "RUN_MODE": args.mode,
+    })
+    for item in args.env:
+        key, _, value = item.partition("=")
+        os.environ[key] = value
+    sys.path.insert(0, APP_DIR)
+
+
+def serialize_script_compile():
+    # AppTest 는 실행마다 스크립트를 다시 컴파일하는데, Python 3.11 의 ast.parse 는
+    # 여러 스레드에서 동시에 호출하면 SystemError 가 날 수 있어서 컴파일만 직렬화
+    from streamlit.runtime.scriptrunner import magic
+
+    add_magic = magic.add_magic
+    lock = threading.Lock()
+
+    def locked_add_magic(code, script_path):
+        with lock:
+            return add_magic(code, script_path)
+
+    magic.add_magic = locked_add_magic
+
+
+class TurnRecorder:
+    # 엔진에 제출된 턴 핸들을 모아서 TTFT / 턴 지연을 계산
+    def __init__(self, engine):
+        self.handles = []
+        self._lock = threading.Lock()
+        submit = engine.submit
+
+        def recording_submit(*args, **kwargs):
+            handle = submit(*args, **kwargs)
+            with self._lock:
+                self.handles.append(handle)
+            return handle
+
+        engine.submit = recording_submit
+
+    def reset(self):
+        with self._lock:
+            self.handles = []
+
+    def timings(self):
+        with self._lock:
+            handles = list(self.handles)
+        ttft = [h.first_token_at - h.submitted_at for h in handles if h.first_token_at]
+        turn = [h.finished_at - h.submitted_at for h in handles if h.finished_at]
+        return ttft, turn
+
+
+# ==================== 세션 실행 ====================
+def run_session(index, args, prompts):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+    at.run()
+    reruns = []
+    errors = 0
+    for turn in range(args.turns):
+        # 세션마다 질문을 다르게 해서 응답 캐시가 측정을 가리지 않도록 함
+        prompt = f"{prompts[turn % len(prompts)]} (#{index}-{turn})"
+        at.chat_input[0].set_value(prompt).run()
+        if at.exception:
+            errors += 1
+        # 입력 없는 재실행 = 위젯 조작 시 매번 드는 비용 (기록 렌더링 포함)
+        started = time.perf_counter()
+        at.run()
+        reruns.append(time.perf_counter() - started)
+    return at, reruns, errors
+
+
+def run_sessions(args, prompts):
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        return list(pool.map(lambda i: run_session(i, args, prompts), range(args.sessions)))
+
+
+def measure(args, state, recorder, prompts):
+    # 1) 예열: 어시스턴트 생성, 모듈 import 등 1회성 비용 제외
+    run_session("warmup", argparse.Namespace(**dict(vars(args), turns=1)), prompts)
+    state.calls.clear()
+    recorder.reset()
+
+    # 2) 동시 세션 지연 측정
+    started = time.perf_counter()
+    sessions = run_sessions(args, prompts)
+    wall = time.perf_counter() - started
+    ttft, turn = recorder.timings()
+    reruns = [r for _, session_reruns, _ in sessions for r in session_reruns]
+    errors = sum(e for _, _, e in sessions)
+    turns = args.sessions * args.turns
+    calls = dict(state.calls)
+    api_calls = sum(count for key, count in calls.items() if not key.startswith("GET /v1/forecast"))
+    del sessions
+
+    # 3) 세션당 메모리: 세션 N개를 만든 뒤 살아 있는 할당량 증가분 / N
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = run_sessions(args, prompts)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+
+    return {
+        "config": {"sessions": args.sessions, "turns": args.turns, "mode": args.mode,
+                   "latency": args.latency, "first_token_delay": args.first_token_delay,
+                   "token_delay": args.token_delay, "answer_tokens": args.answer_tokens,
+                   "prefill_delay": args.prefill_delay},
+        "turns": turns,
+        "errors": errors,
+        "wall_seconds": wall,
+        "turns_per_second": turns / wall if wall else None,
+        "ttft": summarize(ttft),
+        "turn_latency": summarize(turn),
+        "rerun": summarize(reruns),
+        "calls_per_turn": api_calls / turns,
+        "calls": calls,
+        "memory_per_session_kb": (after - before) / args.sessions / 1024,
+    }
+
+
+# ==================== 출력 / 회귀 검사 ====================
+def flatten(result):
+    return {
+        "ttft_p50": result["ttft"]["p50"],
+        "ttft_p95": result["ttft"]["p95"],
+        "turn_p50": result["turn_latency"]["p50"],
+        "turn_p95": result["turn_latency"]["p95"],
+        "calls_per_turn": result["calls_per_turn"],
+        "rerun_p50": result["rerun"]["p50"],
+        "memory_per_session_kb": result["memory_per_session_kb"],
+    }
+
+
+def print_report(result):
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:8.1f} ms"
+
+    config = result["config"]
+    print(f"세션 {config['sessions']}개 x {config['turns']}턴 ({config['mode']}) - "
+          f"{result['wall_seconds']:.2f}초, {result['turns_per_second']:.1f} 턴/초, 오류 {result['errors']}")
+    print(f"{'':14}{'p50':>11}{'p95':>11}{'mean':>11}")
+    for label, key in (("TTFT", "ttft"), ("turn", "turn_latency"), ("rerun", "rerun")):
+        stats = result[key]
+        print(f"{label:14}{ms(stats['p50']):>11}{ms(stats['p95']):>11}{ms(stats['mean']):>11}")
+    print(f"턴당 API 호출: {result['calls_per_turn']:.2f}")
+    for key, count in sorted(result["calls"].items()):
+        print(f"  {key:55} {count}")
+    print(f"세션당 메모리: {result['memory_per_session_kb']:.0f} KB")
+
+
+def check_regression(result, baseline, max_regression):
+    current, previous = flatten(result), flatten(baseline)
+    failed = []
+    for key in REGRESSION_METRICS:
+        if current[key] is None or not previous[key]:
+            continue
+        change = current[key] / previous[key] - 1
+        if change > max_regression:
+            failed.append(f"{key}: {previous[key]:.4g} -> {current[key]:.4g} (+{change:.0%})")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="모의 서버 기반 챗봇 벤치마크")
+    parser.add_argument("--sessions", type=int, default=4, help="동시 세션 수")
+    parser.add_argument("--turns", type=int, default=3, help="세션당 질문 수")
+    parser.add_argument("--mode", choices=("stream", "poll"), default="stream", help="RUN_MODE")
+    parser.add_argument("--prompt", action="append", help="질문 (여러 번 지정 가능, 기본: 일반/도구/이미지)")
+    parser.add_argument("--latency", type=float, default=0.02, help="모의 서버 요청당 지연 (초)")
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--answer-tokens", type=int, default=40)
+    parser.add_argument("--prefill-delay", type=float, default=0.0, help="프롬프트 1000 토큰당 첫 토큰 추가 지연 (초)")
+    parser.add_argument("--timeout", type=float, default=60, help="AppTest 실행 제한 시간 (초)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="앱 환경 변수 추가")
+    parser.add_argument("--json", help="결과를 JSON 으로 저장할 경로")
+    parser.add_argument("--baseline", help="비교할 이전 결과 JSON")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="허용하는 최대 악화 비율")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BENCH_DIR)
+    from mock_server import start_server
+
+    server, state = start_server(latency=args.latency, first_token_delay=args.first_token_delay,
+                                 token_delay=args.token_delay, answer_tokens=args.answer_tokens,
+                                 prefill_delay=args.prefill_delay)
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(args, f"http://127.0.0.1:{server.server_port}", workdir)
+        from engine import get_engine
+
+        serialize_script_compile()
+        recorder = TurnRecorder(get_engine())
+        result = measure(args, state, recorder, args.prompt or DEFAULT_PROMPTS)
+    server.shutdown()
+
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            failed = check_regression(result, json.load(f), args.max_regression)
+        if failed:
+            print("회귀 감지:")
+            for line in failed:
+                print(f"  {line}")
+            sys.exit(1)
+    if result["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
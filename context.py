@@ -0,0 +1,80 @@
+import os
+import threading
+from collections import OrderedDict
+
+# ==================== 컨텍스트 관리 설정 ====================
+# run 마다 서버가 프롬프트에 넣을 최대 토큰 수 / 최근 메시지 수 (0 이면 서버 기본값 사용)
+CONTEXT_MAX_PROMPT_TOKENS = int(os.getenv("CONTEXT_MAX_PROMPT_TOKENS", "0"))
+CONTEXT_LAST_MESSAGES = int(os.getenv("CONTEXT_LAST_MESSAGES", "0"))
+
+# 마지막 run 의 프롬프트 토큰이 이 값을 넘으면 요약해서 새 스레드로 옮김 (0 이면 끔)
+CONTEXT_COMPACT_TOKENS = int(os.getenv("CONTEXT_COMPACT_TOKENS", "12000"))
+# 요약하지 않고 새 스레드에 그대로 옮길 최근 메시지 수
+CONTEXT_KEEP_MESSAGES = int(os.getenv("CONTEXT_KEEP_MESSAGES", "4"))
+# 요약 대상 메시지를 읽어 올 최대 개수
+CONTEXT_SUMMARY_SOURCE_LIMIT = int(os.getenv("CONTEXT_SUMMARY_SOURCE_LIMIT", "100"))
+
+MAX_TRACKED_THREADS = int(os.getenv("CONTEXT_MAX_TRACKED_THREADS", "10000"))
+
+SUMMARY_REQUEST = "지금까지의 대화를 이어서 진행할 수 있도록 요약해주세요."
+SUMMARY_INSTRUCTIONS = """
+이 대화는 길이 제한 때문에 새 스레드로 옮겨집니다.
+지금까지 사용자와 나눈 대화를 한국어로 요약하세요.
+- 사용자의 목표, 질문, 중요한 사실과 수치, 결론을 빠짐없이 남깁니다.
+- 코드나 수식은 이후 대화에 필요한 부분만 그대로 남깁니다.
+- 인사말이나 요약에 대한 설명 없이 요약 본문만 작성합니다.
+"""
+SUMMARY_PREFIX = "[이전 대화 요약]\n"
+
+
+def run_context_params():
+    params = {}
+    if CONTEXT_LAST_MESSAGES > 0:
+        params["truncation_strategy"] = {"type": "last_messages", "last_messages": CONTEXT_LAST_MESSAGES}
+    if CONTEXT_MAX_PROMPT_TOKENS > 0:
+        params["max_prompt_tokens"] = CONTEXT_MAX_PROMPT_TOKENS
+    return params
+
+
+# ==================== 스레드별 토큰 사용량 ====================
+class ThreadUsage:
+    def __init__(self, max_threads=MAX_TRACKED_THREADS):
+        self.max_threads = max_threads
+        self._threads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, thread_id, usage):
+        # prompt_tokens 는 다음 run 이 다시 보낼 문맥 크기에 가까우므로 마지막 값을 따로 보관
+        with self._lock:
+            entry = self._threads.get(thread_id) or {
+                "runs": 0, "last_prompt_tokens": 0, "prompt_tokens": 0, "completion_tokens": 0
+            }
+            entry["runs"] += 1
+            entry["last_prompt_tokens"] = usage.prompt_tokens
+            entry["prompt_tokens"] += usage.prompt_tokens
+            entry["completion_tokens"] += usage.completion_tokens
+            self._threads[thread_id] = entry
+            self._threads.move_to_end(thread_id)
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+            return dict(entry)
+
+    def get(self, thread_id):
+        with self._lock:
+            entry = self._threads.get(thread_id)
+            return dict(entry) if entry else None
+
+    def needs_compaction(self, thread_id):
+        # 요약본 + 최근 메시지만으로도 예산을 넘는 경우 매 턴 다시 요약하지 않도록 run 2회 이상부터
+        entry = self.get(thread_id)
+        return bool(
+            CONTEXT_COMPACT_TOKENS and entry and entry["runs"] >= 2
+            and entry["last_prompt_tokens"] > CONTEXT_COMPACT_TOKENS
+        )
+
+    def forget(self, thread_id):
+        with self._lock:
+            self._threads.pop(thread_id, None)
+
+
+thread_usage = ThreadUsage()
@@ -0,0 +1,462 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import uuid
+from collections import Counter
+
+# ==================== 대화 저장소 설정 ====================
+DB_PATH = os.getenv("CONVERSATION_DB_PATH", "conversations.db")
+
+# 검색 순위에서 제목에 들어 있는 단어의 가중치 (본문 등장 1회 대비)
+SEARCH_TITLE_WEIGHT = 3.0
+# 너무 긴 토큰(코드, URL 등)은 잘라서 색인 크기를 제한
+SEARCH_TERM_MAX_LEN = 32
+
+# 검색 색인 형식이 바뀌면 올려서 기존 DB 를 다시 색인
+SEARCH_INDEX_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    title TEXT NOT NULL,
+    thread_id TEXT,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_owner ON conversations (owner, updated_at DESC);
+
+CREATE TABLE IF NOT EXISTS messages (
+    conversation_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    images TEXT,
+    PRIMARY KEY (conversation_id, seq)
+) WITHOUT ROWID;
+
+-- 여러 엔드포인트를 쓸 때 스레드를 만든 엔드포인트 (스레드는 그 엔드포인트에만 있음)
+CREATE TABLE IF NOT EXISTS thread_routes (
+    thread_id TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL
+) WITHOUT ROWID;
+
+-- 긴 대화를 요약해서 옮긴 스레드: 이전 스레드 -> 새 스레드
+-- (재시작하거나 다른 워커가 다음 턴을 받아도 새 스레드에서 이어감)
+CREATE TABLE IF NOT EXISTS thread_redirects (
+    thread_id TEXT PRIMARY KEY,
+    replaced_by TEXT NOT NULL
+) WITHOUT ROWID;
+
+-- 미리 만들어 두고 아직 나눠 주지 않은 빈 스레드 (워커가 살아 있는 동안 renewed_at 을 갱신)
+-- 오래 갱신되지 않은 행은 재시작/종료된 워커가 남긴 것이라 정리 대상
+CREATE TABLE IF NOT EXISTS pool_threads (
+    thread_id TEXT PRIMARY KEY,
+    renewed_at REAL NOT NULL
+) WITHOUT ROWID;
+
+-- 검색 색인: 사용자별 단어 -> 대화 (제목/본문 등장 횟수)
+-- 저장할 때 새 메시지의 단어만 더하므로 색인 갱신 비용이 대화 기록 크기와 무관
+CREATE TABLE IF NOT EXISTS search_postings (
+    owner TEXT NOT NULL,
+    term TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    title_hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (owner, term, conversation_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_search_postings_conversation ON search_postings (conversation_id);
+
+-- 이미지 원본은 내용 해시로 한 번만 저장 (refs: 이 이미지를 가리키는 메시지 이미지 수)
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    refs INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+"""
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def _connect():
+    global _schema_ready
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        # Streamlit 은 세션마다 스레드가 다르므로 스레드별 연결 사용
+        conn = sqlite3.connect(DB_PATH, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _schema_lock:
+            if not _schema_ready:
+                conn.executescript(SCHEMA)
+                _add_blob_refs(conn)
+                _build_search_index(conn)
+                _schema_ready = True
+        _local.conn = conn
+    return conn
+
+
+def _add_blob_refs(conn):
+    # refs 열이 생기기 전의 DB 는 처음 한 번만 메시지 전체를 세어서 채움
+    if any(column[1] == "refs" for column in conn.execute("PRAGMA table_info(blobs)")):
+        return
+    with conn:
+        conn.execute("ALTER TABLE blobs ADD COLUMN refs INTEGER NOT NULL DEFAULT 0")
+        conn.execute("""
+            UPDATE blobs SET refs = (
+                SELECT count(*) FROM messages, json_each(messages.images) AS image
+                WHERE messages.images IS NOT NULL AND json_extract(image.value, '$.hash') = blobs.hash
+            )
+        """)
+
+
+def _image_refs(conn, conversation_id, start=0, stop=-1):
+    # 대화의 seq 범위 [start, stop) 메시지가 가리키는 이미지 해시별 개수 (stop 이 -1 이면 끝까지)
+    rows = conn.execute(
+        """
+        SELECT json_extract(image.value, '$.hash'), count(*)
+        FROM messages, json_each(messages.images) AS image
+        WHERE messages.conversation_id = ? AND messages.seq >= ? AND (? < 0 OR messages.seq < ?)
+          AND messages.images IS NOT NULL
+        GROUP BY 1
+        """,
+        (conversation_id, start, stop, stop)
+    )
+    return Counter(dict(rows))
+
+
+def _release_blobs(conn, refs):
+    # 참조가 모두 사라진 이미지만 지움
+    conn.executemany("UPDATE blobs SET refs = refs - ? WHERE hash = ?", [(count, digest) for digest, count in refs.items()])
+    conn.executemany("DELETE FROM blobs WHERE hash = ? AND refs <= 0", [(digest,) for digest in refs])
+
+
+# ==================== 검색 색인 ====================
+# 영문/숫자는 단어 단위, 한글 등은 띄어쓰기나 조사와 상관없이 찾도록 2글자씩 겹쳐 자름
+# ("에이전트란" -> 에이, 이전, 전트, 트란 + 끝 글자 란)
+_TERM_RUNS = re.compile(r"[0-9a-z]+|[^\W_0-9a-z]+")
+
+
+def search_terms(text):
+    text = unicodedata.normalize("NFKC", text).casefold()
+    terms = []
+    for run in _TERM_RUNS.findall(text):
+        if run.isascii():
+            terms.append(run[:SEARCH_TERM_MAX_LEN])
+        elif len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+            # 한 글자 검색어가 단어 끝 글자와도 맞도록
+            terms.append(run[-1])
+    return terms
+
+
+def _index_terms(conn, owner, conversation_id, counts, column):
+    conn.executemany(
+        f"""
+        INSERT INTO search_postings (owner, term, conversation_id, {column}) VALUES (?, ?, ?, ?)
+        ON CONFLICT (owner, term, conversation_id) DO UPDATE SET {column} = {column} + excluded.{column}
+        """,
+        [(owner, term, conversation_id, count) for term, count in counts.items()]
+    )
+
+
+def _unindex_title(conn, owner, conversation_id, title):
+    # 예전 제목의 단어만 빼므로 대화 길이와 상관없이 제목 길이만큼만 비용이 듦
+    counts = Counter(search_terms(title))
+    conn.executemany(
+        "UPDATE search_postings SET title_hits = max(title_hits - ?, 0) WHERE owner = ? AND term = ? AND conversation_id = ?",
+        [(count, owner, term, conversation_id) for term, count in counts.items()]
+    )
+    conn.executemany(
+        "DELETE FROM search_postings WHERE owner = ? AND term = ? AND conversation_id = ? AND hits = 0 AND title_hits = 0",
+        [(owner, term, conversation_id) for term in counts]
+    )
+
+
+def _build_search_index(conn):
+    # 색인이 생기기 전에 저장된 대화는 처음 한 번만 전부 색인 (이후로는 저장할 때마다 조금씩 더함)
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SEARCH_INDEX_VERSION:
+        return
+    with conn:
+        conn.execute("DELETE FROM search_postings")
+        for conversation_id, owner, title in conn.execute("SELECT id, owner, title FROM conversations").fetchall():
+            _index_terms(conn, owner, conversation_id, Counter(search_terms(title)), "title_hits")
+            counts = Counter()
+            for content, in conn.execute("SELECT content FROM messages WHERE conversation_id = ?", (conversation_id,)):
+                counts.update(search_terms(content))
+            _index_terms(conn, owner, conversation_id, counts, "hits")
+        conn.execute(f"PRAGMA user_version = {SEARCH_INDEX_VERSION}")
+
+
+def _postings(conn, owner, term, prefix):
+    # 입력 중인 마지막 단어는 접두어로 찾음 ("agen" -> agent, agents)
+    if prefix:
+        rows = conn.execute(
+            """
+            SELECT conversation_id, sum(hits), sum(title_hits) FROM search_postings
+            WHERE owner = ? AND term >= ? AND term < ? GROUP BY conversation_id
+            """,
+            (owner, term, term + "\U0010ffff")
+        )
+    else:
+        rows = conn.execute(
+            "SELECT conversation_id, hits, title_hits FROM search_postings WHERE owner = ? AND term = ?",
+            (owner, term)
+        )
+    return {conversation_id: (hits, title_hits) for conversation_id, hits, title_hits in rows}
+
+
+def _query_terms(query):
+    # (검색어, 필수 여부, 접두어 검색 여부)
+    # 한글은 겹치지 않게 2글자씩 (0, 2, 4 번째) 만 필수로 두고 나머지는 점수에만 더함
+    #   - 띄어쓰기가 다른 위치에 걸친 2글자 ("서울날씨" 의 울날) 는 "서울 날씨" 에 없음
+    #   - 홀수 길이의 마지막 글자는 조사일 수 있음 ("에이전트는" 의 트는)
+    text = unicodedata.normalize("NFKC", query).casefold()
+    runs = _TERM_RUNS.findall(text)
+    # 영문 검색어가 공백 없이 끝나면 아직 입력 중인 단어로 보고 접두어 검색
+    typing = bool(runs) and runs[-1].isascii() and text.endswith(runs[-1])
+    terms = {}
+    for i, run in enumerate(runs):
+        if run.isascii():
+            terms.setdefault(run[:SEARCH_TERM_MAX_LEN], (True, typing and i == len(runs) - 1))
+        elif len(run) == 1:
+            terms.setdefault(run, (True, True))
+        else:
+            bigrams = [run[j:j + 2] for j in range(len(run) - 1)]
+            for j, term in enumerate(bigrams):
+                required = j % 2 == 0
+                if terms.get(term, (False,))[0] < required:
+                    terms[term] = (required, False)
+    return [(term, required, prefix) for term, (required, prefix) in terms.items()]
+
+
+def search_conversations(owner, query, limit, offset=0):
+    # 필수 검색어를 모두 포함한 대화만, 드문 단어일수록 높은 점수 (tf-idf, 제목 가중)
+    terms = _query_terms(query)
+    if not terms:
+        return 0, []
+    conn = _connect()
+    total = count_conversations(owner)
+
+    # 필수 검색어로 후보를 좁힌 뒤 선택 검색어는 후보의 점수에만 더함
+    terms.sort(key=lambda term: not term[1])
+    scores = None
+    for term, required, prefix in terms:
+        postings = _postings(conn, owner, term, prefix)
+        if not postings:
+            if required:
+                return 0, []
+            continue
+        idf = math.log(1 + total / len(postings))
+        if scores is None:
+            scores = dict.fromkeys(postings, 0.0)
+        elif required:
+            scores = {conversation_id: score for conversation_id, score in scores.items() if conversation_id in postings}
+        for conversation_id in scores:
+            if conversation_id in postings:
+                hits, title_hits = postings[conversation_id]
+                scores[conversation_id] += idf * ((1 + math.log(hits) if hits else 0) + SEARCH_TITLE_WEIGHT * min(title_hits, 1))
+    if not scores:
+        return 0, []
+
+    # 점수가 같으면 최근에 이어 쓴 대화가 먼저
+    rows = conn.execute(
+        "SELECT id, title, updated_at FROM conversations WHERE id IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(scores)),)
+    ).fetchall()
+    rows.sort(key=lambda row: (-scores[row[0]], -row[2]))
+    return len(rows), [(conversation_id, title) for conversation_id, title, _ in rows[offset:offset + limit]]
+
+
+# ==================== 대화 목록 ====================
+def count_conversations(owner):
+    return _connect().execute("SELECT count(*) FROM conversations WHERE owner = ?", (owner,)).fetchone()[0]
+
+
+def list_conversations(owner, limit=-1, offset=0):
+    # 목록에는 제목만 읽고, 메시지 본문은 불러올 때 읽음
+    rows = _connect().execute(
+        "SELECT id, title FROM conversations WHERE owner = ? ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+        (owner, limit, offset)
+    ).fetchall()
+    return rows
+
+
+def create_conversation(owner, title, thread_id):
+    conversation_id = uuid.uuid4().hex
+    now = time.time()
+    conn = _connect()
+    with conn:
+        conn.execute(
+            "INSERT INTO conversations (id, owner, title, thread_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (conversation_id, owner, title, thread_id, now, now)
+        )
+        _index_terms(conn, owner, conversation_id, Counter(search_terms(title)), "title_hits")
+    return conversation_id
+
+
+def rename_conversation(conversation_id, title):
+    conn = _connect()
+    with conn:
+        row = conn.execute("SELECT owner, title FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+        if row is None or row[1] == title:
+            return
+        conn.execute("UPDATE conversations SET title = ? WHERE id = ?", (title, conversation_id))
+        _unindex_title(conn, row[0], conversation_id, row[1])
+        _index_terms(conn, row[0], conversation_id, Counter(search_terms(title)), "title_hits")
+
+
+def delete_conversation(conversation_id):
+    conn = _connect()
+    with conn:
+        # 이 대화의 이미지 참조만 빼므로 다른 대화의 메시지는 읽지 않음
+        _release_blobs(conn, _image_refs(conn, conversation_id))
+        conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+        conn.execute("DELETE FROM search_postings WHERE conversation_id = ?", (conversation_id,))
+        conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+
+# ==================== 메시지 ====================
+def append_messages(conversation_id, new_messages, start, thread_id, image_bytes):
+    # 이미 저장된 start 번째 이전 메시지는 받지도 다시 쓰지도 않음
+    if not new_messages:
+        return start
+
+    conn = _connect()
+    # 없는 이미지 원본은 쓰기 트랜잭션 전에 준비 (내려받는 동안 DB 쓰기 잠금을 잡지 않도록)
+    blobs = {}
+    for msg in new_messages:
+        for ref in msg.get("images") or []:
+            if ref["hash"] in blobs:
+                continue
+            if conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (ref["hash"],)).fetchone() is None:
+                blobs[ref["hash"]] = image_bytes(ref)
+
+    with conn:
+        row = conn.execute("SELECT owner FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+        if row is None:
+            # 다른 탭에서 대화를 지웠으면 저장할 곳이 없음
+            return start
+        owner = row[0]
+        conn.executemany(
+            "INSERT OR IGNORE INTO blobs (hash, data) VALUES (?, ?)",
+            [(digest, data) for digest, data in blobs.items() if data is not None]
+        )
+        # 같은 seq 를 덮어쓰면 예전 메시지의 이미지 참조는 빼고 새 메시지의 참조를 더함
+        replaced = _image_refs(conn, conversation_id, start, start + len(new_messages))
+        added = Counter(ref["hash"] for msg in new_messages for ref in msg.get("images") or [])
+        counts = Counter()
+        for seq, msg in enumerate(new_messages, start=start):
+            counts.update(search_terms(msg["content"]))
+            refs = msg.get("images")
+            conn.execute(
+                "INSERT OR REPLACE INTO messages (conversation_id, seq, role, content, images) VALUES (?, ?, ?, ?, ?)",
+                (conversation_id, seq, msg["role"], msg["content"], json.dumps(refs) if refs is not None else None)
+            )
+        conn.executemany("UPDATE blobs SET refs = refs + ? WHERE hash = ?", [(count, digest) for digest, count in added.items()])
+        _release_blobs(conn, replaced)
+        _index_terms(conn, owner, conversation_id, counts, "hits")
+        conn.execute(
+            "UPDATE conversations SET message_count = ?, thread_id = ?, updated_at = ? WHERE id = ?",
+            (start + len(new_messages), thread_id, time.time(), conversation_id)
+        )
+    return start + len(new_messages)
+
+
+def load_conversation(conversation_id):
+    conn = _connect()
+    row = conn.execute("SELECT thread_id FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+    if row is None:
+        return None, []
+    messages = []
+    for role, content, images in conn.execute(
+        "SELECT role, content, images FROM messages WHERE conversation_id = ? ORDER BY seq",
+        (conversation_id,)
+    ):
+        msg = {"role": role, "content": content}
+        if images is not None:
+            msg["images"] = json.loads(images)
+        messages.append(msg)
+    return row[0], messages
+
+
+def load_blob(digest):
+    row = _connect().execute("SELECT data FROM blobs WHERE hash = ?", (digest,)).fetchone()
+    return row[0] if row else None
+
+
+# ==================== 스레드 라우팅 ====================
+def save_thread_endpoint(thread_id, endpoint):
+    conn = _connect()
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO thread_routes (thread_id, endpoint) VALUES (?, ?)", (thread_id, endpoint))
+
+
+def load_thread_endpoint(thread_id):
+    row = _connect().execute("SELECT endpoint FROM thread_routes WHERE thread_id = ?", (thread_id,)).fetchone()
+    return row[0] if row else None
+
+
+def delete_thread_endpoint(thread_id):
+    conn = _connect()
+    with conn:
+        conn.execute("DELETE FROM thread_routes WHERE thread_id = ?", (thread_id,))
+
+
+def save_thread_redirect(thread_id, replaced_by):
+    conn = _connect()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO thread_redirects (thread_id, replaced_by) VALUES (?, ?)", (thread_id, replaced_by)
+        )
+
+
+def load_thread_redirect(thread_id):
+    row = _connect().execute("SELECT replaced_by FROM thread_redirects WHERE thread_id = ?", (thread_id,)).fetchone()
+    return row[0] if row else None
+
+
+def delete_thread_redirect(thread_id):
+    conn = _connect()
+    with conn:
+        conn.execute("DELETE FROM thread_redirects WHERE thread_id = ?", (thread_id,))
+
+
+# ==================== 빈 스레드 풀 ====================
+def add_pool_thread(thread_id):
+    conn = _connect()
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO pool_threads (thread_id, renewed_at) VALUES (?, ?)", (thread_id, time.time()))
+
+
+def remove_pool_thread(thread_id):
+    conn = _connect()
+    with conn:
+        conn.execute("DELETE FROM pool_threads WHERE thread_id = ?", (thread_id,))
+
+
+def renew_pool_threads(thread_ids):
+    conn = _connect()
+    with conn:
+        conn.executemany(
+            "UPDATE pool_threads SET renewed_at = ? WHERE thread_id = ?", [(time.time(), thread_id) for thread_id in thread_ids]
+        )
+
+
+def take_stale_pool_threads(before):
+    # 여러 워커가 동시에 정리해도 한 스레드는 한 곳에서만 가져가도록 조회와 삭제를 한 트랜잭션에서
+    conn = _connect()
+    with conn:
+        rows = conn.execute("SELECT thread_id FROM pool_threads WHERE renewed_at < ?", (before,)).fetchall()
+        conn.executemany("DELETE FROM pool_threads WHERE thread_id = ?", rows)
+    return [thread_id for thread_id, in rows]
@@ -0,0 +1,498 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+
+from openai import APIConnectionError, InternalServerError, NotFoundError
+
+from assistant_registry import forget_assistant, get_assistant_id, spec_hash
+from azure_client import create_async_client, get_client
+from conversation_store import (
+    add_pool_thread, delete_thread_redirect, load_thread_redirect, remove_pool_thread, renew_pool_threads,
+    save_thread_redirect, take_stale_pool_threads
+)
+from context import (
+    CONTEXT_KEEP_MESSAGES, CONTEXT_SUMMARY_SOURCE_LIMIT, SUMMARY_INSTRUCTIONS, SUMMARY_PREFIX, SUMMARY_REQUEST,
+    run_context_params, thread_usage
+)
+from images import store_image
+from metrics import record_download, record_turn, record_usage, span, start_trace
+from routing import router
+from runner import AssistantNotFound, RunTimeout, cancel_run, execute_run, poll_run, remember_cursor
+from scheduler import BACKGROUND, INTERACTIVE, request_priority, wait_listener
+from tools import dispatch_tool_calls
+
+# ==================== 엔진 설정 ====================
+# placeholder 갱신 최소 간격 (초) - 토큰마다 다시 그리면 브라우저로 가는 메시지가 너무 많아짐
+REDRAW_INTERVAL = float(os.getenv("STREAM_REDRAW_INTERVAL", "0.08"))
+# 이벤트가 없어도 이 간격(초)마다 다시 그림 - Streamlit 은 st.* 호출 때만 스크립트를 멈출 수 있으므로
+# 도구 실행이나 대기 중에도 새 채팅/새 질문이 바로 현재 턴을 중단·취소하도록
+HEARTBEAT_INTERVAL = float(os.getenv("STREAM_HEARTBEAT_INTERVAL", "0.5"))
+
+# 미리 만들어 두는 빈 스레드 수 (0 이면 끔) - 새 채팅이 threads.create 를 기다리지 않도록
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", "4"))
+# 세션에 나눠 줬지만 이 시간(초) 동안 한 번도 쓰이지 않은 스레드와,
+# 이 시간 동안 어떤 워커도 갱신하지 않은 풀 스레드 (재시작 전 프로세스가 남긴 것) 는 삭제
+THREAD_IDLE_TTL = float(os.getenv("THREAD_IDLE_TTL", "3600"))
+THREAD_GC_INTERVAL = float(os.getenv("THREAD_GC_INTERVAL", "300"))
+
+
+class TurnCancelled(Exception):
+    pass
+
+
+# ==================== 대화 턴 핸들 ====================
+# UI 스레드는 HTTP 호출 없이 이 큐에서 이벤트만 꺼내 화면을 갱신
+class TurnHandle:
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+        self.run_id = None
+        self.future = None
+        self._events = queue.Queue()
+        # 지연 측정용 시각 (time.monotonic)
+        self.submitted_at = time.monotonic()
+        self.first_token_at = None
+        self.finished_at = None
+        self.trace = None
+
+    def emit(self, kind, payload=None):
+        if kind == "run":
+            self.run_id = payload
+        elif kind == "thread":
+            # 첫 질문에서 스레드가 새로 만들어지면 그 id 로 바뀜
+            self.thread_id = payload
+        elif kind == "delta" and self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+        elif kind in ("done", "error"):
+            self.finished_at = time.monotonic()
+        self._events.put((kind, payload))
+
+    def cancel(self):
+        if self.future is not None:
+            self.future.cancel()
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def follow(self, placeholder):
+        text = ""
+        shown = ""
+        last_draw = 0.0
+        while True:
+            try:
+                kind, payload = self._events.get(timeout=HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                placeholder.markdown(shown)
+                continue
+            if kind == "delta":
+                text += payload
+                now = time.monotonic()
+                if now - last_draw >= REDRAW_INTERVAL:
+                    shown = text + "▌"
+                    placeholder.markdown(shown)
+                    last_draw = now
+            elif kind == "status":
+                shown = payload
+                placeholder.markdown(shown)
+            elif kind == "done":
+                placeholder.markdown(payload["text"])
+                return payload
+            elif kind == "error":
+                raise payload
+
+
+def _queue_status(handle):
+    last = {"position": None, "at": 0.0}
+
+    def listener(position, wait):
+        # 대기 확인은 자주 일어나므로 위치가 바뀌었거나 1초가 지났을 때만 갱신
+        now = time.monotonic()
+        if position != last["position"] or now - last["at"] >= 1:
+            last.update(position=position, at=now)
+            handle.emit("status", f"⏳ 요청이 많아 대기 중입니다 · 대기열 {position}번째 · 약 {wait:.0f}초")
+
+    return listener
+
+
+# ==================== 대화 엔진 ====================
+class ConversationEngine:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        # 엔드포인트 이름 -> 클라이언트 / (엔드포인트, 정의 해시) -> assistant id
+        self.clients = {}
+        self._assistants = {}
+        self._thread_turns = {}
+        # 엔드포인트별 빈 스레드 풀과, 세션에 나눠 줬지만 아직 질문이 없는 스레드 (id -> 나눠 준 시각)
+        self._pools = defaultdict(deque)
+        self._issued = {}
+        self._pool_lock = threading.Lock()
+        self._refill_task = None
+        self._thread = threading.Thread(target=self.loop.run_forever, name="conversation-engine", daemon=True)
+        self._thread.start()
+        if THREAD_POOL_SIZE > 0:
+            self.loop.call_soon_threadsafe(self._ensure_refill)
+            asyncio.run_coroutine_threadsafe(self._gc_unused_threads(), self.loop)
+
+    def submit(self, thread_id, prompt, spec, priority=INTERACTIVE, first_turn=False, **run_params):
+        # assistant id 는 엔드포인트마다 다르므로 정의(spec)를 받아서 턴을 보낼 엔드포인트에서 찾음
+        # first_turn: 세션 저장소 기준으로 아직 대화가 없는 스레드 (다른 프로세스가 나눠 준 풀 스레드일 수 있음)
+        handle = TurnHandle(thread_id)
+        handle.future = asyncio.run_coroutine_threadsafe(
+            self._turn(handle, prompt, spec, run_params, priority, first_turn), self.loop
+        )
+        return handle
+
+    def submit_cached(self, thread_id, prompt, answer):
+        # 캐시된 답변도 스레드에 남겨야 다음 질문의 문맥이 이어짐 (결과는 기록한 스레드 id)
+        return asyncio.run_coroutine_threadsafe(self._append_exchange(thread_id, prompt, answer), self.loop)
+
+    def take_thread(self):
+        # 지금 가장 빠른 엔드포인트의 풀에서 바로 꺼내고 비면 None (첫 질문에서 create_and_run 으로 스레드를 만듦)
+        endpoint = router.pick()
+        with self._pool_lock:
+            pool = self._pools[endpoint]
+            thread_id = pool.popleft() if pool else None
+            if thread_id is not None:
+                self._issued[thread_id] = time.monotonic()
+        if thread_id is not None:
+            # 나눠 준 스레드는 세션 저장소가 들고 있으므로 풀 기록에서 빼서 다른 워커가 정리하지 않도록
+            remove_pool_thread(thread_id)
+        if THREAD_POOL_SIZE > 0:
+            self.loop.call_soon_threadsafe(self._ensure_refill)
+        return thread_id
+
+    def delete_thread(self, thread_id):
+        return asyncio.run_coroutine_threadsafe(self._delete_thread(thread_id), self.loop)
+
+    async def _delete_thread(self, thread_id):
+        request_priority.set(BACKGROUND)
+        try:
+            await self._get_client(router.endpoint_for(thread_id)).beta.threads.delete(thread_id)
+        except Exception:
+            pass
+        router.unbind(thread_id)
+
+    def pool_stats(self):
+        with self._pool_lock:
+            return {"ready": sum(len(pool) for pool in self._pools.values()), "issued_unused": len(self._issued)}
+
+    def prewarm(self, prompts, spec, on_result, **run_params):
+        return asyncio.run_coroutine_threadsafe(self._prewarm(prompts, spec, on_result, run_params), self.loop)
+
+    def _get_client(self, endpoint=None):
+        endpoint = router.get(endpoint).name
+        client = self.clients.get(endpoint)
+        if client is None:
+            client = self.clients[endpoint] = create_async_client(endpoint)
+        return client
+
+    def _registered_spec(self, endpoint, spec):
+        # 엔드포인트마다 배포 이름이 다를 수 있음
+        deployment = router.get(endpoint).deployment
+        return dict(spec, model=deployment) if deployment else spec
+
+    async def _assistant_id(self, endpoint, spec):
+        key = (endpoint, spec_hash(spec))
+        assistant_id = self._assistants.get(key)
+        if assistant_id is None:
+            # 등록은 동기 클라이언트로 처음 한 번만
+            assistant_id = self._assistants[key] = await self.loop.run_in_executor(
+                None, get_assistant_id, get_client(endpoint), self._registered_spec(endpoint, spec),
+                endpoint if router.multi() else None
+            )
+        return assistant_id
+
+    async def _forget_assistant(self, endpoint, spec, assistant_id):
+        # 서버에서 지워진 Assistant 를 가리키는 기록을 모두 지워서 다음 조회가 새로 만들도록
+        key = (endpoint, spec_hash(spec))
+        if self._assistants.get(key) == assistant_id:
+            del self._assistants[key]
+        await self.loop.run_in_executor(
+            None, forget_assistant, self._registered_spec(endpoint, spec), assistant_id,
+            endpoint if router.multi() else None
+        )
+
+    # ==================== 스레드 풀 ====================
+    def _ensure_refill(self):
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = self.loop.create_task(self._refill_pool())
+
+    async def _refill_pool(self):
+        request_priority.set(BACKGROUND)
+        endpoint = router.pick()
+        client = self._get_client(endpoint)
+        with self._pool_lock:
+            pool = self._pools[endpoint]
+        while True:
+            with self._pool_lock:
+                if len(pool) >= THREAD_POOL_SIZE:
+                    return
+            try:
+                thread = await client.beta.threads.create()
+            except Exception:
+                # 채우지 못해도 첫 질문이 create_and_run 으로 처리하므로 다음 요청 때 다시 시도
+                return
+            router.bind(thread.id, endpoint)
+            add_pool_thread(thread.id)
+            with self._pool_lock:
+                pool.append(thread.id)
+
+    async def _gc_unused_threads(self):
+        request_priority.set(BACKGROUND)
+        while True:
+            await self._sweep_pool_threads()
+            await asyncio.sleep(THREAD_GC_INTERVAL)
+            now = time.monotonic()
+            with self._pool_lock:
+                expired = [thread_id for thread_id, issued_at in self._issued.items() if now - issued_at > THREAD_IDLE_TTL]
+                for thread_id in expired:
+                    del self._issued[thread_id]
+            # 세션이 다른 프로세스로 옮겨 가서 거기서 대화를 시작했을 수 있으므로 메시지가 없는 스레드만 지움
+            # (나중에 그 세션이 첫 질문을 하면 run 시작이 404 가 되고 새 스레드로 처리됨)
+            for thread_id in expired:
+                if not await self._thread_has_messages(thread_id):
+                    await self._delete_thread(thread_id)
+
+    async def _sweep_pool_threads(self):
+        # 이 워커의 풀은 갱신해 두고, 재시작/종료된 워커가 나눠 주지 못하고 남긴 풀 스레드는 삭제
+        with self._pool_lock:
+            ready = [thread_id for pool in self._pools.values() for thread_id in pool]
+        renew_pool_threads(ready)
+        # 살아 있는 워커는 GC 주기마다 갱신하므로 그보다 짧게 잡으면 남의 풀까지 지움
+        for thread_id in take_stale_pool_threads(time.time() - max(THREAD_IDLE_TTL, 2 * THREAD_GC_INTERVAL)):
+            await self._delete_thread(thread_id)
+
+    async def _thread_has_messages(self, thread_id):
+        try:
+            page = await self._get_client(router.endpoint_for(thread_id)).beta.threads.messages.list(
+                thread_id=thread_id, limit=1
+            )
+        except NotFoundError:
+            return False
+        except Exception:
+            # 확인하지 못하면 지우지 않음
+            return True
+        return bool(page.data)
+
+    def _mark_used(self, thread_id):
+        # 나눠 준 뒤 처음 쓰이는 스레드면 True (아직 대화가 없는 새 세션)
+        with self._pool_lock:
+            return self._issued.pop(thread_id, None) is not None
+
+    async def _claim_thread(self, thread_id, cancellable):
+        # 같은 스레드의 이전 작업이 남아 있으면 끝날 때까지 기다린 뒤 진행
+        # (run 은 취소하고, 캐시 답변 기록은 문맥이 빠지지 않도록 끝까지 기다림)
+        previous = self._thread_turns.get(thread_id)
+        self._thread_turns[thread_id] = (asyncio.current_task(), cancellable)
+        if previous is not None and not previous[0].done():
+            if previous[1]:
+                previous[0].cancel()
+            await asyncio.gather(previous[0], return_exceptions=True)
+
+    async def _claim_latest(self, thread_id, cancellable):
+        # 요약해서 옮긴 스레드면 새 스레드를 잡음 (옮긴 기록은 대화 저장소에 있어서 다른 워커가 옮겼어도 찾음)
+        # 요약 중인 턴이 이전 스레드를 잡고 있으므로 기다린 뒤에 확인해야 방금 옮긴 것도 보임
+        superseded = []
+        await self._claim_thread(thread_id, cancellable)
+        while True:
+            replaced_by = load_thread_redirect(thread_id)
+            if replaced_by is None:
+                return thread_id, superseded
+            self._release_thread(thread_id)
+            superseded.append(thread_id)
+            thread_id = replaced_by
+            await self._claim_thread(thread_id, cancellable)
+
+    async def _drop_superseded(self, superseded):
+        # 새 스레드로 턴을 마쳐서 UI 가 새 id 를 받았으면 이전 스레드와 옮긴 기록은 필요 없음
+        for thread_id in superseded:
+            delete_thread_redirect(thread_id)
+            await self._delete_thread(thread_id)
+
+    def _release_thread(self, thread_id):
+        current = self._thread_turns.get(thread_id)
+        if current is not None and current[0] is asyncio.current_task():
+            del self._thread_turns[thread_id]
+
+    async def _append_exchange(self, thread_id, prompt, answer):
+        if thread_id is None:
+            # 스레드가 아직 없으면 두 메시지를 담아 한 번에 생성
+            endpoint = router.pick()
+            thread = await self._get_client(endpoint).beta.threads.create(messages=[
+                {"role": "user", "content": prompt},
+                {"role": "assistant", "content": answer}
+            ])
+            router.bind(thread.id, endpoint)
+            return thread.id
+
+        # 캐시 답변 경로는 새 스레드 id 를 기다리지 않으므로 옮긴 기록은 다음 run 턴이 정리
+        thread_id, _ = await self._claim_latest(thread_id, cancellable=False)
+        client = self._get_client(router.endpoint_for(thread_id))
+        self._mark_used(thread_id)
+        try:
+            await client.beta.threads.messages.create(thread_id=thread_id, role="user", content=prompt)
+            message = await client.beta.threads.messages.create(thread_id=thread_id, role="assistant", content=answer)
+            remember_cursor(thread_id, message.id)
+            return thread_id
+        finally:
+            self._release_thread(thread_id)
+
+    async def _prewarm(self, prompts, spec, on_result, run_params):
+        # 임시 스레드에서 답변을 만들어 캐시에 넣고 스레드는 지움
+        async def warm(prompt):
+            handle = TurnHandle(None)
+            try:
+                result = await self._turn(handle, prompt, spec, run_params, BACKGROUND)
+                if result["run"] is not None and result["run"].status == "completed" and not result["used_tools"]:
+                    on_result(prompt, result)
+            finally:
+                if handle.thread_id is not None:
+                    await self._delete_thread(handle.thread_id)
+
+        await asyncio.gather(*(warm(prompt) for prompt in prompts), return_exceptions=True)
+
+    async def _compact(self, client, thread_id, assistant_id):
+        # 최근 메시지는 그대로, 그 이전은 요약 한 개로 새 스레드를 만듦
+        recent = await client.beta.threads.messages.list(
+            thread_id=thread_id, order="desc", limit=CONTEXT_KEEP_MESSAGES
+        ) if CONTEXT_KEEP_MESSAGES > 0 else None
+        summary = await poll_run(
+            client, thread_id, assistant_id, lambda kind, payload=None: None, dispatch_tool_calls,
+            instructions=SUMMARY_INSTRUCTIONS,
+            additional_messages=[{"role": "user", "content": SUMMARY_REQUEST}],
+            tools=[],
+            # 아주 긴 스레드도 요약 run 이 읽는 메시지는 최근 N개로 제한 (요약 요청 메시지 포함)
+            truncation_strategy={"type": "last_messages", "last_messages": CONTEXT_SUMMARY_SOURCE_LIMIT}
+        )
+        if summary["run"].status != "completed" or not summary["text"]:
+            raise RuntimeError(f"대화 요약 실패: {summary['run'].status}")
+
+        messages = [{"role": "user", "content": SUMMARY_PREFIX + summary["text"]}]
+        for message in reversed(recent.data if recent else []):
+            text = "".join(block.text.value for block in message.content if block.type == "text")
+            if text:
+                messages.append({"role": message.role, "content": text})
+        thread = await client.beta.threads.create(messages=messages)
+        return thread.id
+
+    async def _turn(self, handle, prompt, spec, run_params, priority=INTERACTIVE, first_turn=False):
+        # 한도에 걸려 기다리는 동안에는 스피너 대신 대기열 위치를 보여줌
+        request_priority.set(priority)
+        wait_listener.set(_queue_status(handle))
+        claimed = handle.thread_id
+        fresh = claimed is None or first_turn
+        superseded = []
+        if claimed is not None:
+            # 지난 턴 뒤에 요약해서 옮긴 스레드가 있으면 그쪽에서 이어감
+            claimed, superseded = await self._claim_latest(claimed, cancellable=True)
+            handle.thread_id = claimed
+            fresh = self._mark_used(claimed) or fresh
+        # 스레드는 만든 엔드포인트에서만 쓸 수 있고, 새 세션은 지금 가장 빠른 곳으로
+        endpoint = router.endpoint_for(claimed) if claimed is not None else router.pick()
+        client = self._get_client(endpoint)
+        # 이 턴 안의 하위 호출(run, 도구, 이미지)이 남기는 단계별 시간은 모두 여기로 모임
+        handle.trace = start_trace()
+
+        try:
+            tried = []
+            reregistered = False
+            while True:
+                try:
+                    # 사용자 메시지는 run 시작 요청에 함께 보내서 messages.create 왕복을 줄임
+                    assistant_id = await self._assistant_id(endpoint, spec)
+                    result = await execute_run(
+                        client, claimed, assistant_id, handle.emit, dispatch_tool_calls,
+                        additional_messages=[{"role": "user", "content": prompt}],
+                        first_turn=fresh,
+                        **{**run_context_params(), **run_params}
+                    )
+                    break
+                except AssistantNotFound:
+                    # 등록해 둔 Assistant 가 서버에서 지워졌으면 기록을 지우고 한 번만 다시 만들어 재시도
+                    if reregistered:
+                        raise
+                    reregistered = True
+                    await self._forget_assistant(endpoint, spec, assistant_id)
+                except (APIConnectionError, InternalServerError):
+                    # 아직 대화가 없는 세션이고 run 이 시작되기 전에 실패했으면 다른 엔드포인트에서 새 스레드로
+                    tried.append(endpoint)
+                    fallback = router.pick(exclude=tried) if fresh and handle.run_id is None else None
+                    if fallback is None:
+                        raise
+                    self._release_thread(claimed)
+                    endpoint = fallback
+                    client = self._get_client(endpoint)
+                    claimed = handle.thread_id = None
+            thread_id = result["thread_id"]
+            if thread_id != claimed:
+                router.bind(thread_id, endpoint)
+
+            images = []
+            run = result["run"]
+            if run is not None:
+                record_usage(run.usage)
+                if run.usage is not None:
+                    thread_usage.record(thread_id, run.usage)
+            if run is not None and run.status == "completed":
+                for file_id in result["file_ids"]:
+                    with span("image.download"):
+                        content = await client.files.content(file_id)
+                        data = content.read()
+                    record_download(len(data))
+                    with span("image.encode"):
+                        ref = store_image(data, file_id)
+                    if router.multi():
+                        # 캐시에서 밀려나 다시 받을 때 파일이 있는 엔드포인트로 가도록
+                        ref["endpoint"] = endpoint
+                    images.append(ref)
+            result["images"] = images
+            handle.emit("done", result)
+            record_turn(run.status if run is not None else "unknown", handle)
+            if superseded:
+                request_priority.set(BACKGROUND)
+                wait_listener.set(None)
+                await self._drop_superseded(superseded)
+
+            # 답변을 보낸 뒤에 요약하므로 사용자는 기다리지 않고, 다음 턴은 짧아진 스레드를 씀
+            if thread_usage.needs_compaction(thread_id):
+                self._thread_turns[thread_id] = (asyncio.current_task(), False)
+                request_priority.set(BACKGROUND)
+                wait_listener.set(None)
+                try:
+                    with span("context.compact"):
+                        compacted = await self._compact(client, thread_id, assistant_id)
+                    router.bind(compacted, endpoint)
+                    save_thread_redirect(thread_id, compacted)
+                    thread_usage.forget(thread_id)
+                except Exception:
+                    # 요약에 실패해도 이전 스레드로 계속 대화할 수 있음
+                    pass
+            return result
+        except asyncio.CancelledError:
+            # UI 가 턴을 버리면 서버 쪽 run 도 취소
+            if handle.run_id:
+                await cancel_run(client, handle.thread_id, handle.run_id)
+            handle.emit("error", TurnCancelled())
+            record_turn("cancelled", handle)
+            raise
+        except Exception as e:
+            handle.emit("error", e)
+            record_turn("timeout" if isinstance(e, RunTimeout) else "error", handle)
+            raise
+        finally:
+            self._release_thread(claimed)
+            self._release_thread(handle.thread_id)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = ConversationEngine()
+        return _engine
@@ -0,0 +1,308 @@
+import argparse
+import bisect
+import mmap
+import os
+import re
+import struct
+import threading
+import unicodedata
+from zoneinfo import ZoneInfo
+
+# ==================== 지명 색인 설정 ====================
+# 원본은 사람이 고치는 TSV (또는 GeoNames cities*.txt), 도구는 미리 컴파일한 색인 파일을 mmap 으로 읽음
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+SOURCE_PATH = os.getenv("GAZETTEER_SOURCE", os.path.join(DATA_DIR, "places.tsv"))
+INDEX_PATH = os.getenv("GAZETTEER_INDEX", os.path.join(DATA_DIR, "places.gaz"))
+
+# 접두어/오타 검색에서 비교해 볼 최대 키 수
+PREFIX_SCAN_LIMIT = int(os.getenv("GAZETTEER_PREFIX_SCAN", "64"))
+FUZZY_SCAN_LIMIT = int(os.getenv("GAZETTEER_FUZZY_SCAN", "5000"))
+# "서울 강남구 날씨" 처럼 문장이 들어오면 이 길이까지의 연속 단어 묶음으로 다시 찾음
+MAX_NGRAM_WORDS = 4
+
+# 파일 구조: 헤더 | 장소 레코드 | 키 레코드 (정규화한 이름 순 정렬) | 문자열
+MAGIC = b"GAZ1"
+HEADER = struct.Struct("<4sIIII")
+# 위도, 경도, 인구, 이름 위치/길이, 시간대 위치/길이, 국가 코드
+PLACE = struct.Struct("<ffIIHIH2s")
+# 키 위치/길이, 장소 번호
+KEY = struct.Struct("<IHI")
+
+GEONAMES_COLUMNS = 19
+
+_SEPARATORS = re.compile(r"[\s\-_'’.,()/]+")
+_HANGUL = re.compile(r"[가-힣]")
+
+
+def normalize(text):
+    # 대소문자, 전각/반각, 악센트(São -> sao), 구분 기호 차이를 없앰 (한글은 음절 그대로)
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = unicodedata.normalize("NFC", "".join(ch for ch in text if not unicodedata.combining(ch)))
+    return _SEPARATORS.sub(" ", text).strip()
+
+
+# ==================== 원본 읽기 ====================
+def _read_tsv(f):
+    header = f.readline().rstrip("\n").split("\t")
+    for line in f:
+        if not line.strip() or line.startswith("#"):
+            continue
+        row = dict(zip(header, line.rstrip("\n").split("\t")))
+        aliases = [alias for alias in row.get("aliases", "").split(",") if alias]
+        yield (row["name"], row["country"], float(row["latitude"]), float(row["longitude"]),
+               row["timezone"], int(row.get("population") or 0), aliases)
+
+
+def _read_geonames(f):
+    # 별칭은 수백 개씩 있으므로 라틴 문자와 한글 표기만 남김
+    for line in f:
+        cols = line.rstrip("\n").split("\t")
+        if len(cols) < GEONAMES_COLUMNS or not cols[17]:
+            continue
+        aliases = [cols[2]] + [
+            alias for alias in cols[3].split(",")
+            if alias and (alias.isascii() or _HANGUL.search(alias))
+        ]
+        yield cols[1], cols[8], float(cols[4]), float(cols[5]), cols[17], int(cols[14] or 0), aliases
+
+
+def read_places(path):
+    with open(path, encoding="utf-8") as f:
+        first = f.readline()
+        f.seek(0)
+        reader = _read_tsv if first.startswith("name\t") else _read_geonames
+        return list(reader(f))
+
+
+# ==================== 색인 만들기 ====================
+def build_index(places):
+    strings = bytearray()
+    interned = {}
+
+    def intern(text):
+        data = text.encode("utf-8")
+        if data not in interned:
+            interned[data] = len(strings)
+            strings.extend(data)
+        return interned[data], len(data)
+
+    place_records = []
+    keys = []
+    zones = set()
+    for index, (name, country, lat, lon, tz, population, aliases) in enumerate(places):
+        if tz not in zones:
+            # 시간대 오타는 도구 호출 때가 아니라 색인을 만들 때 드러나도록
+            ZoneInfo(tz)
+            zones.add(tz)
+        name_off, name_len = intern(name)
+        tz_off, tz_len = intern(tz)
+        place_records.append(PLACE.pack(
+            lat, lon, population, name_off, name_len, tz_off, tz_len, country.encode("ascii")[:2].ljust(2)
+        ))
+        for key in {normalize(text) for text in [name] + aliases} - {""}:
+            keys.append((key.encode("utf-8"), -population, index))
+
+    # 같은 이름이면 인구가 많은 곳이 먼저 (정확히 일치할 때 첫 번째를 고름)
+    keys.sort()
+    key_records = []
+    for key, _, index in keys:
+        key_off, key_len = intern(key.decode("utf-8"))
+        key_records.append(KEY.pack(key_off, key_len, index))
+
+    places_off = HEADER.size
+    keys_off = places_off + PLACE.size * len(place_records)
+    strings_off = keys_off + KEY.size * len(key_records)
+    return b"".join([
+        HEADER.pack(MAGIC, len(place_records), len(key_records), keys_off, strings_off),
+        *place_records,
+        *key_records,
+        bytes(strings),
+    ])
+
+
+def compile_index(source=SOURCE_PATH, target=INDEX_PATH):
+    data = build_index(read_places(source))
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, target)
+    return data
+
+
+# ==================== 조회 ====================
+class _Keys:
+    # mmap 위의 정렬된 키 레코드를 목록으로 읽어 들이지 않고 bisect 할 수 있게 감싼 시퀀스
+    def __init__(self, gazetteer):
+        self.buffer = gazetteer.buffer
+        self.count = gazetteer.key_count
+        self.keys_off = gazetteer.keys_off
+        self.strings_off = gazetteer.strings_off
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        key_off, key_len, _ = KEY.unpack_from(self.buffer, self.keys_off + KEY.size * i)
+        start = self.strings_off + key_off
+        return self.buffer[start:start + key_len]
+
+
+class Gazetteer:
+    def __init__(self, buffer):
+        self.buffer = buffer
+        magic, self.place_count, self.key_count, self.keys_off, self.strings_off = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError("지명 색인 파일 형식이 아닙니다")
+        self.keys = _Keys(self)
+
+    def _string(self, offset, length):
+        start = self.strings_off + offset
+        return self.buffer[start:start + length]
+
+    def key(self, i):
+        key_off, key_len, index = KEY.unpack_from(self.buffer, self.keys_off + KEY.size * i)
+        return self._string(key_off, key_len), index
+
+    def place(self, index):
+        lat, lon, population, name_off, name_len, tz_off, tz_len, country = PLACE.unpack_from(
+            self.buffer, HEADER.size + PLACE.size * index
+        )
+        return {
+            "name": self._string(name_off, name_len).decode("utf-8"),
+            "country": country.decode("ascii").strip(),
+            "lat": round(lat, 4),
+            "lon": round(lon, 4),
+            "timezone": self._string(tz_off, tz_len).decode("utf-8"),
+            "population": population,
+        }
+
+    def exact(self, key):
+        target = key.encode("utf-8")
+        i = bisect.bisect_left(self.keys, target)
+        if i < self.key_count:
+            found, index = self.key(i)
+            if found == target:
+                return index
+        return None
+
+    def prefix(self, key):
+        # 접두어가 같은 이름 중 인구가 가장 많은 곳 ("san fran" -> San Francisco)
+        target = key.encode("utf-8")
+        best = None
+        i = bisect.bisect_left(self.keys, target)
+        for i in range(i, min(self.key_count, i + PREFIX_SCAN_LIMIT)):
+            found, index = self.key(i)
+            if not found.startswith(target):
+                break
+            population = self.place(index)["population"]
+            if best is None or population > best[0]:
+                best = (population, index)
+        return best[1] if best else None
+
+    def fuzzy(self, key):
+        # 첫 글자가 같은 이름만 편집 거리로 비교 ("tokio" -> tokyo, "시애를" -> 시애틀)
+        max_distance = max(1, len(key) // 5)
+        first = key[:1].encode("utf-8")
+        best = None
+        i = bisect.bisect_left(self.keys, first)
+        for i in range(i, min(self.key_count, i + FUZZY_SCAN_LIMIT)):
+            found, index = self.key(i)
+            if not found.startswith(first):
+                break
+            candidate = found.decode("utf-8")
+            if abs(len(candidate) - len(key)) > max_distance:
+                continue
+            distance = _edit_distance(key, candidate, max_distance)
+            if distance <= max_distance:
+                rank = (distance, -self.place(index)["population"])
+                if best is None or rank < best[0]:
+                    best = (rank, index)
+        return best[1] if best else None
+
+    def lookup(self, location):
+        query = normalize(location)
+        if not query:
+            return None
+
+        # 1) 전체, 쉼표 앞부분("Paris, France"), 단어 묶음 순으로 정확히 일치하는 이름
+        index = self.exact(query)
+        if index is not None:
+            return self.place(index)
+        candidates = [query] + [normalize(part) for part in location.split(",")[:1]]
+        words = query.split()
+        for size in range(min(len(words), MAX_NGRAM_WORDS), 0, -1):
+            candidates.extend(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+        for candidate in dict.fromkeys(candidates):
+            index = self.exact(candidate)
+            if index is not None:
+                return self.place(index)
+
+        # 2) 접두어, 3) 오타 허용
+        head = candidates[1] or query
+        if len(head) >= 3 or (len(head) >= 2 and not head.isascii()):
+            index = self.prefix(head)
+            if index is None:
+                index = self.fuzzy(head)
+            if index is not None:
+                return self.place(index)
+        return None
+
+
+def _edit_distance(a, b, limit):
+    # limit 을 넘으면 바로 멈추는 Levenshtein 거리
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+_gazetteer = None
+_lock = threading.Lock()
+
+
+def _open():
+    # 원본이 색인보다 새로우면 다시 컴파일 (쓸 수 없는 위치면 메모리에 만든 색인을 그대로 사용)
+    try:
+        stale = os.path.getmtime(SOURCE_PATH) > os.path.getmtime(INDEX_PATH)
+    except FileNotFoundError:
+        stale = os.path.exists(SOURCE_PATH)
+    if stale:
+        try:
+            compile_index()
+        except OSError:
+            return Gazetteer(build_index(read_places(SOURCE_PATH)))
+    with open(INDEX_PATH, "rb") as f:
+        return Gazetteer(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def get_gazetteer():
+    # 프로세스당 한 번만 열고, 이후 조회는 파일 I/O 없이 페이지 캐시에서 읽음
+    global _gazetteer
+    if _gazetteer is None:
+        with _lock:
+            if _gazetteer is None:
+                _gazetteer = _open()
+    return _gazetteer
+
+
+def lookup(location):
+    return get_gazetteer().lookup(location)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="지명 원본(TSV 또는 GeoNames)을 mmap 색인으로 컴파일")
+    parser.add_argument("source", nargs="?", default=SOURCE_PATH, help="원본 경로")
+    parser.add_argument("-o", "--output", default=INDEX_PATH, help="색인 파일 경로")
+    args = parser.parse_args()
+    data = compile_index(args.source, args.output)
+    gazetteer = Gazetteer(data)
+    print(f"{args.output}: 장소 {gazetteer.place_count}개 · 키 {gazetteer.key_count}개 · {len(data) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
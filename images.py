@@ -0,0 +1,108 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from azure_client import get_client
+from conversation_store import load_blob
+
+# ==================== 이미지 캐시 설정 ====================
+# 프로세스 전체가 공유하는 이미지 캐시 크기 (MB) - 넘으면 오래 안 쓴 이미지부터 제거
+IMAGE_CACHE_MB = int(os.getenv("IMAGE_CACHE_MB", "256"))
+# 과거 메시지에 보여줄 썸네일의 긴 변 길이 (px)
+THUMBNAIL_SIZE = int(os.getenv("IMAGE_THUMBNAIL_SIZE", "320"))
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+class ImageCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return
+            self._items[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {"images": len(self._items), "bytes": self.size, "max_bytes": self.max_bytes}
+
+
+_cache = ImageCache(IMAGE_CACHE_MB * 1024 * 1024)
+
+
+# ==================== 저장 ====================
+def to_png(data):
+    # 이미 PNG 면 디코드/재인코드 없이 받은 바이트를 그대로 사용
+    if data[:8] == PNG_SIGNATURE:
+        return data
+    buf = io.BytesIO()
+    Image.open(io.BytesIO(data)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def store_image(data, file_id=None):
+    png = to_png(data)
+    digest = hashlib.sha256(png).hexdigest()
+    # 같은 내용은 한 번만 저장 (세션/메시지가 달라도 공유)
+    _cache.put(digest, png)
+    return {"hash": digest, "file_id": file_id}
+
+
+# ==================== 조회 (메시지는 참조만 보관) ====================
+def load_image(client, ref):
+    data = _cache.get(ref["hash"])
+    if data is None:
+        # 저장된 대화의 이미지는 대화 저장소에 원본이 있음
+        data = load_blob(ref["hash"])
+        if data is not None:
+            _cache.put(ref["hash"], data)
+    if data is None and ref.get("file_id"):
+        # 캐시에서 밀려났으면 필요할 때 다시 내려받음 (파일은 만든 엔드포인트에만 있음)
+        if ref.get("endpoint"):
+            client = get_client(ref["endpoint"])
+        store_image(client.files.content(ref["file_id"]).read(), ref["file_id"])
+        data = _cache.get(ref["hash"])
+    return data
+
+
+def load_thumbnail(client, ref):
+    key = f"{ref['hash']}:thumb"
+    thumb = _cache.get(key)
+    if thumb is None:
+        data = load_image(client, ref)
+        if data is None:
+            return None
+        img = Image.open(io.BytesIO(data))
+        if max(img.size) <= THUMBNAIL_SIZE:
+            return data
+        img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        buf = io.BytesIO()
+        img.save(buf, format="PNG", optimize=True)
+        thumb = buf.getvalue()
+        _cache.put(key, thumb)
+    return thumb
+
+
+def cache_stats():
+    return _cache.stats()
@@ -0,0 +1,222 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==================== 메트릭 설정 ====================
+# 0 이면 /metrics 엔드포인트를 띄우지 않음
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_registry = []
+
+
+# ==================== Prometheus 형식 메트릭 ====================
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f"{self.name}_bucket{_label_text(names, label_values + (bound,))} {count}")
+                lines.append(f"{self.name}_bucket{_label_text(names, label_values + ('+Inf',))} {series['count']}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, label_values)} {series['sum']}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, label_values)} {series['count']}")
+        return lines
+
+
+def render_metrics():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+TURNS = Counter("chatbot_turns_total", "Finished turns by run status", ("status",))
+TURN_SECONDS = Histogram("chatbot_turn_seconds", "End-to-end turn latency")
+TTFT_SECONDS = Histogram("chatbot_time_to_first_token_seconds", "Time from submit to first streamed token")
+STAGE_SECONDS = Histogram("chatbot_stage_seconds", "Time spent in each run pipeline stage", ("stage",))
+POLLS = Counter("chatbot_run_polls_total", "runs.retrieve calls made while polling")
+TOOL_SECONDS = Histogram("chatbot_tool_seconds", "Tool function latency", ("tool",))
+DOWNLOAD_BYTES = Counter("chatbot_download_bytes_total", "Bytes downloaded from the files API")
+TOKENS = Counter("chatbot_tokens_total", "Token usage reported by runs", ("kind",))
+
+
+# ==================== 턴별 기록 ====================
+# 엔진이 턴마다 TurnTrace 를 contextvar 에 넣어 두면, 하위 호출은 인자 없이 여기에 기록
+_current_trace = contextvars.ContextVar("turn_trace", default=None)
+
+
+class TurnTrace:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.spans = []
+        self.polls = 0
+        self.tools = []
+        self.download_bytes = 0
+        self.usage = None
+        self._lock = threading.Lock()
+
+    def summary(self):
+        with self._lock:
+            return {
+                "spans": list(self.spans),
+                "polls": self.polls,
+                "tools": list(self.tools),
+                "download_bytes": self.download_bytes,
+                "usage": self.usage,
+            }
+
+
+def start_trace():
+    trace = TurnTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+@contextmanager
+def span(stage):
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        record_span(stage, started, time.monotonic() - started)
+
+
+def record_span(stage, started, seconds):
+    STAGE_SECONDS.observe(seconds, stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace._lock:
+            trace.spans.append((stage, started - trace.started, seconds))
+
+
+def record_poll():
+    POLLS.inc()
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace._lock:
+            trace.polls += 1
+
+
+def record_tool(name, seconds):
+    TOOL_SECONDS.observe(seconds, name)
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace._lock:
+            trace.tools.append((name, seconds))
+
+
+def record_download(nbytes):
+    DOWNLOAD_BYTES.inc(nbytes)
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace._lock:
+            trace.download_bytes += nbytes
+
+
+def record_usage(usage):
+    if usage is None:
+        return
+    TOKENS.inc(usage.prompt_tokens, "prompt")
+    TOKENS.inc(usage.completion_tokens, "completion")
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace._lock:
+            trace.usage = {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens}
+
+
+def record_turn(status, handle):
+    TURNS.inc(1, status)
+    if handle.finished_at is not None:
+        TURN_SECONDS.observe(handle.finished_at - handle.submitted_at)
+    if handle.first_token_at is not None:
+        TTFT_SECONDS.observe(handle.first_token_at - handle.submitted_at)
+
+
+# ==================== /metrics 엔드포인트 ====================
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    # Streamlit 은 스크립트를 계속 다시 실행하므로 프로세스당 한 번만 띄움
+    global _server
+    with _server_lock:
+        if _server is None and port:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        return _server
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+
+# ==================== 응답 캐시 설정 ====================
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+# 0 이면 유사 질문 조회를 끔 (예: 0.9 이면 코사인 유사도 0.9 이상을 같은 질문으로 봄)
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+# 앱 시작 시 예시 질문 답변을 미리 만들어 둘지 여부
+RESPONSE_CACHE_PREWARM = os.getenv("RESPONSE_CACHE_PREWARM", "0").lower() in ("1", "true", "yes", "on")
+
+
+def normalize_prompt(prompt):
+    text = unicodedata.normalize("NFKC", prompt).lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?!.~ ")
+
+
+def settings_key(model, instructions, temperature, top_p):
+    return hashlib.sha256(json.dumps(
+        [model, instructions, round(temperature, 3), round(top_p, 3)],
+        ensure_ascii=False
+    ).encode("utf-8")).hexdigest()
+
+
+# ==================== 로컬 임베딩 (문자 n-gram) ====================
+# 외부 호출 없이 바로 계산되고, 띄어쓰기/조사 차이에 강해서 한국어 질문 비교에 충분
+def embed(text):
+    padded = f" {text} "
+    grams = Counter(padded[i:i + n] for n in (2, 3) for i in range(len(padded) - n + 1))
+    norm = math.sqrt(sum(count * count for count in grams.values())) or 1.0
+    return {gram: count / norm for gram, count in grams.items()}
+
+
+def cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(gram, 0.0) for gram, weight in a.items())
+
+
+# ==================== 응답 캐시 ====================
+class ResponseCache:
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, similarity=RESPONSE_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, normalized, settings):
+        return f"{settings}:{hashlib.sha256(normalized.encode('utf-8')).hexdigest()}"
+
+    def get(self, prompt, settings):
+        normalized = normalize_prompt(prompt)
+        key = self._key(normalized, settings)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self.similarity > 0:
+                entry = self._nearest(normalized, settings, now)
+            if entry is not None and now - entry["stored_at"] > self.ttl:
+                self._entries.pop(entry["key"], None)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry["key"])
+            self.hits += 1
+            return entry["value"]
+
+    def _nearest(self, normalized, settings, now):
+        vector = embed(normalized)
+        best, best_score = None, self.similarity
+        for entry in self._entries.values():
+            if entry["settings"] != settings or now - entry["stored_at"] > self.ttl:
+                continue
+            score = cosine(vector, entry["vector"])
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def put(self, prompt, settings, value):
+        normalized = normalize_prompt(prompt)
+        key = self._key(normalized, settings)
+        with self._lock:
+            self._entries[key] = {
+                "key": key,
+                "settings": settings,
+                "value": value,
+                "vector": embed(normalized) if self.similarity > 0 else None,
+                "stored_at": time.monotonic(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+response_cache = ResponseCache()
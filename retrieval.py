@@ -0,0 +1,382 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from dotenv import load_dotenv
+
+# 수집 CLI 로 직접 실행할 때도 .env 의 Azure 설정을 사용
+load_dotenv()
+
+from azure_client import get_client  # noqa: E402
+from metrics import span  # noqa: E402
+from scheduler import time_left  # noqa: E402
+
+# ==================== 문서 검색 설정 ====================
+# docs 아래 PDF 를 잘라서 임베딩하고, 결과는 INDEX_DIR 에 mmap 으로 읽는 NumPy 파일로 저장
+DOCS_DIR = os.getenv("RAG_DOCS_DIR", "docs")
+INDEX_DIR = os.getenv("RAG_INDEX_DIR", "rag_index")
+EMBEDDING_DEPLOYMENT = os.getenv("RAG_EMBEDDING_DEPLOYMENT", "text-embedding-3-small")
+
+# 청크 길이/겹침 (글자 수) - 바꾸면 다음 수집 때 모든 파일을 다시 임베딩
+CHUNK_CHARS = int(os.getenv("RAG_CHUNK_CHARS", "1000"))
+CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", "150"))
+
+# 임베딩 요청 하나에 담을 청크 수와 동시에 보낼 요청 수
+EMBED_BATCH = int(os.getenv("RAG_EMBED_BATCH", "64"))
+EMBED_WORKERS = int(os.getenv("RAG_EMBED_WORKERS", "4"))
+
+TOP_K = int(os.getenv("RAG_TOP_K", "4"))
+MAX_TOP_K = 10
+# 검색할 때 float16 행렬을 이만큼씩 float32 로 바꿔 곱함 (전체를 한 번에 올리지 않음)
+SEARCH_BLOCK_ROWS = 16384
+QUERY_CACHE_SIZE = 256
+
+CURRENT_FILE = "CURRENT"
+
+
+# ==================== 청크 나누기 ====================
+def chunk_text(text, size=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+    text = re.sub(r"[ \t]+", " ", text)
+    text = re.sub(r"\n{3,}", "\n\n", text).strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + size)
+        if end < len(text):
+            # 뒤쪽 절반 안에서 문단 > 문장 경계로 자름
+            floor = start + size // 2
+            cut = text.rfind("\n\n", floor, end)
+            if cut < 0:
+                cut = max(text.rfind(". ", floor, end), text.rfind("\n", floor, end))
+            if cut > start:
+                end = cut + 1
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        # 겹치는 부분도 단어 중간에서 시작하지 않도록 다음 줄/공백 뒤로
+        start = max(end - overlap, start + 1)
+        boundary = text.find("\n", start, end)
+        if boundary < 0:
+            boundary = text.find(" ", start, end)
+        if boundary >= 0:
+            start = boundary + 1
+    return chunks
+
+
+def read_pdf(path):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        sys.exit("PDF 수집에는 pypdf 가 필요합니다 (pip install pypdf)")
+    # (페이지 번호, 청크) - 검색 결과에 출처 페이지를 남기려고 페이지 안에서만 자름
+    chunks = []
+    for page_no, page in enumerate(PdfReader(path).pages, start=1):
+        chunks.extend((page_no, chunk) for chunk in chunk_text(page.extract_text() or ""))
+    return chunks
+
+
+# ==================== 임베딩 ====================
+def _normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def embed_texts(client, texts):
+    batches = [texts[i:i + EMBED_BATCH] for i in range(0, len(texts), EMBED_BATCH)]
+
+    def embed_batch(batch):
+        response = client.embeddings.create(model=EMBEDDING_DEPLOYMENT, input=batch)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as pool:
+        rows = [row for batch in pool.map(embed_batch, batches) for row in batch]
+    return _normalize_rows(np.asarray(rows, dtype=np.float32))
+
+
+_query_cache = OrderedDict()
+_query_lock = threading.Lock()
+
+
+def embed_query(text):
+    # 같은 질문이 반복되면 임베딩 요청 없이 바로 검색
+    with _query_lock:
+        if text in _query_cache:
+            _query_cache.move_to_end(text)
+            return _query_cache[text]
+    # 도구 호출로 부르면 마감까지 남은 시간 안에서 한 번만 시도 (SDK 재시도가 마감을 넘기지 않도록)
+    timeout = time_left()
+    client = get_client() if timeout is None else get_client().with_options(timeout=timeout, max_retries=0)
+    vector = embed_texts(client, [text])[0]
+    with _query_lock:
+        _query_cache[text] = vector
+        while len(_query_cache) > QUERY_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+    return vector
+
+
+# ==================== 색인 (읽기) ====================
+# INDEX_DIR/CURRENT 가 가리키는 버전 디렉터리 하나가 색인 전체:
+#   manifest.json   파일별 해시/크기/행 범위, 임베딩 설정
+#   vectors.npy     (청크 수, 차원) float16, 정규화된 임베딩
+#   offsets.npy     text.bin 안의 청크 시작 위치 (청크 수 + 1)
+#   pages.npy       청크의 페이지 번호
+#   sources.npy     청크가 나온 파일 (manifest files 의 번호)
+#   text.bin        청크 원문 (UTF-8)
+class DocIndex:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.files = self.manifest["files"]
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.pages = np.load(os.path.join(path, "pages.npy"), mmap_mode="r")
+        self.sources = np.load(os.path.join(path, "sources.npy"), mmap_mode="r")
+        text_path = os.path.join(path, "text.bin")
+        if os.path.getsize(text_path):
+            with open(text_path, "rb") as f:
+                self.text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.text = b""
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    def chunk(self, row):
+        return self.text[int(self.offsets[row]):int(self.offsets[row + 1])].decode("utf-8")
+
+    def search(self, query_vector, top_k):
+        count = len(self)
+        if count == 0:
+            return []
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            block = self.vectors[start:start + SEARCH_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query_vector
+        top_k = min(top_k, count)
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return [{
+            "source": self.files[int(self.sources[row])]["path"],
+            "page": int(self.pages[row]),
+            "score": round(float(scores[row]), 4),
+            "text": self.chunk(row),
+        } for row in top]
+
+
+def _current_version(index_dir):
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def open_index(index_dir=INDEX_DIR):
+    version = _current_version(index_dir)
+    return DocIndex(os.path.join(index_dir, version)) if version else None
+
+
+def index_available(index_dir=INDEX_DIR):
+    return _current_version(index_dir) is not None
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    # 수집이 새 버전을 만들면 다음 검색부터 그 버전을 씀 (CURRENT 파일 한 줄만 확인)
+    global _index, _index_version
+    version = _current_version(INDEX_DIR)
+    if version != _index_version:
+        with _index_lock:
+            if version != _index_version:
+                _index = DocIndex(os.path.join(INDEX_DIR, version)) if version else None
+                _index_version = version
+    return _index
+
+
+# ==================== 수집 (증분) ====================
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _find_pdfs(docs_dir):
+    paths = []
+    for root, _, names in os.walk(docs_dir):
+        paths.extend(os.path.join(root, name) for name in names if name.lower().endswith(".pdf"))
+    return sorted(paths)
+
+
+def _settings():
+    return {"model": EMBEDDING_DEPLOYMENT, "chunk_chars": CHUNK_CHARS, "chunk_overlap": CHUNK_OVERLAP}
+
+
+def ingest(docs_dir=DOCS_DIR, index_dir=INDEX_DIR, client=None, log=None):
+    log = log or (lambda message: None)
+    previous = open_index(index_dir)
+    # 임베딩 설정이 같을 때만 이전 색인의 행을 재사용
+    reusable = previous is not None and all(previous.manifest.get(k) == v for k, v in _settings().items())
+    old_files = {entry["path"]: entry for entry in previous.files} if reusable else {}
+
+    files = []
+    parts = []
+    stats = {"reused": 0, "embedded": 0, "removed": 0, "chunks": 0}
+    for path in _find_pdfs(docs_dir):
+        rel = os.path.relpath(path, docs_dir).replace(os.sep, "/")
+        st = os.stat(path)
+        old = old_files.get(rel)
+        # 크기와 수정 시각이 같으면 해시도 다시 계산하지 않음
+        if old and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns:
+            digest = old["sha256"]
+        else:
+            digest = _file_digest(path)
+        entry = {"path": rel, "sha256": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+        if old and old["sha256"] == digest:
+            parts.append(("reuse", old))
+            stats["reused"] += 1
+        else:
+            chunks = read_pdf(path)
+            started = time.monotonic()
+            vectors = embed_texts(client or get_client(), [text for _, text in chunks]) if chunks else None
+            log(f"{rel}: 청크 {len(chunks)}개 임베딩 ({time.monotonic() - started:.1f}초)")
+            parts.append(("new", (chunks, vectors)))
+            stats["embedded"] += 1
+        files.append(entry)
+
+    stats["removed"] = len(set(old_files) - {entry["path"] for entry in files})
+    if previous is not None and reusable and not stats["embedded"] and not stats["removed"]:
+        stats["chunks"] = len(previous)
+        return stats
+
+    _write_version(index_dir, previous, files, parts, stats)
+    return stats
+
+
+def _write_version(index_dir, previous, files, parts, stats):
+    dim = None
+    for kind, value in parts:
+        if kind == "reuse":
+            dim = previous.vectors.shape[1]
+        elif value[1] is not None:
+            dim = value[1].shape[1]
+        if dim:
+            break
+    counts = [value["count"] if kind == "reuse" else len(value[0]) for kind, value in parts]
+    total = sum(counts)
+    stats["chunks"] = total
+
+    version = f"v{time.time_ns()}"
+    path = os.path.join(index_dir, version)
+    os.makedirs(path)
+    # 행렬은 파일에 바로 채워서 전체 임베딩을 메모리에 모으지 않음
+    vectors = np.lib.format.open_memmap(
+        os.path.join(path, "vectors.npy"), mode="w+", dtype=np.float16, shape=(total, dim or 0)
+    )
+    offsets = np.zeros(total + 1, dtype=np.int64)
+    pages = np.zeros(total, dtype=np.int32)
+    sources = np.zeros(total, dtype=np.int32)
+
+    row = 0
+    written = 0
+    with open(os.path.join(path, "text.bin"), "wb") as text_file:
+        for source, ((kind, value), count, entry) in enumerate(zip(parts, counts, files)):
+            entry.update(start=row, count=count)
+            if kind == "reuse":
+                # 바뀌지 않은 파일은 이전 색인에서 행과 원문을 그대로 복사
+                start = value["start"]
+                vectors[row:row + count] = previous.vectors[start:start + count]
+                pages[row:row + count] = previous.pages[start:start + count]
+                begin, end = int(previous.offsets[start]), int(previous.offsets[start + count])
+                text_file.write(previous.text[begin:end])
+                offsets[row + 1:row + count + 1] = previous.offsets[start + 1:start + count + 1] - begin + written
+                written += end - begin
+            else:
+                chunks, chunk_vectors = value
+                if count:
+                    vectors[row:row + count] = chunk_vectors
+                for i, (page_no, text) in enumerate(chunks):
+                    data = text.encode("utf-8")
+                    text_file.write(data)
+                    written += len(data)
+                    pages[row + i] = page_no
+                    offsets[row + i + 1] = written
+            sources[row:row + count] = source
+            row += count
+    vectors.flush()
+    del vectors
+    np.save(os.path.join(path, "offsets.npy"), offsets)
+    np.save(os.path.join(path, "pages.npy"), pages)
+    np.save(os.path.join(path, "sources.npy"), sources)
+    with open(os.path.join(path, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(dict(_settings(), dim=dim, files=files), f, ensure_ascii=False, indent=2)
+
+    # 버전 전환은 CURRENT 한 파일의 교체로 (검색 중인 프로세스는 다음 조회부터 새 버전을 봄)
+    tmp_path = os.path.join(index_dir, f"{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(index_dir, CURRENT_FILE))
+
+    # 바로 이전 버전은 아직 열고 있는 프로세스가 있을 수 있으므로 그보다 오래된 것만 정리
+    keep = {version, os.path.basename(previous.path) if previous else None}
+    for name in os.listdir(index_dir):
+        if name.startswith("v") and name not in keep:
+            shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+# ==================== 검색 도구 ====================
+def search_docs(query, top_k=TOP_K):
+    index = get_index()
+    if index is None:
+        return json.dumps({"query": query, "results": [], "error": "no documents indexed"})
+    with span("docs.embed"):
+        vector = embed_query(query)
+    with span("docs.search"):
+        results = index.search(vector, max(1, min(int(top_k), MAX_TOP_K)))
+    return json.dumps({"query": query, "results": results})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF 문서 수집 / 검색")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = sub.add_parser("ingest", help="바뀐 PDF 만 다시 임베딩해서 색인 갱신")
+    ingest_parser.add_argument("--docs", default=DOCS_DIR, help="PDF 디렉터리")
+    ingest_parser.add_argument("--index", default=INDEX_DIR, help="색인 디렉터리")
+    search_parser = sub.add_parser("search", help="색인에서 검색")
+    search_parser.add_argument("query")
+    search_parser.add_argument("-k", type=int, default=TOP_K)
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        os.makedirs(args.index, exist_ok=True)
+        started = time.monotonic()
+        stats = ingest(args.docs, args.index, log=lambda message: print(message, file=sys.stderr))
+        print(f"재사용 {stats['reused']}개 · 새로 임베딩 {stats['embedded']}개 · 삭제 {stats['removed']}개 · "
+              f"청크 {stats['chunks']}개 ({time.monotonic() - started:.1f}초)", file=sys.stderr)
+    else:
+        for result in json.loads(search_docs(args.query, args.k))["results"]:
+            print(f"[{result['score']:.3f}] {result['source']} p.{result['page']}: {result['text'][:120]!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from conversation_store import delete_thread_endpoint, load_thread_endpoint, save_thread_endpoint
+
+# ==================== 엔드포인트 라우팅 설정 ====================
+# 여러 리전/배포를 쓸 때 JSON 목록으로 지정 (없으면 EXER_AZURE_OPENAI_* 하나만 사용)
+#   [{"name": "koreacentral", "endpoint": "https://...", "api_key_env": "AOAI_KEY_KR", "deployment": "gpt-4o-mini"}, ...]
+ENDPOINTS_JSON = os.getenv("AOAI_ENDPOINTS", "")
+
+# 지연 시간 지수 이동 평균의 새 값 가중치
+EWMA_ALPHA = float(os.getenv("ROUTE_EWMA_ALPHA", "0.2"))
+# 연속 실패가 이 횟수에 이르면 COOLDOWN 초 동안 새 스레드를 보내지 않음
+FAILURE_THRESHOLD = int(os.getenv("ROUTE_FAILURE_THRESHOLD", "3"))
+COOLDOWN = float(os.getenv("ROUTE_COOLDOWN", "30"))
+
+MAX_BOUND_THREADS = int(os.getenv("ROUTE_MAX_BOUND_THREADS", "10000"))
+
+DEFAULT_ENDPOINT = "default"
+
+
+class Endpoint:
+    def __init__(self, name, url, api_key, deployment=None):
+        self.name = name
+        self.url = url
+        self.api_key = api_key
+        self.deployment = deployment
+        self.netloc = urlparse(url).netloc if url else None
+        self.ewma = None
+        self.failures = 0
+        self.unhealthy_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def healthy(self, now):
+        return now >= self.unhealthy_until
+
+
+def load_endpoints():
+    if not ENDPOINTS_JSON:
+        return [Endpoint(
+            DEFAULT_ENDPOINT,
+            os.getenv("EXER_AZURE_OPENAI_ENDPOINT"),
+            os.getenv("EXER_AZURE_OPENAI_API_KEY")
+        )]
+    endpoints = []
+    for item in json.loads(ENDPOINTS_JSON):
+        api_key = item.get("api_key") or os.getenv(item.get("api_key_env", ""))
+        endpoints.append(Endpoint(item["name"], item["endpoint"], api_key, item.get("deployment")))
+    return endpoints
+
+
+# ==================== 라우터 ====================
+class Router:
+    def __init__(self, endpoints):
+        self.endpoints = OrderedDict((endpoint.name, endpoint) for endpoint in endpoints)
+        self._by_netloc = {endpoint.netloc: endpoint for endpoint in endpoints}
+        self._threads = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def default(self):
+        return next(iter(self.endpoints))
+
+    def multi(self):
+        return len(self.endpoints) > 1
+
+    def get(self, name):
+        # 설정에서 빠진 엔드포인트를 가리키면 기본 엔드포인트로
+        return self.endpoints.get(name) or self.endpoints[self.default]
+
+    def pick(self, exclude=()):
+        # 새 스레드는 건강한 엔드포인트 중 평균 지연이 가장 짧은 곳으로 (아직 측정 전이면 먼저 시도)
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints.values() if e.name not in exclude]
+            if not candidates:
+                return None
+            healthy = [e for e in candidates if e.healthy(now)]
+            if not healthy:
+                # 모두 장애 상태면 가장 먼저 회복될 곳으로
+                return min(candidates, key=lambda e: e.unhealthy_until).name
+            return min(healthy, key=lambda e: e.ewma or 0.0).name
+
+    # ---------- 측정 ----------
+    def record_response(self, netloc, seconds, status_code):
+        # 전송 계층이 모든 요청마다 호출 (연결 실패면 status_code 가 None)
+        endpoint = self._by_netloc.get(netloc)
+        if endpoint is None:
+            return
+        with self._lock:
+            endpoint.requests += 1
+            if status_code is None or status_code >= 500:
+                self._fail(endpoint)
+                return
+            endpoint.failures = 0
+            endpoint.ewma = seconds if endpoint.ewma is None else (
+                EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * endpoint.ewma
+            )
+
+    def _fail(self, endpoint):
+        endpoint.errors += 1
+        endpoint.failures += 1
+        if endpoint.failures >= FAILURE_THRESHOLD:
+            endpoint.unhealthy_until = time.monotonic() + COOLDOWN
+
+    # ---------- 스레드 고정 ----------
+    def bind(self, thread_id, name):
+        # 스레드는 만든 엔드포인트에만 있으므로 이후 요청도 항상 같은 곳으로
+        if not self.multi():
+            return
+        with self._lock:
+            self._remember(thread_id, name)
+        save_thread_endpoint(thread_id, name)
+
+    def endpoint_for(self, thread_id):
+        if not self.multi() or thread_id is None:
+            return self.default
+        with self._lock:
+            name = self._threads.get(thread_id)
+        if name is None:
+            # 재시작 뒤에는 대화 저장소에 남긴 기록에서 찾음
+            name = load_thread_endpoint(thread_id)
+            if name not in self.endpoints:
+                name = self.default
+            with self._lock:
+                self._remember(thread_id, name)
+        return name
+
+    def unbind(self, thread_id):
+        if not self.multi():
+            return
+        with self._lock:
+            self._threads.pop(thread_id, None)
+        delete_thread_endpoint(thread_id)
+
+    def _remember(self, thread_id, name):
+        self._threads[thread_id] = name
+        self._threads.move_to_end(thread_id)
+        while len(self._threads) > MAX_BOUND_THREADS:
+            self._threads.popitem(last=False)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "name": e.name,
+                "healthy": e.healthy(now),
+                "ewma_ms": round(e.ewma * 1000) if e.ewma is not None else None,
+                "requests": e.requests,
+                "errors": e.errors,
+            } for e in self.endpoints.values()]
+
+
+router = Router(load_endpoints())
@@ -0,0 +1,296 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from openai import APIError, BadRequestError, NotFoundError
+
+from metrics import record_poll, record_span, span
+
+# ==================== Run 실행 설정 ====================
+# stream: 스트리밍 이벤트 사용 / poll: 스트리밍을 못 쓰는 배포용 폴링
+RUN_MODE = os.getenv("RUN_MODE", "stream").lower()
+
+# 폴링 간격은 짧게 시작해서 지수적으로 늘리고 상한에서 멈춤
+POLL_INITIAL_INTERVAL = float(os.getenv("POLL_INITIAL_INTERVAL", "0.05"))
+POLL_MAX_INTERVAL = float(os.getenv("POLL_MAX_INTERVAL", "2.0"))
+POLL_BACKOFF = float(os.getenv("POLL_BACKOFF", "1.6"))
+
+# run 하나가 쓸 수 있는 전체 시간 (초) - 넘으면 runs.cancel
+RUN_DEADLINE = float(os.getenv("RUN_DEADLINE", "180"))
+
+# 취소한 run 이 실제로 멈출 때까지 기다리는 최대 시간 (초)
+CANCEL_SETTLE_TIMEOUT = float(os.getenv("RUN_CANCEL_SETTLE_TIMEOUT", "10"))
+
+# 스트림을 끝내는 run 이벤트
+TERMINAL_EVENTS = {
+    "thread.run.completed",
+    "thread.run.failed",
+    "thread.run.cancelled",
+    "thread.run.expired",
+    "thread.run.incomplete",
+}
+
+ACTIVE_STATUSES = ("queued", "in_progress", "requires_action")
+
+# run 결과 조회 한 페이지 크기와, 스레드별로 기억할 마지막 메시지 커서 수
+RESULT_PAGE_SIZE = int(os.getenv("RUN_RESULT_PAGE_SIZE", "20"))
+MAX_CURSORS = int(os.getenv("RUN_RESULT_MAX_CURSORS", "10000"))
+
+_cursor_lock = threading.Lock()
+_cursors = OrderedDict()
+
+
+class RunTimeout(Exception):
+    pass
+
+
+class ThreadNotFound(Exception):
+    pass
+
+
+class AssistantNotFound(Exception):
+    pass
+
+
+# ==================== Run 결과 조회 ====================
+def remember_cursor(thread_id, message_id):
+    with _cursor_lock:
+        _cursors[thread_id] = message_id
+        _cursors.move_to_end(thread_id)
+        while len(_cursors) > MAX_CURSORS:
+            _cursors.popitem(last=False)
+
+
+async def fetch_run_output(client, thread_id, run_id):
+    # 스레드 전체가 아니라 이 run 이 만든, 커서 이후의 메시지만 오래된 순서로 받음
+    with _cursor_lock:
+        after = _cursors.get(thread_id)
+    text_parts = []
+    file_ids = []
+
+    while True:
+        params = {"thread_id": thread_id, "run_id": run_id, "order": "asc", "limit": RESULT_PAGE_SIZE}
+        if after:
+            params["after"] = after
+        try:
+            with span("messages.list"):
+                page = await client.beta.threads.messages.list(**params)
+        except BadRequestError:
+            # 커서 메시지가 사라졌으면 run_id 필터만으로 다시 조회
+            if not after:
+                raise
+            after = None
+            continue
+
+        for message in page.data:
+            text = "".join(block.text.value for block in message.content if block.type == "text")
+            if text:
+                text_parts.append(text)
+            file_ids.extend(block.image_file.file_id for block in message.content if block.type == "image_file")
+            after = message.id
+        if not page.has_more:
+            break
+
+    if after:
+        remember_cursor(thread_id, after)
+    return "\n\n".join(text_parts), file_ids
+
+
+# ==================== Run 취소 ====================
+async def cancel_run(client, thread_id, run_id):
+    # 이미 끝난 run 이면 400 이 오므로 무시
+    try:
+        await client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+    except APIError:
+        return False
+
+    # cancelling 상태에서는 스레드에 새 메시지를 넣을 수 없으므로 멈출 때까지 기다림
+    waited = 0.0
+    interval = POLL_INITIAL_INTERVAL
+    while waited < CANCEL_SETTLE_TIMEOUT:
+        try:
+            run = await client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+        except APIError:
+            break
+        if run.status not in ACTIVE_STATUSES + ("cancelling",):
+            break
+        await asyncio.sleep(interval)
+        waited += interval
+        interval = min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+    return True
+
+
+async def _check_deadline(client, thread_id, run_id, started, deadline):
+    if run_id and time.monotonic() - started > deadline:
+        await cancel_run(client, thread_id, run_id)
+        raise RunTimeout(f"run {run_id} 이 {deadline:.0f}초 안에 끝나지 않아 취소했습니다.")
+
+
+# ==================== Run 시작 ====================
+def _missing_assistant(error):
+    # run 시작의 404 는 스레드나 Assistant 중 하나가 없다는 뜻이라 본문 메시지로 구분
+    # ("No assistant found with id 'asst_...'." / "No thread found with id 'thread_...'.")
+    body = error.body if isinstance(error.body, dict) else {}
+    return "assistant" in str(body.get("message") or error.message).lower()
+
+
+async def _create_run(client, thread_id, assistant_id, first_turn=False, **run_params):
+    # 스레드가 없으면 (새 채팅의 첫 질문) 스레드 생성 + 메시지 + run 시작을 한 번의 요청으로 처리
+    try:
+        if thread_id is not None:
+            try:
+                return await client.beta.threads.runs.create(thread_id=thread_id, assistant_id=assistant_id, **run_params)
+            except NotFoundError as e:
+                # 첫 질문 전에 정리된 풀 스레드만 새 스레드로 대신함 (잃을 문맥이 없음)
+                # 대화가 있던 스레드를 조용히 바꾸면 문맥이 사라지므로 사용자에게 알림
+                if _missing_assistant(e):
+                    raise
+                if not first_turn:
+                    raise ThreadNotFound("이전 대화 스레드를 찾을 수 없어 문맥을 이어갈 수 없습니다. 다시 질문하면 새 대화로 시작합니다.")
+        messages = run_params.pop("additional_messages", None) or []
+        return await client.beta.threads.create_and_run(
+            assistant_id=assistant_id,
+            thread={"messages": messages},
+            **run_params
+        )
+    except NotFoundError as e:
+        if _missing_assistant(e):
+            raise AssistantNotFound(f"Assistant {assistant_id} 가 서버에 없습니다.") from e
+        raise
+
+
+# ==================== 스트리밍 Run ====================
+# emit(kind, payload): "run" (run id), "delta" (텍스트 조각), "status" (진행 상황)
+async def stream_run(client, thread_id, assistant_id, emit, handle_tool_calls,
+                     deadline=RUN_DEADLINE, **run_params):
+    started = time.monotonic()
+    full_response = ""
+    file_ids = []
+    run = None
+    message_id = None
+    used_tools = False
+    with span("runs.create"):
+        stream = await _create_run(client, thread_id, assistant_id, stream=True, **run_params)
+    # 단계 시각: 큐 대기(created -> in_progress), 생성(in_progress -> 끝 또는 requires_action)
+    phase_started = time.monotonic()
+
+    # requires_action 이 나오면 현재 스트림이 끝나고, 도구 결과 제출이 새 스트림을 연다
+    while stream is not None:
+        tool_calls = None
+        async with stream:
+            async for event in stream:
+                if event.event == "thread.run.created":
+                    run = event.data
+                    if run.thread_id != thread_id:
+                        thread_id = run.thread_id
+                        emit("thread", thread_id)
+                    emit("run", run.id)
+                elif event.event == "thread.run.in_progress":
+                    now = time.monotonic()
+                    record_span("run.queue", phase_started, now - phase_started)
+                    phase_started = now
+                elif event.event == "thread.message.delta":
+                    # run 이 메시지를 여러 개 만들면 문단을 나눠서 이어 붙임
+                    if message_id not in (None, event.data.id) and full_response:
+                        full_response += "\n\n"
+                        emit("delta", "\n\n")
+                    message_id = event.data.id
+                    for block in event.data.delta.content or []:
+                        if block.type == "text" and block.text and block.text.value:
+                            full_response += block.text.value
+                            emit("delta", block.text.value)
+                        elif block.type == "image_file" and block.image_file:
+                            file_ids.append(block.image_file.file_id)
+                elif event.event == "thread.run.requires_action":
+                    run = event.data
+                    tool_calls = run.required_action.submit_tool_outputs.tool_calls
+                    record_span("run.generate", phase_started, time.monotonic() - phase_started)
+                elif event.event == "thread.message.completed":
+                    remember_cursor(thread_id, event.data.id)
+                elif event.event in TERMINAL_EVENTS:
+                    run = event.data
+                    record_span("run.generate", phase_started, time.monotonic() - phase_started)
+                elif event.event == "error":
+                    raise RuntimeError(f"스트리밍 오류: {event.data}")
+                await _check_deadline(client, thread_id, run and run.id, started, deadline)
+
+        stream = None
+        if tool_calls:
+            used_tools = True
+            with span("tools"):
+                tool_outputs = await handle_tool_calls(tool_calls)
+            with span("submit_tool_outputs"):
+                stream = await client.beta.threads.runs.submit_tool_outputs(
+                    thread_id=thread_id,
+                    run_id=run.id,
+                    tool_outputs=tool_outputs,
+                    stream=True
+                )
+            phase_started = time.monotonic()
+
+    return {"run": run, "thread_id": thread_id, "text": full_response, "file_ids": file_ids, "used_tools": used_tools}
+
+
+# ==================== 폴링 Run (스트리밍 불가 배포용) ====================
+async def poll_run(client, thread_id, assistant_id, emit, handle_tool_calls,
+                   deadline=RUN_DEADLINE, **run_params):
+    started = time.monotonic()
+    full_response = ""
+    file_ids = []
+    used_tools = False
+
+    with span("runs.create"):
+        run = await _create_run(client, thread_id, assistant_id, **run_params)
+    if run.thread_id != thread_id:
+        thread_id = run.thread_id
+        emit("thread", thread_id)
+    emit("run", run.id)
+
+    # 폴링에서는 상태가 queued 를 벗어난 것을 처음 본 시점까지를 큐 대기로 기록
+    phase_started = time.monotonic()
+    queued = run.status == "queued"
+
+    interval = POLL_INITIAL_INTERVAL
+    while run.status in ACTIVE_STATUSES:
+        if queued and run.status != "queued":
+            now = time.monotonic()
+            record_span("run.queue", phase_started, now - phase_started)
+            phase_started, queued = now, False
+        if run.status == "requires_action":
+            used_tools = True
+            record_span("run.generate", phase_started, time.monotonic() - phase_started)
+            with span("tools"):
+                tool_outputs = await handle_tool_calls(run.required_action.submit_tool_outputs.tool_calls)
+            with span("submit_tool_outputs"):
+                run = await client.beta.threads.runs.submit_tool_outputs(
+                    thread_id=thread_id,
+                    run_id=run.id,
+                    tool_outputs=tool_outputs
+                )
+            phase_started = time.monotonic()
+            # 도구 결과 뒤의 답변 생성은 보통 짧으므로 다시 짧은 간격부터
+            interval = POLL_INITIAL_INTERVAL
+            continue
+
+        await _check_deadline(client, thread_id, run.id, started, deadline)
+        emit("status", f"⏳ 실행 중... ({time.monotonic() - started:.0f}초)")
+        # 여러 세션의 폴링이 같은 순간에 몰리지 않도록 jitter
+        await asyncio.sleep(random.uniform(interval / 2, interval))
+        interval = min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+        record_poll()
+        run = await client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
+
+    record_span("run.generate", phase_started, time.monotonic() - phase_started)
+    if run.status == "completed":
+        full_response, file_ids = await fetch_run_output(client, thread_id, run.id)
+
+    return {"run": run, "thread_id": thread_id, "text": full_response, "file_ids": file_ids, "used_tools": used_tools}
+
+
+async def execute_run(client, thread_id, assistant_id, emit, handle_tool_calls, **kwargs):
+    if RUN_MODE == "poll":
+        return await poll_run(client, thread_id, assistant_id, emit, handle_tool_calls, **kwargs)
+    return await stream_run(client, thread_id, assistant_id, emit, handle_tool_calls, **kwargs)
@@ -0,0 +1,311 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+from context import thread_usage
+
+# ==================== 요청 스케줄러 설정 ====================
+# 배포별 분당 요청 수 / 토큰 수 한도 (0 이면 제한 없음) - Azure 할당량보다 약간 낮게 설정
+RATE_LIMIT_RPM = int(os.getenv("AOAI_RPM", "0"))
+RATE_LIMIT_TPM = int(os.getenv("AOAI_TPM", "0"))
+# URL 에 배포 이름이 없는 Assistants API 요청이 쓰는 배포 이름
+DEFAULT_DEPLOYMENT = os.getenv("AOAI_DEPLOYMENT", "default")
+
+# 429 를 받으면 Retry-After 만큼 해당 배포의 모든 요청을 멈추고 이 횟수까지 다시 시도
+RATE_LIMIT_RETRIES = int(os.getenv("AOAI_RATE_LIMIT_RETRIES", "4"))
+MAX_RETRY_AFTER = float(os.getenv("AOAI_MAX_RETRY_AFTER", "60"))
+DEFAULT_RETRY_AFTER = float(os.getenv("AOAI_DEFAULT_RETRY_AFTER", "2"))
+
+# run 을 시작하는 요청의 토큰 비용 추정 (스레드 사용량을 모르면 RUN, 알면 마지막 프롬프트 + COMPLETION)
+RUN_TOKEN_ESTIMATE = int(os.getenv("AOAI_RUN_TOKEN_ESTIMATE", "1500"))
+COMPLETION_TOKEN_ESTIMATE = int(os.getenv("AOAI_COMPLETION_TOKEN_ESTIMATE", "500"))
+
+# 대기 중 상태 확인 간격 (초)
+WAIT_SLICE = 0.05
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# 현재 요청의 우선순위와 대기 상황을 알려 줄 콜백 (대화 턴이면 UI 에 대기열 위치 표시)
+request_priority = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+wait_listener = contextvars.ContextVar("wait_listener", default=None)
+# 현재 작업(도구 호출 등)이 끝나야 하는 시각 (time.monotonic, None 이면 제한 없음)
+request_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+RUN_START_PATH = re.compile(r"/threads(?:/(thread_[\w-]+))?/runs(?:/run_[\w-]+/submit_tool_outputs)?$")
+DEPLOYMENT_PATH = re.compile(r"/deployments/([^/]+)/")
+
+
+# ==================== 토큰 버킷 ====================
+class TokenBucket:
+    # Azure 는 분당 한도를 10초 단위로 나눠 적용하므로 버스트는 10초 분량까지만 허용
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, per_minute / 6)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost):
+        # 한도보다 큰 요청은 버킷이 가득 찼을 때 보냄
+        cost = min(cost, self.capacity)
+        return 0.0 if self.tokens >= cost else (cost - self.tokens) / self.rate
+
+    def take(self, cost):
+        self.tokens -= min(cost, self.capacity)
+
+
+class Lane:
+    # 배포 하나의 한도, 429 대기 시각, 우선순위 대기열
+    def __init__(self):
+        self.requests = TokenBucket(RATE_LIMIT_RPM) if RATE_LIMIT_RPM > 0 else None
+        self.tokens = TokenBucket(RATE_LIMIT_TPM) if RATE_LIMIT_TPM > 0 else None
+        self.blocked_until = 0.0
+        self.waiters = []
+        self.throttled = 0
+
+
+# ==================== 스케줄러 ====================
+class Scheduler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lanes = {}
+        self._seq = itertools.count()
+
+    def _lane(self, key):
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = Lane()
+        return lane
+
+    def _enqueue(self, key, priority):
+        ticket = (priority, next(self._seq))
+        with self._lock:
+            heapq.heappush(self._lane(key).waiters, ticket)
+        return ticket
+
+    def _try_acquire(self, key, ticket, cost):
+        # 대기열 맨 앞이고 한도가 남아 있을 때만 통과, 아니면 (예상 대기 시간, 대기열 위치)
+        with self._lock:
+            lane = self._lane(key)
+            now = time.monotonic()
+            wait = max(0.0, lane.blocked_until - now)
+            for bucket, amount in ((lane.requests, 1), (lane.tokens, cost)):
+                if bucket is not None:
+                    bucket.refill(now)
+                    wait = max(wait, bucket.wait_time(amount))
+            position = sum(1 for waiter in lane.waiters if waiter < ticket)
+            if wait == 0 and position == 0:
+                heapq.heappop(lane.waiters)
+                if lane.requests is not None:
+                    lane.requests.take(1)
+                if lane.tokens is not None:
+                    lane.tokens.take(cost)
+                return None
+            if lane.requests is not None and position:
+                wait += position / lane.requests.rate
+            return wait, position + 1
+
+    def _cancel(self, key, ticket):
+        with self._lock:
+            lane = self._lane(key)
+            if ticket in lane.waiters:
+                lane.waiters.remove(ticket)
+                heapq.heapify(lane.waiters)
+
+    def _unlimited(self, key):
+        lane = self._lanes.get(key)
+        return RATE_LIMIT_RPM <= 0 and RATE_LIMIT_TPM <= 0 and (lane is None or lane.blocked_until <= time.monotonic())
+
+    def acquire(self, key, cost):
+        if self._unlimited(key):
+            return
+        ticket = self._enqueue(key, request_priority.get())
+        try:
+            while (state := self._try_acquire(key, ticket, cost)) is not None:
+                if time_left() == 0:
+                    # 마감이 지난 도구 호출은 한도 대기열에서 빠져서 다른 요청의 자리를 비움
+                    raise httpx.PoolTimeout("request deadline passed while waiting for rate limit")
+                _notify(*state)
+                time.sleep(min(state[0], WAIT_SLICE) or WAIT_SLICE)
+        except BaseException:
+            self._cancel(key, ticket)
+            raise
+
+    async def acquire_async(self, key, cost):
+        if self._unlimited(key):
+            return
+        ticket = self._enqueue(key, request_priority.get())
+        try:
+            while (state := self._try_acquire(key, ticket, cost)) is not None:
+                _notify(*state)
+                await asyncio.sleep(min(state[0], WAIT_SLICE) or WAIT_SLICE)
+        except BaseException:
+            self._cancel(key, ticket)
+            raise
+
+    def block(self, key, seconds):
+        # 429: 이 배포의 모든 요청을 Retry-After 동안 멈춤 (각 세션이 따로 재시도하며 몰리지 않도록)
+        with self._lock:
+            lane = self._lane(key)
+            lane.blocked_until = max(lane.blocked_until, time.monotonic() + seconds)
+            lane.throttled += 1
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            return {
+                key: {
+                    "waiting": len(lane.waiters),
+                    "blocked_for": max(0.0, lane.blocked_until - now),
+                    "throttled": lane.throttled,
+                }
+                for key, lane in self._lanes.items()
+            }
+
+
+scheduler = Scheduler()
+
+
+def time_left(limit=None):
+    # 마감까지 남은 시간 (초, 지났으면 0) - 마감이 없으면 limit 그대로
+    deadline = request_deadline.get()
+    if deadline is None:
+        return limit
+    left = max(0.0, deadline - time.monotonic())
+    return left if limit is None else min(limit, left)
+
+
+def _notify(wait, position):
+    listener = wait_listener.get()
+    if listener is not None:
+        listener(position, wait)
+
+
+# ==================== 요청 분류 ====================
+def request_key(request):
+    match = DEPLOYMENT_PATH.search(request.url.path)
+    return f"{request.url.host}/{match.group(1) if match else DEFAULT_DEPLOYMENT}"
+
+
+def request_cost(request):
+    # 토큰 한도는 run 을 시작하는 요청에만 적용 (조회/메시지 요청은 요청 수 한도만)
+    if request.method != "POST":
+        return 0
+    match = RUN_START_PATH.search(request.url.path)
+    if match is None:
+        return 0
+    usage = thread_usage.get(match.group(1)) if match.group(1) else None
+    if usage is None:
+        return RUN_TOKEN_ESTIMATE
+    return usage["last_prompt_tokens"] + COMPLETION_TOKEN_ESTIMATE
+
+
+def retry_after(response):
+    headers = response.headers
+    for name, scale in (("retry-after-ms", 0.001), ("x-ms-retry-after-ms", 0.001), ("retry-after", 1)):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            seconds = float(value) * scale
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                continue
+        return min(MAX_RETRY_AFTER, max(0.0, seconds))
+    return DEFAULT_RETRY_AFTER
+
+
+def give_up(response):
+    # 429 재시도는 여기서만 함: SDK 가 같은 요청을 다시 보내면 (max_retries) 배포 차단을 무시하고
+    # 이 재시도 루프를 몇 번 더 돌게 되므로, 여기서 포기한 429 는 다시 시도하지 말라고 표시
+    response.headers["x-should-retry"] = "false"
+    return response
+
+
+def _observe(observe, request, started, status_code):
+    # 스트리밍 응답은 헤더가 도착한 시점까지 (첫 토큰 전 서버 처리 시간에 가까움)
+    if observe is not None:
+        observe(request.url.netloc.decode("ascii"), time.monotonic() - started, status_code)
+
+
+# ==================== httpx 전송 계층 ====================
+# 모든 Azure 요청(run, 조회, 메시지, 파일)이 클라이언트 종류와 무관하게 여기를 거침
+# observe(netloc, 응답까지 걸린 초, 상태 코드 또는 연결 실패면 None) 로 대기열 시간을 뺀 실제 지연을 알려줌
+class ScheduledTransport(httpx.BaseTransport):
+    def __init__(self, inner, observe=None):
+        self.inner = inner
+        self.observe = observe
+
+    def _send(self, request):
+        started = time.monotonic()
+        try:
+            response = self.inner.handle_request(request)
+        except httpx.TransportError:
+            _observe(self.observe, request, started, None)
+            raise
+        _observe(self.observe, request, started, response.status_code)
+        return response
+
+    def handle_request(self, request):
+        key = request_key(request)
+        cost = request_cost(request)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            scheduler.acquire(key, cost)
+            response = self._send(request)
+            if response.status_code != 429:
+                return response
+            if attempt == RATE_LIMIT_RETRIES:
+                return give_up(response)
+            scheduler.block(key, retry_after(response))
+            response.read()
+            response.close()
+
+    def close(self):
+        self.inner.close()
+
+
+class AsyncScheduledTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner, observe=None):
+        self.inner = inner
+        self.observe = observe
+
+    async def _send(self, request):
+        started = time.monotonic()
+        try:
+            response = await self.inner.handle_async_request(request)
+        except httpx.TransportError:
+            _observe(self.observe, request, started, None)
+            raise
+        _observe(self.observe, request, started, response.status_code)
+        return response
+
+    async def handle_async_request(self, request):
+        key = request_key(request)
+        cost = request_cost(request)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            await scheduler.acquire_async(key, cost)
+            response = await self._send(request)
+            if response.status_code != 429:
+                return response
+            if attempt == RATE_LIMIT_RETRIES:
+                return give_up(response)
+            scheduler.block(key, retry_after(response))
+            await response.aread()
+            await response.aclose()
+
+    async def aclose(self):
+        await self.inner.aclose()
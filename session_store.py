@@ -0,0 +1,233 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# ==================== 세션 저장소 설정 ====================
+# 대화 상태(스레드 id, 메시지, 저장 위치)를 프로세스 밖에 두어서
+# 여러 앱 프로세스가 같은 sid 를 이어받아 처리할 수 있게 함 (재시작/장애 시에도 대화 유지)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+# Redis 프로토콜을 쓰는 서버면 무엇이든 가능 (로컬에서는 bench/mock_redis.py)
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+SESSION_REDIS_PREFIX = os.getenv("SESSION_REDIS_PREFIX", "chat:session:")
+# 마지막 사용 후 이 시간이 지난 세션은 지움
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(7 * 24 * 3600)))
+
+# 이보다 큰 값만 압축 (짧은 메시지는 zlib 헤더가 더 큼)
+COMPRESS_MIN_BYTES = 512
+
+
+def pack(value):
+    data = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(data) >= COMPRESS_MIN_BYTES:
+        return b"z" + zlib.compress(data)
+    return b"j" + data
+
+
+def unpack(data):
+    data = bytes(data)
+    if data[:1] == b"z":
+        return json.loads(zlib.decompress(data[1:]))
+    return json.loads(data[1:])
+
+
+# ==================== SQLite 백엔드 ====================
+# 한 서버에서 여러 프로세스를 띄울 때 (WAL 이라 읽기는 서로 막지 않음)
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    sid TEXT PRIMARY KEY,
+    state BLOB NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at);
+
+CREATE TABLE IF NOT EXISTS session_messages (
+    sid TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (sid, seq)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteSessionStore:
+    def __init__(self, path=SESSION_DB_PATH, ttl=SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SQLITE_SCHEMA)
+                    self._purge_expired(conn)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def _purge_expired(self, conn):
+        # 프로세스가 뜰 때 한 번만 정리 (Redis 는 키 만료로 처리)
+        cutoff = time.time() - self.ttl
+        with conn:
+            conn.execute(
+                "DELETE FROM session_messages WHERE sid IN (SELECT sid FROM sessions WHERE updated_at < ?)",
+                (cutoff,)
+            )
+            conn.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,))
+
+    def load_state(self, sid):
+        row = self._connect().execute("SELECT state FROM sessions WHERE sid = ?", (sid,)).fetchone()
+        return unpack(row[0]) if row else None
+
+    def load_messages(self, sid, start, end):
+        rows = self._connect().execute(
+            "SELECT data FROM session_messages WHERE sid = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (sid, start, end)
+        ).fetchall()
+        return [unpack(data) for data, in rows]
+
+    def write(self, sid, state, start=None, messages=()):
+        # start 번째부터의 메시지를 바꿔 쓰고 상태를 한 트랜잭션으로 기록
+        conn = self._connect()
+        with conn:
+            if start is not None:
+                conn.execute("DELETE FROM session_messages WHERE sid = ? AND seq >= ?", (sid, start))
+                conn.executemany(
+                    "INSERT INTO session_messages (sid, seq, data) VALUES (?, ?, ?)",
+                    [(sid, seq, pack(msg)) for seq, msg in enumerate(messages, start=start)]
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (sid, state, updated_at) VALUES (?, ?, ?)",
+                (sid, pack(state), time.time())
+            )
+
+
+# ==================== Redis 백엔드 ====================
+# 여러 서버에서 프로세스를 띄울 때: 상태는 문자열 키, 메시지는 리스트 키 하나
+class RedisSessionStore:
+    def __init__(self, url=SESSION_REDIS_URL, prefix=SESSION_REDIS_PREFIX, ttl=SESSION_TTL):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("SESSION_BACKEND=redis 에는 redis 패키지가 필요합니다 (pip install redis)")
+        # 연결 풀은 스레드 간에 공유해도 안전, RESP2 는 Redis 호환 서버라면 모두 지원
+        self.redis = redis.Redis.from_url(url, protocol=2)
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _keys(self, sid):
+        key = f"{self.prefix}{sid}"
+        return key, f"{key}:messages"
+
+    def load_state(self, sid):
+        data = self.redis.get(self._keys(sid)[0])
+        return unpack(data) if data is not None else None
+
+    def load_messages(self, sid, start, end):
+        if end <= start:
+            return []
+        return [unpack(data) for data in self.redis.lrange(self._keys(sid)[1], start, end - 1)]
+
+    def write(self, sid, state, start=None, messages=()):
+        state_key, messages_key = self._keys(sid)
+        # MULTI/EXEC 로 묶어서 다른 프로세스가 중간 상태를 읽지 않게 함
+        pipe = self.redis.pipeline(transaction=True)
+        if start is not None:
+            if start == 0:
+                pipe.delete(messages_key)
+            else:
+                pipe.ltrim(messages_key, 0, start - 1)
+            if messages:
+                pipe.rpush(messages_key, *[pack(msg) for msg in messages])
+        pipe.set(state_key, pack(state), ex=self.ttl)
+        pipe.expire(messages_key, self.ttl)
+        pipe.execute()
+
+
+# ==================== 세션 ====================
+class Session:
+    # rerun 마다 상태만 읽고, 메시지는 화면에 그릴 구간만 읽어서 프로세스에 대화 전체를 들고 있지 않음
+    def __init__(self, sid, store):
+        self.sid = sid
+        self.store = store
+        self.state = store.load_state(sid) or {"message_count": 0, "user_turns": []}
+        # 이번 rerun 에서 읽은 [window_start, message_count) 구간의 메시지
+        self._window_start = None
+        self._window = []
+
+    def __contains__(self, key):
+        return key in self.state
+
+    def get(self, key, default=None):
+        return self.state.get(key, default)
+
+    def update(self, **values):
+        self.state.update(values)
+        self.store.write(self.sid, self.state)
+
+    @property
+    def message_count(self):
+        return self.state["message_count"]
+
+    def history_start(self, turns):
+        # 사용자 질문 위치를 상태에 따로 두므로 메시지를 읽지 않고 최근 turns 개 질문의 시작을 찾음
+        user_turns = self.state["user_turns"]
+        return user_turns[-turns] if len(user_turns) >= turns else 0
+
+    def messages(self, start=0):
+        if self._window_start is None or start < self._window_start:
+            self._window = self.store.load_messages(self.sid, start, self.message_count)
+            self._window_start = start
+        return self._window[start - self._window_start:]
+
+    def append_message(self, msg, **values):
+        seq = self.message_count
+        if msg["role"] == "user":
+            self.state["user_turns"].append(seq)
+        self.state.update(values, message_count=seq + 1)
+        self.store.write(self.sid, self.state, seq, [msg])
+        if self._window_start is None:
+            self._window_start = seq
+        self._window.append(msg)
+
+    def replace_messages(self, messages, **values):
+        self.state.update(
+            values,
+            message_count=len(messages),
+            user_turns=[seq for seq, msg in enumerate(messages) if msg["role"] == "user"]
+        )
+        self.store.write(self.sid, self.state, 0, messages)
+        self._window_start = 0
+        self._window = list(messages)
+
+
+_store = None
+_lock = threading.Lock()
+
+
+def get_session_store():
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                if SESSION_BACKEND == "redis":
+                    _store = RedisSessionStore()
+                elif SESSION_BACKEND == "sqlite":
+                    _store = SQLiteSessionStore()
+                else:
+                    raise ValueError(f"알 수 없는 SESSION_BACKEND: {SESSION_BACKEND}")
+    return _store
+
+
+def open_session(sid):
+    return Session(sid, get_session_store())
@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# 저장소 루트의 모듈과 bench 의 모의 서버를 바로 import
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+# 모듈이 import 시점에 읽는 설정 - 실제 서비스나 작업 디렉터리의 DB 를 건드리지 않도록
+_workdir = tempfile.mkdtemp(prefix="exer-tests-")
+os.environ.setdefault("EXER_AZURE_OPENAI_ENDPOINT", "http://127.0.0.1:9")
+os.environ.setdefault("EXER_AZURE_OPENAI_API_KEY", "test-key")
+os.environ["CONVERSATION_DB_PATH"] = os.path.join(_workdir, "conversations.db")
+os.environ["SESSION_DB_PATH"] = os.path.join(_workdir, "sessions.db")
+os.environ["ASSISTANT_REGISTRY_PATH"] = os.path.join(_workdir, "assistant_registry.json")
+
+
+# ==================== open-meteo 스텁 ====================
+class ForecastStub:
+    def __init__(self):
+        self.requests = 0
+        self.delay = 0.0
+        self.status = 200
+        self.temperature = 21.5
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                time.sleep(stub.delay)
+                if stub.status != 200:
+                    self.send_response(stub.status)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = json.dumps({"current": {"temperature_2m": stub.temperature, "weather_code": 0}}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1/forecast"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    import weather
+
+    stub = ForecastStub()
+    monkeypatch.setattr(weather, "FORECAST_URL", stub.url)
+    monkeypatch.setattr(weather, "CACHE_TTL", 0.3)
+    monkeypatch.setattr(weather, "STALE_TTL", 60)
+    monkeypatch.setattr(weather, "READ_TIMEOUT", 0.3)
+    weather._cache.clear()
+    yield stub
+    weather._cache.clear()
+    stub.close()
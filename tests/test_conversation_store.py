@@ -0,0 +1,76 @@
+import json
+import sqlite3
+import uuid
+
+import pytest
+
+import conversation_store as store
+
+
+@pytest.fixture
+def owner():
+    return uuid.uuid4().hex
+
+
+def _image(digest):
+    return {"hash": digest, "file_id": f"file_{digest}"}
+
+
+def _blob(digest):
+    row = store._connect().execute("SELECT refs FROM blobs WHERE hash = ?", (digest,)).fetchone()
+    return row[0] if row else None
+
+
+def _save(owner, messages, start=0, conversation_id=None):
+    conversation_id = conversation_id or store.create_conversation(owner, "이미지", None)
+    store.append_messages(conversation_id, messages, start, None, lambda ref: b"png:" + ref["hash"].encode())
+    return conversation_id
+
+
+# ==================== 메시지 저장 ====================
+def test_append_to_deleted_conversation_is_noop(owner):
+    conversation_id = store.create_conversation(owner, "지울 대화", None)
+    store.delete_conversation(conversation_id)
+    assert store.append_messages(conversation_id, [{"role": "user", "content": "안녕"}], 3, None, lambda ref: None) == 3
+    assert store.load_conversation(conversation_id) == (None, [])
+
+
+# ==================== 이미지 참조 ====================
+def test_shared_blob_kept_until_last_reference(owner):
+    digest = uuid.uuid4().hex
+    first = _save(owner, [{"role": "assistant", "content": "그림", "images": [_image(digest)]}])
+    second = _save(owner, [
+        {"role": "assistant", "content": "같은 그림", "images": [_image(digest)]},
+        {"role": "assistant", "content": "또", "images": [_image(digest)]},
+    ])
+    assert _blob(digest) == 3
+
+    store.delete_conversation(second)
+    assert _blob(digest) == 1
+    assert store.load_blob(digest) == b"png:" + digest.encode()
+
+    store.delete_conversation(first)
+    assert _blob(digest) is None
+
+
+def test_overwritten_message_releases_its_images(owner):
+    old, new = uuid.uuid4().hex, uuid.uuid4().hex
+    conversation_id = _save(owner, [{"role": "assistant", "content": "처음", "images": [_image(old)]}])
+    _save(owner, [{"role": "assistant", "content": "다시", "images": [_image(new)]}], conversation_id=conversation_id)
+    assert (_blob(old), _blob(new)) == (None, 1)
+
+
+def test_refs_filled_for_existing_database():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE messages (conversation_id TEXT, seq INTEGER, role TEXT, content TEXT, images TEXT);
+        CREATE TABLE blobs (hash TEXT PRIMARY KEY, data BLOB NOT NULL) WITHOUT ROWID;
+    """)
+    conn.executemany("INSERT INTO blobs (hash, data) VALUES (?, ?)", [("a", b""), ("b", b"")])
+    conn.executemany("INSERT INTO messages VALUES (?, ?, 'assistant', '', ?)", [
+        ("c1", 0, json.dumps([_image("a"), _image("b")])),
+        ("c2", 0, json.dumps([_image("a")])),
+        ("c2", 1, None),
+    ])
+    store._add_blob_refs(conn)
+    assert dict(conn.execute("SELECT hash, refs FROM blobs")) == {"a": 2, "b": 1}
@@ -0,0 +1,104 @@
+import httpx
+import pytest
+from openai import APIConnectionError, AzureOpenAI
+
+import routing
+from azure_client import API_VERSION
+from mock_server import start_server
+from routing import Endpoint, Router
+from scheduler import ScheduledTransport
+
+
+# ==================== 모의 엔드포인트 두 개 ====================
+@pytest.fixture
+def servers():
+    fast, fast_state = start_server(latency=0.0, token_delay=0.001)
+    slow, slow_state = start_server(latency=0.15, token_delay=0.001)
+    yield {"fast": (fast, fast_state), "slow": (slow, slow_state)}
+    for server, _ in (fast, fast_state), (slow, slow_state):
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def router(servers):
+    # 목록 순서상 느린 쪽이 기본 엔드포인트
+    return Router([
+        Endpoint(name, f"http://127.0.0.1:{servers[name][0].server_port}", "test-key")
+        for name in ("slow", "fast")
+    ])
+
+
+def _client(router, name):
+    # azure_client 와 같이 스케줄러 전송 계층이 응답 지연/실패를 라우터에 알림
+    http_client = httpx.Client(transport=ScheduledTransport(httpx.HTTPTransport(), observe=router.record_response))
+    return AzureOpenAI(azure_endpoint=router.get(name).url, api_key="test-key", api_version=API_VERSION,
+                       max_retries=0, http_client=http_client)
+
+
+def _new_thread(router, clients):
+    name = router.pick()
+    thread_id = clients[name].beta.threads.create().id
+    router.bind(thread_id, name)
+    return thread_id
+
+
+# ==================== 테스트 ====================
+def test_new_threads_go_to_lower_latency(router):
+    clients = {name: _client(router, name) for name in router.endpoints}
+    # 측정 전인 엔드포인트를 먼저 시도하므로 처음 두 스레드가 양쪽을 한 번씩 잰다
+    first = {router.endpoint_for(_new_thread(router, clients)) for _ in range(2)}
+    assert first == {"slow", "fast"}
+
+    later = [router.endpoint_for(_new_thread(router, clients)) for _ in range(5)]
+    assert later == ["fast"] * 5
+    stats = {item["name"]: item for item in router.stats()}
+    assert stats["slow"]["ewma_ms"] > stats["fast"]["ewma_ms"]
+
+
+def test_failing_endpoint_marked_unhealthy(router, servers, monkeypatch):
+    monkeypatch.setattr(routing, "COOLDOWN", 60)
+    clients = {name: _client(router, name) for name in router.endpoints}
+    for name in ("slow", "fast"):
+        clients[name].beta.threads.create()
+    assert router.pick() == "fast"
+
+    fast, _ = servers["fast"]
+    fast.shutdown()
+    fast.server_close()
+    # 살아 있는 keep-alive 연결은 닫힌 서버에서도 응답하므로 새 연결로만 시도
+    clients["fast"].close()
+    clients["fast"] = _client(router, "fast")
+    for _ in range(routing.FAILURE_THRESHOLD):
+        # 마지막 실패 전까지는 아직 빠른 쪽을 고름
+        assert router.pick() == "fast"
+        with pytest.raises(APIConnectionError):
+            clients["fast"].beta.threads.create()
+
+    stats = {item["name"]: item for item in router.stats()}
+    assert stats["fast"]["healthy"] is False
+    assert router.pick() == "slow"
+    assert router.endpoint_for(_new_thread(router, clients)) == "slow"
+
+
+def test_thread_stays_on_its_endpoint(router, servers):
+    clients = {name: _client(router, name) for name in router.endpoints}
+    thread_id = clients["slow"].beta.threads.create().id
+    router.bind(thread_id, "slow")
+    clients["fast"].beta.threads.create()
+    assert router.pick() == "fast"
+
+    # 더 빠른 엔드포인트가 생겨도 기존 스레드의 요청은 만든 곳으로만 감
+    for _ in range(3):
+        name = router.endpoint_for(thread_id)
+        clients[name].beta.threads.messages.create(thread_id=thread_id, role="user", content="안녕")
+    assert name == "slow"
+    assert thread_id in servers["slow"][1].threads
+    assert thread_id not in servers["fast"][1].threads
+
+    # 재시작한 워커도 대화 저장소에 남긴 기록으로 같은 엔드포인트를 찾음
+    restarted = Router(list(router.endpoints.values()))
+    assert restarted.endpoint_for(thread_id) == "slow"
+
+    router.unbind(thread_id)
+    assert Router(list(router.endpoints.values())).endpoint_for(thread_id) == router.default
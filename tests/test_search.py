@@ -0,0 +1,95 @@
+import time
+import uuid
+
+import pytest
+
+import conversation_store as store
+from conversation_store import search_terms
+
+
+@pytest.fixture
+def owner():
+    return uuid.uuid4().hex
+
+
+def _save(owner, title, *contents):
+    conversation_id = store.create_conversation(owner, title, None)
+    messages = [{"role": "user", "content": content} for content in contents]
+    store.append_messages(conversation_id, messages, 0, None, lambda ref: None)
+    # 같은 점수일 때 최근 순서가 갈리도록
+    time.sleep(0.002)
+    return conversation_id
+
+
+def _titles(owner, query, limit=10, offset=0):
+    total, rows = store.search_conversations(owner, query, limit, offset)
+    return total, [title for _, title in rows]
+
+
+# ==================== 토크나이저 ====================
+def test_search_terms():
+    assert search_terms("Agent 에이전트란?") == ["agent", "에이", "이전", "전트", "트란", "란"]
+    assert search_terms("비 GPT4o") == ["비", "gpt4o"]
+    # 전각 문자와 대소문자는 정규화
+    assert search_terms("ＡＰＩ") == ["api"]
+
+
+# ==================== 검색 ====================
+@pytest.mark.parametrize("saved, query", [
+    ("서울 날씨 알려줘", "서울날씨"),
+    ("서울날씨 알려줘", "서울 날씨"),
+    ("서울의 날씨 알려줘", "서울날씨"),
+])
+def test_spacing_variants(owner, saved, query):
+    _save(owner, "질문", saved)
+    _save(owner, "다른 질문", "부산 바다")
+    assert _titles(owner, query) == (1, ["질문"])
+
+
+def test_trailing_particle(owner):
+    _save(owner, "정의", "에이전트란 무엇인가")
+    _save(owner, "목록", "에이전트 목록")
+    _save(owner, "무관", "에이스 카드")
+    total, titles = _titles(owner, "에이전트는")
+    assert total == 2
+    assert set(titles) == {"정의", "목록"}
+
+
+def test_single_syllable(owner):
+    _save(owner, "비", "오늘 비 와?")
+    _save(owner, "여름", "여름 장마 폭우")
+    _save(owner, "맑음", "맑은 하늘")
+    total, titles = _titles(owner, "비")
+    assert total == 1 and titles == ["비"]
+    # 단어 끝 글자와도 맞음
+    assert _titles(owner, "우") == (1, ["여름"])
+
+
+def test_ascii_prefix_while_typing(owner):
+    _save(owner, "agents", "Multi-agent systems")
+    _save(owner, "agenda", "Meeting agenda")
+    _save(owner, "other", "Weather report")
+    assert _titles(owner, "agen")[0] == 2
+    # 공백으로 끝나면 완성된 단어로 보고 정확히 일치하는 것만
+    assert _titles(owner, "agen ") == (0, [])
+    assert _titles(owner, "agent ") == (1, ["agents"])
+
+
+def test_ranking_prefers_title_and_adjacent_match(owner):
+    _save(owner, "잡담", "서울 여행에서 날씨가 좋았다")
+    _save(owner, "서울날씨", "내일은?")
+    _save(owner, "본문", "서울날씨 어때")
+    assert _titles(owner, "서울날씨")[1] == ["서울날씨", "본문", "잡담"]
+
+
+def test_pagination(owner):
+    for i in range(5):
+        _save(owner, f"보고서 {i}", "분기 보고서")
+    _save(owner, "무관", "점심 메뉴")
+    total, first = _titles(owner, "보고서", limit=2)
+    _, second = _titles(owner, "보고서", limit=2, offset=2)
+    _, last = _titles(owner, "보고서", limit=2, offset=4)
+    assert total == 5
+    # 점수가 같으면 최근 대화부터
+    assert first + second + last == [f"보고서 {i}" for i in range(4, -1, -1)]
+    assert _titles(owner, "보고서", limit=2, offset=6) == (5, [])
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+import tools
+import weather
+from scheduler import request_deadline, time_left
+
+
+def _call(call_id, name, arguments):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+
+
+# ==================== 도구 마감 ====================
+def test_weather_fetch_stops_at_deadline(stub, monkeypatch):
+    monkeypatch.setattr(weather, "READ_TIMEOUT", 5)
+    stub.delay = 2
+    token = request_deadline.set(time.monotonic() + 0.3)
+    try:
+        started = time.monotonic()
+        result = json.loads(weather.get_current_weather("서울"))
+    finally:
+        request_deadline.reset(token)
+    assert time.monotonic() - started < 1
+    assert result["temperature"] == "unknown"
+
+
+def test_timed_out_calls_free_the_executor(monkeypatch):
+    # 작업 스레드 하나: 첫 호출이 마감까지 붙잡고, 뒤에 줄 선 호출은 시작하지 않고 버려져야 함
+    started = []
+    finished = threading.Event()
+
+    def slow(name):
+        started.append(name)
+        # 마감 직후에 끝나는 느린 HTTP 요청처럼
+        time.sleep(time_left(5) + 0.05)
+        finished.set()
+        return "late"
+
+    monkeypatch.setattr(tools, "_executor", ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setitem(tools._registry, "slow", {"fn": slow, "schema": {}})
+    calls = [_call(f"call_{name}", "slow", {"name": name}) for name in ("a", "b")]
+
+    outputs = asyncio.run(tools.dispatch_tool_calls(calls, timeout=0.3))
+
+    assert [json.loads(output["output"]) for output in outputs] == [{"error": "tool call timed out"}] * 2
+    # 첫 호출도 마감을 알고 있으므로 곧 끝나서 작업 스레드를 돌려줌
+    assert finished.wait(0.5)
+    time.sleep(0.1)
+    assert started == ["a"]
+
+
+def test_fast_tools_unaffected():
+    outputs = asyncio.run(tools.dispatch_tool_calls([_call("call_time", "get_current_time", {"location": "서울"})]))
+    assert json.loads(outputs[0]["output"])["location"]
+    # 마감은 도구 호출 안에만 있고 호출한 쪽 컨텍스트에는 남지 않음
+    assert request_deadline.get() is None
+
+
+@pytest.mark.parametrize("deadline, expected", [(None, 3), (-1, 0)])
+def test_time_left(deadline, expected):
+    token = request_deadline.set(None if deadline is None else time.monotonic() + deadline)
+    try:
+        assert time_left(3) == expected
+    finally:
+        request_deadline.reset(token)
@@ -0,0 +1,64 @@
+import json
+import threading
+import time
+
+import pytest
+
+import weather
+
+
+# ==================== 테스트 ====================
+def test_concurrent_calls_share_one_upstream_request(stub):
+    stub.delay = 0.2
+    results = []
+
+    def call():
+        results.append(weather.current_conditions(37.5665, 126.978))
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert stub.requests == 1
+    assert results == [({"temperature_2m": 21.5, "weather_code": 0}, False)] * 8
+
+
+def test_cache_hit_within_ttl(stub):
+    first = weather.current_conditions(37.5665, 126.978)
+    stub.temperature = 30.0
+    second = weather.current_conditions(37.5665, 126.978)
+
+    assert stub.requests == 1
+    assert second == first
+
+    # TTL 이 지나면 다시 조회
+    time.sleep(0.35)
+    current, stale = weather.current_conditions(37.5665, 126.978)
+    assert stub.requests == 2
+    assert (current["temperature_2m"], stale) == (30.0, False)
+
+
+@pytest.mark.parametrize("failure", ["5xx", "timeout"])
+def test_stale_value_when_upstream_fails(stub, failure):
+    weather.current_conditions(37.5665, 126.978)
+    time.sleep(0.35)
+    if failure == "5xx":
+        stub.status = 503
+    else:
+        stub.delay = 0.6
+    stub.temperature = 30.0
+
+    current, stale = weather.current_conditions(37.5665, 126.978)
+    assert stub.requests == 2
+    assert (current["temperature_2m"], stale) == (21.5, True)
+
+    result = json.loads(weather.get_current_weather("서울"))
+    assert result["temperature"] == 21.5
+    assert result["stale"] is True
+
+
+def test_unknown_without_cached_value(stub):
+    stub.status = 500
+    assert weather.current_conditions(37.5665, 126.978) == (None, False)
@@ -0,0 +1,144 @@
+import asyncio
+import contextvars
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from gazetteer import lookup
+from metrics import record_tool
+from retrieval import index_available, search_docs
+from scheduler import request_deadline, time_left
+from weather import get_current_weather
+
+# ==================== 도구 실행 설정 ====================
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "16"))
+# 한 번의 requires_action 안에서 모든 도구 호출이 끝나야 하는 시간 (초)
+# 도구 함수의 HTTP 요청도 남은 시간만큼만 기다리므로 시간이 지난 호출이 작업 스레드를 붙잡지 않음
+TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "8"))
+
+_registry = {}
+_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool")
+
+
+# ==================== 도구 등록 ====================
+def register_tool(name, description, parameters):
+    def decorator(fn):
+        _registry[name] = {
+            "fn": fn,
+            "schema": {"type": "function", "function": {
+                "name": name,
+                "description": description,
+                "parameters": parameters
+            }}
+        }
+        return fn
+    return decorator
+
+
+def tool_definitions():
+    return [entry["schema"] for entry in _registry.values()]
+
+
+# ==================== 도구 호출 처리 ====================
+def _run_tool(name, arguments):
+    entry = _registry.get(name)
+    if entry is None:
+        return json.dumps({"error": "unknown function"})
+    try:
+        args = json.loads(arguments or "{}")
+    except json.JSONDecodeError:
+        return json.dumps({"error": "invalid arguments"})
+    if time_left() == 0:
+        # 작업 스레드가 밀려서 마감이 지난 뒤에야 시작되면 실행하지 않음
+        return json.dumps({"error": "tool call timed out"})
+    started = time.monotonic()
+    try:
+        return entry["fn"](**args)
+    except Exception as e:
+        return json.dumps({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        record_tool(name, time.monotonic() - started)
+
+
+async def dispatch_tool_calls(tool_calls, timeout=TOOL_CALL_TIMEOUT):
+    # 서로 독립적인 호출이므로 동시에 실행하고, 결과는 한 번에 제출하도록 모아서 반환
+    # 작업 스레드에서도 현재 턴 기록(contextvar)에 도구 시간이 남도록 컨텍스트를 복사해서 실행
+    # (컨텍스트는 한 스레드에서만 실행할 수 있으므로 호출마다 복사하고 그 안에만 마감을 둠)
+    deadline = time.monotonic() + timeout
+    submitted = []
+    for tool in tool_calls:
+        context = contextvars.copy_context()
+        context.run(request_deadline.set, deadline)
+        submitted.append(_executor.submit(context.run, _run_tool, tool.function.name, tool.function.arguments))
+    futures = [asyncio.wrap_future(future) for future in submitted]
+    done, _ = await asyncio.wait(futures, timeout=timeout) if futures else (set(), set())
+    # 아직 시작하지 못한 호출은 버려서 다음 턴의 도구 호출이 그 뒤에 줄 서지 않도록
+    for future in submitted:
+        future.cancel()
+
+    tool_outputs = []
+    for tool, future in zip(tool_calls, futures):
+        if future in done:
+            output = future.result()
+        else:
+            output = json.dumps({"error": "tool call timed out"})
+        tool_outputs.append({"tool_call_id": tool.id, "output": output})
+    return tool_outputs
+
+
+# ==================== 기본 도구 (날씨, 시간) ====================
+register_tool(
+    "get_current_weather",
+    "도시의 현재 날씨 반환",
+    {
+        "type": "object",
+        "properties": {
+            "location": {"type": "string", "description": "도시명 (영어 또는 한국어)"},
+            "unit": {"type": "string", "enum": ["celsius", "fahrenheit"]}
+        },
+        "required": ["location"]
+    }
+)(get_current_weather)
+
+
+@register_tool(
+    "get_current_time",
+    "도시의 현재 시간 반환",
+    {
+        "type": "object",
+        "properties": {
+            "location": {"type": "string", "description": "도시명 (영어 또는 한국어)"}
+        },
+        "required": ["location"]
+    }
+)
+def get_current_time(location):
+    place = lookup(location)
+    if place is None:
+        return json.dumps({"location": location, "current_time": "unknown"})
+    now = datetime.now(ZoneInfo(place["timezone"]))
+    return json.dumps({
+        "location": place["name"],
+        "timezone": place["timezone"],
+        "current_time": now.strftime("%Y년 %m월 %d일 %A %p %I:%M")
+    })
+
+
+# ==================== 문서 검색 도구 (RAG) ====================
+# 수집된 색인이 있을 때만 Assistant 에 노출 (python retrieval.py ingest 로 만든 뒤 재시작)
+if index_available():
+    register_tool(
+        "search_docs",
+        "AI Agent 관련 PDF 문서에서 질문과 관련된 구절 검색",
+        {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "검색할 내용 (질문을 그대로 넣어도 됨)"},
+                "top_k": {"type": "integer", "description": "돌려받을 구절 수 (기본 4, 최대 10)"}
+            },
+            "required": ["query"]
+        }
+    )(search_docs)
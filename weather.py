@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from gazetteer import lookup
+from scheduler import time_left
+
+# ==================== 날씨 백엔드 설정 ====================
+FORECAST_URL = os.getenv("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+
+# 느린 업스트림이 run 전체를 붙잡지 않도록 연결/읽기 시간 제한
+CONNECT_TIMEOUT = float(os.getenv("WEATHER_CONNECT_TIMEOUT", "2"))
+READ_TIMEOUT = float(os.getenv("WEATHER_READ_TIMEOUT", "4"))
+
+# 같은 위치는 CACHE_TTL 동안 재조회하지 않고, 업스트림 장애 시 STALE_TTL 까지 지난 값을 제공
+CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "600"))
+STALE_TTL = float(os.getenv("WEATHER_STALE_TTL", "21600"))
+
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+
+_lock = threading.Lock()
+_cache = {}
+_inflight = {}
+
+
+# ==================== 예보 조회 (캐시 + 동시 요청 병합) ====================
+def _fetch(lat, lon):
+    # 도구 호출의 마감이 먼저 오면 그때까지만 기다림
+    connect_timeout, read_timeout = time_left(CONNECT_TIMEOUT), time_left(READ_TIMEOUT)
+    if not read_timeout:
+        raise requests.Timeout("tool deadline passed")
+    response = _session.get(
+        FORECAST_URL,
+        params={"latitude": lat, "longitude": lon, "current": "temperature_2m,weather_code"},
+        timeout=(connect_timeout, read_timeout)
+    )
+    response.raise_for_status()
+    return response.json()["current"]
+
+
+def current_conditions(lat, lon):
+    key = (round(lat, 4), round(lon, 4))
+
+    with _lock:
+        entry = _cache.get(key)
+        if entry and time.monotonic() - entry[1] < CACHE_TTL:
+            return entry[0], False
+        event = _inflight.get(key)
+        leader = event is None
+        if leader:
+            event = threading.Event()
+            _inflight[key] = event
+
+    # 같은 위치를 이미 조회 중이면 그 결과를 기다렸다가 같이 사용
+    if not leader:
+        event.wait(time_left(CONNECT_TIMEOUT + READ_TIMEOUT))
+        with _lock:
+            entry = _cache.get(key)
+        if entry and time.monotonic() - entry[1] < STALE_TTL:
+            return entry[0], time.monotonic() - entry[1] >= CACHE_TTL
+        return None, False
+
+    try:
+        current = _fetch(lat, lon)
+        with _lock:
+            _cache[key] = (current, time.monotonic())
+        return current, False
+    except (requests.RequestException, KeyError, ValueError):
+        if entry and time.monotonic() - entry[1] < STALE_TTL:
+            return entry[0], True
+        return None, False
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+        event.set()
+
+
+# ==================== 날씨 도구 ====================
+def get_current_weather(location, unit=None):
+    # 좌표는 오프라인 지명 색인에서 찾으므로 geocoding API 를 부르지 않음
+    place = lookup(location)
+    if place is None:
+        return json.dumps({"location": location, "temperature": "unknown"})
+    current, stale = current_conditions(place["lat"], place["lon"])
+    if current is None:
+        return json.dumps({"location": place["name"], "temperature": "unknown", "error": "weather service unavailable"})
+    code = current["weather_code"]
+    desc = "맑음" if code == 0 else "구름" if code < 10 else "비/눈"
+    result = {
+        "location": place["name"],
+        "temperature": current["temperature_2m"],
+        "unit": "°C",
+        "description": desc
+    }
+    if stale:
+        result["stale"] = True
+    return json.dumps(result)